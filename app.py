@@ -6,754 +6,216 @@
 # English / Russian
 
 # Imports of libraries / Импорты библиотек
-from flask import Flask, render_template, redirect, url_for, request, flash, send_from_directory
-from flask_login import login_user, logout_user, login_required, current_user
-from models import db, User, Project, ProjectMember, login_manager, Task, Event, allowed_file, MAX_FILE_SIZE
-from werkzeug.utils import secure_filename
-from datetime import datetime, timedelta
-import calendar as cal
+# Only what the factory needs, pages are imported when the app is created
+# Только то, что нужно фабрике, страницы импортируются при создании приложения
+from flask import Flask, request, g
+from models import db, login_manager, User, Project
+from migrations import upgrade
+from database import database_uri, engine_options, replica_routing
+from identity import user_cache
+from passwords import password_hasher, PasswordHasherBusy
+from metrics import metrics
+from fragments import fragment_cache
+from deletion import project_deleter
+from jobs import job_queue
+from live import live_updates
+from assets import assets, build_assets
+import click
 import os
 
-app = Flask(__name__)
-app.config['SECRET_KEY'] = 'key'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///teameasy.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['PROFILE_PHOTO_FOLDER'] = 'static/uploads/profile_photos'
-app.config['MAX_CONTENT_LENGTH'] = 2 * 1024 * 1024  # 2 MB
-
-os.makedirs(app.config['PROFILE_PHOTO_FOLDER'], exist_ok=True)
-os.makedirs('static/images', exist_ok=True)
-
-db.init_app(app)
-login_manager.init_app(app)
-login_manager.login_view = 'login'
-login_manager.login_message = 'Войдите в аккаунт для доступа к этой странице'
-login_manager.login_message_category = 'error'
-
-# Matching category names / Сопоставление названий категорий
-CATEGORIES = {
-    "software-development": "Разработка программного обеспечения",
-    "web-development": "Веб-разработка",
-    "mobile-apps": "Мобильные приложения",
-    "game-development": "Игровая разработка",
-    "blockchain-cryptocurrency": "Блокчейн и криптовалюты",
-    "artificial-intelligence": "Искусственный интеллект",
-    "internet-of-things": "Интернет вещей",
-    "cybersecurity": "Кибербезопасность",
-    "data-analytics": "Аналитика данных",
-    "cloud-technologies": "Облачные технологии",
-    "other": "Другое"
-}
-
-
-@app.context_processor
-def inject_categories():
-    return dict(CATEGORIES=CATEGORIES)
-
-
-# Files upload folder / Папка загрузки файлов
-@app.route('/static/uploads/profile_photos/<filename>')
-def serve_profile_photo(filename):
-    return send_from_directory(app.config['PROFILE_PHOTO_FOLDER'], filename)
-
-
-# Index page / Главная страница
-@app.route('/')
-def index():
-    if current_user.is_authenticated:
-        return redirect(url_for('home'))
-    return render_template('index.html')
-
-
-# Home page / Домашняя страница
-@app.route('/home')
-@login_required
-def home():
-    return render_template('home.html')
-
-
-# Registration by Flask Login / Регистрация через библиотеку Flask Login
-@app.route('/register', methods=['GET', 'POST'])
-def register():
-    if current_user.is_authenticated:
-        return redirect(url_for('index'))
-
-    if request.method == 'POST':
-        username = request.form['username']
-        email = request.form['email']
-        password = request.form['password']
-        github = request.form.get('github', '')
-        telegram = request.form.get('telegram', '')
-        discord = request.form.get('discord', '')
-
-        if telegram and telegram.startswith('@'):
-            telegram = telegram[1:]
-
-        # Username unique check / Проверка уникальности имени пользователя
-        if User.query.filter_by(username=username).first():
-            flash('Имя пользователя уже занято', category='error')
-            return redirect(url_for('register'))
-
-        # Mail unique check / Проверка уникальности почты
-        if User.query.filter_by(email=email).first():
-            flash('Эта почта уже привязана к другому аккаунту', category='error')
-            return redirect(url_for('register'))
-
-        user = User(username=username, email=email, github=github, telegram=telegram, discord=discord)
-        user.set_password(password)
-        db.session.add(user)
-        db.session.commit()
-
-        flash('Успешная регистрация', 'success')
-        return redirect(url_for('login'))
-
-    return render_template('register.html')
-
-
-# Login / Вход
-@app.route('/login', methods=['GET', 'POST'])
-def login():
-    if current_user.is_authenticated:
-        return redirect(url_for('index'))
-
-    if request.method == 'POST':
-        username = request.form['username']
-        password = request.form['password']
-        user = User.query.filter_by(username=username).first()
-
-        # Check username and password / Проверка имени и пароля
-        if user and user.check_password(password):
-            login_user(user)
-            next_page = request.args.get('next')
-            return redirect(next_page or url_for('index'))
-        else:
-            flash('Неверное имя пользователя или пароль', 'error')
-
-    return render_template('login.html')
-
-
-# Logout / Выход
-@app.route('/logout')
-@login_required
-def logout():
-    logout_user()
-    return redirect(url_for('index'))
-
-
-# User profile / Профиль пользователя
-@app.route('/profile/<username>')
-def profile(username):
-    user = User.query.filter_by(username=username).first_or_404()
-    user_projects = Project.query.filter_by(owner_id=user.id, is_public=True).order_by(Project.created_at.desc()).all()
-    for project in user_projects:
-        project.category_name = CATEGORIES.get(project.category, "Неизвестная категория")
-
-    return render_template('profile.html', user=user, projects=user_projects)
-
-
-# Edit profile / Редактирование профиля
-@app.route('/edit_profile', methods=['GET', 'POST'])
-@login_required
-def edit_profile():
-    if request.method == 'POST':
-        current_user.email = request.form['email']
-        current_user.github = request.form.get('github', '')
-        current_user.bio = request.form.get('bio', '')
-        telegram = request.form.get('telegram', '')
-
-        if telegram and telegram.startswith('@'):
-            telegram = telegram[1:]
-        current_user.telegram = telegram
-
-        if 'profile_photo' in request.files:
-            file = request.files['profile_photo']
-            if file and file.filename != '' and allowed_file(file.filename):
-                if file.content_length > MAX_FILE_SIZE:
-                    flash('Файл слишком большой. Максимальный размер - 2MB.', 'error')
-                else:
-                    # Delete old profile photo if it isn't default / Удаление старого фото, если оно не дефолтное
-                    if current_user.profile_photo and current_user.profile_photo != 'default-avatar.png':
-                        old_photo_path = os.path.join(app.config['PROFILE_PHOTO_FOLDER'], current_user.profile_photo)
-                        if os.path.exists(old_photo_path):
-                            os.remove(old_photo_path)
-
-                    # Save new profile photo / Сохранение нового фото профиля
-                    filename = secure_filename(f"{current_user.id}_{file.filename}")
-                    file.save(os.path.join(app.config['PROFILE_PHOTO_FOLDER'], filename))
-                    current_user.profile_photo = filename
-            elif file and file.filename != '':
-                flash('Недопустимый формат файла. Разрешены: PNG, JPG, JPEG, GIF.', 'error')
-
-        existing_user = User.query.filter(User.email == current_user.email, User.id != current_user.id).first()
-        if existing_user:
-            flash('Эта почта уже привязана к другому аккаунту', 'error')
-            return redirect(url_for('edit_profile'))
-
-        try:
-            db.session.commit()
-            flash('Профиль успешно изменен', 'success')
-            return redirect(url_for('profile', username=current_user.username))
-        except Exception as e:
-            db.session.rollback()
-            flash('Ошибка при редактировании профиля: ' + str(e), 'error')
-
-    return render_template('edit_profile.html')
-
-
-# Delete profile photo / Удаление фото профиля
-@app.route('/delete_profile_photo', methods=['POST'])
-@login_required
-def delete_profile_photo():
-    if current_user.profile_photo and current_user.profile_photo != 'default-avatar.png':
-        photo_path = os.path.join(app.config['PROFILE_PHOTO_FOLDER'], current_user.profile_photo)
-        if os.path.exists(photo_path):
-            os.remove(photo_path)
-
-        current_user.profile_photo = 'default-avatar.png'
-        db.session.commit()
-        flash('Фото профиля удалено', 'success')
-    else:
-        flash('Нет фото для удаления', 'error')
-
-    return redirect(url_for('edit_profile'))
-
-
-# Create project / Создание проекта
-@app.route('/create_project', methods=['GET', 'POST'])
-def create_project():
-    if not current_user.is_authenticated:
-        return redirect(url_for('login', next=request.url))
-
-    if request.method == 'POST':
-        project_name = request.form['project_name']
-        project_description = request.form['project_description']
-        github_url = request.form.get('github_url', '')
-        category = request.form['category']
-        is_public = request.form.get('is_public') == 'true'
-
-        project = Project(
-            name=project_name,
-            description=project_description,
-            github_url=github_url,
-            owner_id=current_user.id,
-            category=category,
-            is_public=is_public
-        )
-
-        try:
-            db.session.add(project)
-            db.session.flush()
-            # Setting owner / Назначение владельца
-            owner_member = ProjectMember(
-                project_id=project.id,
-                user_id=current_user.id,
-                role='Владелец'
-            )
-            db.session.add(owner_member)
-
-            db.session.commit()
-            flash('Проект успешно создан', 'success')
-            return redirect(url_for('my_projects'))
-        except Exception as e:
-            db.session.rollback()
-            flash('Ошибка при создании проекта: ' + str(e), 'error')
-
-    return render_template('create_project.html')
-
-
-# My projects / Мои проекты
-@app.route('/my_projects')
-@login_required
-def my_projects():
-    user_projects = Project.query.filter_by(owner_id=current_user.id).order_by(Project.created_at.desc()).all()
-    for project in user_projects:
-        project.category_name = CATEGORIES.get(project.category, "Неизвестная категория")
-    return render_template('my_projects.html', projects=user_projects)
-
-
-# Project workspace / Рабочее пространство проекта
-@app.route('/project/<int:project_id>/workspace')
-@login_required
-def project_workspace(project_id):
-    project = Project.query.get_or_404(project_id)
-
-    # Access check / Проверка доступа
-    is_member = ProjectMember.query.filter_by(project_id=project_id, user_id=current_user.id).first()
-    if not is_member and project.owner_id != current_user.id:
-        flash('У вас нет доступа к этому проекту', 'error')
-        return redirect(url_for('my_projects'))
-
-    return render_template('project_workspace.html', project=project)
-
-
-# Project members / Участники проекта
-@app.route('/project/<int:project_id>/members')
-@login_required
-def project_members(project_id):
-    project = Project.query.get_or_404(project_id)
-
-    # Access check / Проверка доступа
-    is_member = ProjectMember.query.filter_by(project_id=project_id, user_id=current_user.id).first()
-    if not is_member and project.owner_id != current_user.id:
-        flash('У вас нет доступа к этому проекту', 'error')
-        return redirect(url_for('my_projects'))
-
-    members = ProjectMember.query.filter_by(project_id=project_id).all()
-
-    return render_template('project_members.html', project=project, members=members)
-
-
-# Edit role / Изменение роли участника
-@app.route('/project/<int:project_id>/members/<int:member_id>/edit_role', methods=['POST'])
-@login_required
-def edit_member_role(project_id, member_id):
-    project = Project.query.get_or_404(project_id)
-
-    # Owner check / Проверка на владельца
-    if project.owner_id != current_user.id:
-        flash('Только владелец проекта может изменять роли участников', 'error')
-        return redirect(url_for('project_members', project_id=project_id))
-
-    member = ProjectMember.query.get_or_404(member_id)
-    new_role = request.form.get('role', '').strip()
-
-    if new_role:
-        member.role = new_role
-        try:
-            db.session.commit()
-            flash('Роль участника успешно изменена', 'success')
-        except Exception as e:
-            db.session.rollback()
-            flash('Ошибка при изменении роли: ' + str(e), 'error')
-
-    return redirect(url_for('project_members', project_id=project_id))
-
-
-# Remove member / Удаление участника
-@app.route('/project/<int:project_id>/members/<int:member_id>/remove', methods=['POST'])
-@login_required
-def remove_member(project_id, member_id):
-    project = Project.query.get_or_404(project_id)
-
-    # Owner check / Проверка на владельца
-    if project.owner_id != current_user.id:
-        flash('Только владелец проекта может удалять участников', 'error')
-        return redirect(url_for('project_members', project_id=project_id))
-
-    member = ProjectMember.query.get_or_404(member_id)
-
-    try:
-        db.session.delete(member)
-        db.session.commit()
-        flash('Участник удален из проекта', 'success')
-    except Exception as e:
-        db.session.rollback()
-        flash('Ошибка при удалении участника: ' + str(e), 'error')
-
-    return redirect(url_for('project_members', project_id=project_id))
-
-
-# Project settings / Настройки проекта
-@app.route('/project/<int:project_id>/settings', methods=['GET', 'POST'])
-@login_required
-def project_settings(project_id):
-    project = Project.query.get_or_404(project_id)
-
-    # Owner check / Проверка на владельца
-    if project.owner_id != current_user.id:
-        flash('Только владелец проекта может изменять настройки', 'error')
-        return redirect(url_for('project_workspace', project_id=project_id))
-
-    if request.method == 'POST':
-        project.name = request.form['project_name']
-        project.description = request.form['project_description']
-        project.github_url = request.form.get('github_url', '')
-        project.category = request.form['category']
-        project.is_public = request.form.get('is_public') == 'true'
-
-        try:
-            db.session.commit()
-            flash('Настройки проекта изменены', 'success')
-            return redirect(url_for('project_settings', project_id=project_id))
-        except Exception as e:
-            db.session.rollback()
-            flash('Ошибка при обновлении настроек: ' + str(e), 'error')
-
-    return render_template('project_settings.html', project=project)
-
-
-# Delete project / Удаление проекта
-@app.route('/project/<int:project_id>/delete', methods=['POST'])
-@login_required
-def delete_project(project_id):
-    project = Project.query.get_or_404(project_id)
-
-    # Owner check / Проверка на владельца
-    if project.owner_id != current_user.id:
-        flash('Только владелец проекта может удалить проект', 'error')
-        return redirect(url_for('project_workspace', project_id=project_id))
-
-    try:
-        ProjectMember.query.filter_by(project_id=project_id).delete()
-        db.session.delete(project)
-        db.session.commit()
-        flash('Проект удален', 'success')
-        return redirect(url_for('my_projects'))
-    except Exception as e:
-        db.session.rollback()
-        flash('Ошибка при удалении проекта: ' + str(e), 'error')
-        return redirect(url_for('project_settings', project_id=project_id))
-
-
-# Task manager / Таск-менеджер
-@app.route('/project/<int:project_id>/tasks')
-@login_required
-def project_tasks(project_id):
-    project = Project.query.get_or_404(project_id)
-
-    # Access check / Проверка доступа
-    is_member = ProjectMember.query.filter_by(project_id=project_id, user_id=current_user.id).first()
-    if not is_member and project.owner_id != current_user.id:
-        flash('У вас нет доступа к этому проекту', 'error')
-        return redirect(url_for('my_projects'))
-
-    # Get tasks / Получение задачи проекта
-    tasks = Task.query.filter_by(project_id=project_id).order_by(Task.created_at.desc()).all()
-
-    # Get members / Получаем участников проекта
-    members = ProjectMember.query.filter_by(project_id=project_id).all()
-
-    return render_template('tasks.html', project=project, tasks=tasks, members=members)
-
-
-# Create task / Создание задач
-@app.route('/project/<int:project_id>/tasks/create', methods=['POST'])
-@login_required
-def create_task(project_id):
-    project = Project.query.get_or_404(project_id)
-
-    # Access check / Проверка доступа
-    is_member = ProjectMember.query.filter_by(project_id=project_id, user_id=current_user.id).first()
-    if not is_member and project.owner_id != current_user.id:
-        flash('У вас нет доступа к этому проекту', 'error')
-        return redirect(url_for('my_projects'))
-
-    title = request.form['task_title']
-    description = request.form.get('task_description', '')
-    due_date_str = request.form.get('due_date')
-    priority = request.form.get('priority', 'medium')
-    assignee_id = request.form.get('assignee')
-
-    due_date = None
-    if due_date_str:
-        due_date = datetime.strptime(due_date_str, '%Y-%m-%d')
-
-    task = Task(
-        project_id=project_id,
-        title=title,
-        description=description,
-        due_date=due_date,
-        priority=priority,
-        status='todo',
-        created_by=current_user.id
-    )
-
-    if assignee_id:
-        task.assigned_to = assignee_id
-
-    try:
-        db.session.add(task)
-        db.session.commit()
-        flash('Задача создана', 'success')
-    except Exception as e:
-        db.session.rollback()
-        flash('Ошибка при создании задачи: ' + str(e), 'error')
-
-    return redirect(url_for('project_tasks', project_id=project_id))
-
-
-# Task modal / Модальное окно создания задачи
-@app.route('/project/<int:project_id>/tasks/<int:task_id>/modal')
-@login_required
-def task_modal(project_id, task_id):
-    task = Task.query.get_or_404(task_id)
-    members = ProjectMember.query.filter_by(project_id=project_id).all()
-
-    return render_template('task_modal.html', task=task, members=members, project_id=project_id)
-
-
-# Update task / Изменение задачи
-@app.route('/project/<int:project_id>/tasks/<int:task_id>/update', methods=['POST'])
-@login_required
-def update_task(project_id, task_id):
-    task = Task.query.get_or_404(task_id)
-
-    task.title = request.form['title']
-    task.description = request.form.get('description', '')
-    task.status = request.form['status']
-    task.priority = request.form['priority']
-
-    assignee_id = request.form.get('assignee')
-    task.assigned_to = assignee_id if assignee_id else None
-
-    due_date_str = request.form.get('due_date')
-    task.due_date = datetime.strptime(due_date_str, '%Y-%m-%d') if due_date_str else None
-
-    try:
-        db.session.commit()
-        flash('Задача обновлена', 'success')
-    except Exception as e:
-        db.session.rollback()
-        flash('Ошибка при обновлении задачи: ' + str(e), 'error')
-
-    return redirect(url_for('project_tasks', project_id=project_id))
-
-
-# Delete task / Удаление задачи
-@app.route('/project/<int:project_id>/tasks/<int:task_id>/delete', methods=['POST'])
-@login_required
-def delete_task(project_id, task_id):
-    task = Task.query.get_or_404(task_id)
-
-    # Task creator check / Проверка на создателя задачи
-    if task.created_by != current_user.id:
-        flash('Вы можете удалять только свои задачи', 'error')
-        return redirect(url_for('project_tasks', project_id=project_id))
-
-    try:
-        db.session.delete(task)
-        db.session.commit()
-        flash('Задача удалена', 'success')
-    except Exception as e:
-        db.session.rollback()
-        flash('Ошибка при удалении задачи: ' + str(e), 'error')
-
-    return redirect(url_for('project_tasks', project_id=project_id))
-
-
-# Project calendar / Календарь проекта
-@app.route('/project/<int:project_id>/calendar')
-@app.route('/project/<int:project_id>/calendar/<int:year>/<int:month>')
-@login_required
-def project_calendar(project_id, year=None, month=None):
-    project = Project.query.get_or_404(project_id)
-
-    # Access check / Проверка доступа
-    is_member = ProjectMember.query.filter_by(project_id=project_id, user_id=current_user.id).first()
-    if not is_member and project.owner_id != current_user.id:
-        flash('У вас нет доступа к этому проекту', 'error')
-        return redirect(url_for('my_projects'))
-
-    # During year and month / Текущий год и месяц
-    today = datetime.now()
-    if not year or not month:
-        year = today.year
-        month = today.month
-
-    # Events in this month / События в этом месяце
-    start_date = datetime(year, month, 1)
-    if month == 12:
-        end_date = datetime(year + 1, 1, 1) - timedelta(days=1)
-    else:
-        end_date = datetime(year, month + 1, 1) - timedelta(days=1)
-
-    events = Event.query.filter(
-        Event.project_id == project_id,
-        Event.start_date >= start_date,
-        Event.start_date <= end_date
-    ).order_by(Event.start_date).all()
-
-    # Calendar creation / Создание календаря
-    cal_obj = cal.Calendar(firstweekday=0)  # 0 = понедельник
-    month_days = cal_obj.monthdayscalendar(year, month)
-
-    month_names = {
-        1: 'Январь', 2: 'Февраль', 3: 'Март', 4: 'Апрель',
-        5: 'Май', 6: 'Июнь', 7: 'Июль', 8: 'Август',
-        9: 'Сентябрь', 10: 'Октябрь', 11: 'Ноябрь', 12: 'Декабрь'
+# Page modules and their blueprints / Модули страниц и их блюпринты
+BLUEPRINTS = ('views.auth', 'views.profile', 'views.projects', 'views.tasks', 'views.calendar')
+
+
+# Settings from environment, read when the app is created / Настройки из переменных окружения, читаются при создании
+def default_config():
+    config = {}
+    config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'key')
+    # Database from environment / База данных из переменных окружения
+    config['SQLALCHEMY_DATABASE_URI'] = database_uri(os.environ.get('DATABASE_URL', 'sqlite:///teameasy.db'))
+    config['SQLALCHEMY_BINDS'] = {}
+    # Read replica for marked views, None to turn it off / Реплика для отмеченных страниц, None - выключена
+    config['DATABASE_REPLICA_URL'] = os.environ.get('DATABASE_REPLICA_URL')
+    config['DATABASE_PRIMARY_STICKY_SECONDS'] = int(os.environ.get('DATABASE_PRIMARY_STICKY_SECONDS', 5))
+    config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    config['PROFILE_PHOTO_FOLDER'] = 'static/uploads/profile_photos'
+    config['MAX_CONTENT_LENGTH'] = 2 * 1024 * 1024  # 2 MB
+    # Upload limit of project import / Лимит загрузки импорта проекта
+    config['IMPORT_MAX_SIZE'] = int(os.environ.get('IMPORT_MAX_SIZE', 200 * 1024 * 1024))  # 200 MB
+    # Password hashing pool / Пул хеширования паролей
+    # Pool size decides when logins get a fast 503 / Размер пула определяет, когда вход получает быстрый 503
+    config['PASSWORD_HASH_METHOD'] = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+    config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+    config['PASSWORD_HASH_QUEUE'] = int(os.environ.get('PASSWORD_HASH_QUEUE', 16))
+    config['PASSWORD_HASH_TIMEOUT'] = float(os.environ.get('PASSWORD_HASH_TIMEOUT', 10))  # seconds / секунды
+    # Internal nginx location for X-Accel-Redirect, e.g. '/protected/profile_photos' / Внутренний location nginx
+    config['PROFILE_PHOTO_ACCEL_PREFIX'] = None
+    # Server-Timing header with SQL, template and hashing time / Заголовок Server-Timing со временем SQL, шаблонов и хеширования
+    config['SERVER_TIMING'] = os.environ.get('SERVER_TIMING', '0') == '1'
+    # Requests slower than this are logged with their SQL, seconds / Запросы медленнее этого пишутся в лог вместе с SQL, секунды
+    config['SLOW_REQUEST_THRESHOLD'] = float(os.environ.get('SLOW_REQUEST_THRESHOLD', 1.0))
+    # Token for /metrics scrapers, unset to serve it to loopback only / Токен для /metrics, без него - только локально
+    config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+    # Shared fragment cache, e.g. 'redis://localhost:6379/0' / Общий кэш фрагментов
+    config['FRAGMENT_CACHE_URL'] = os.environ.get('FRAGMENT_CACHE_URL')
+    # Memory for cached calendar feeds per process, bytes / Память под кэш подписок на календарь в процессе, байт
+    config['FEED_CACHE_MAX_SIZE'] = int(os.environ.get('FEED_CACHE_MAX_SIZE', 32 * 1024 * 1024))
+    # Pub/sub for live updates between processes, e.g. 'redis://localhost:6379/0' / Pub/sub живых обновлений между процессами
+    config['LIVE_UPDATES_URL'] = os.environ.get('LIVE_UPDATES_URL')
+    # Live streams per process, half of the gunicorn threads by default, the rest of the clients poll
+    # Живых потоков на процесс, по умолчанию половина потоков gunicorn, остальные клиенты опрашивают
+    web_threads = int(os.environ.get('WEB_THREADS', 8))
+    config['LIVE_MAX_STREAMS'] = int(os.environ.get('LIVE_MAX_STREAMS', max(1, web_threads // 2)))
+    config['LIVE_POLL_INTERVAL'] = int(os.environ.get('LIVE_POLL_INTERVAL', 10))
+    # gzip of pages and JSON, off when nginx compresses / gzip страниц и JSON, выключается, если сжимает nginx
+    config['COMPRESS_RESPONSES'] = os.environ.get('COMPRESS_RESPONSES', '1') == '1'
+    # Job worker threads in this process, 0 when `flask run-jobs` runs separately
+    # Потоки-воркеры в этом процессе, 0 если `flask run-jobs` запущен отдельно
+    config['JOB_WORKERS'] = int(os.environ.get('JOB_WORKERS', 1))
+
+    # Max SQL queries per view, checked in test mode / Лимит SQL-запросов на страницу, проверяется в тестах
+    config['QUERY_BUDGET'] = {
+        'projects.home': 2,
+        'projects.project_members': 2,
+        'tasks.project_tasks': 5,
+        'tasks.task_column': 2,
+        'tasks.task_modal': 3,
+        'calendar.project_calendar': 6,
+        'projects.search': 1,
+        'projects.explore': 2,
     }
-
-    # Calendar structure / Структура календаря
-    calendar = []
-    for week in month_days:
-        week_days = []
-        for day in week:
-            if day == 0:
-                week_days.append({'day': '', 'month': None, 'events': []})
-            else:
-                day_events = []
-                for event in events:
-                    if event.start_date.day == day and event.start_date.month == month:
-                        day_events.append(event)
-                week_days.append({'day': day, 'month': month, 'events': day_events})
-        calendar.append(week_days)
-
-    # Future events / Предстоящие события
-    upcoming_events = Event.query.filter(
-        Event.project_id == project_id,
-        Event.start_date >= today
-    ).order_by(Event.start_date).limit(5).all()
-
-    # Months navigation / Навигация по месяцам
-    if month == 1:
-        prev_month = 12
-        prev_year = year - 1
-    else:
-        prev_month = month - 1
-        prev_year = year
-
-    if month == 12:
-        next_month = 1
-        next_year = year + 1
-    else:
-        next_month = month + 1
-        next_year = year
-
-    return render_template('calendar.html', project=project, calendar=calendar, events=events,
-                           upcoming_events=upcoming_events, year=year, month=month, current_month=month,
-                           month_name=month_names[month], today=today.strftime('%Y-%m-%d'), today_year=today.year,
-                           today_month=today.month, prev_year=prev_year, prev_month=prev_month, next_year=next_year,
-                           next_month=next_month)
-
-
-# Create event / Создание события
-@app.route('/project/<int:project_id>/events/create', methods=['POST'])
-@login_required
-def create_event(project_id):
-    project = Project.query.get_or_404(project_id)
-
-    # Access check / Проверка доступа
-    is_member = ProjectMember.query.filter_by(project_id=project_id, user_id=current_user.id).first()
-    if not is_member and project.owner_id != current_user.id:
-        flash('У вас нет доступа к этому проекту', 'error')
-        return redirect(url_for('my_projects'))
-
-    title = request.form['event_title']
-    description = request.form.get('event_description', '')
-    location = request.form.get('location', '')
-
-    # Start date and time / Начальные дата и время
-    start_date_str = request.form['start_date']
-    start_time_str = request.form.get('start_time')
-
-    if start_time_str:
-        start_datetime_str = f"{start_date_str} {start_time_str}"
-        start_date = datetime.strptime(start_datetime_str, '%Y-%m-%d %H:%M')
-    else:
-        start_date = datetime.strptime(start_date_str, '%Y-%m-%d')
-
-    # End date and time / Конечные дата и время
-    end_date = None
-    end_date_str = request.form.get('end_date')
-    if end_date_str:
-        end_time_str = request.form.get('end_time')
-        if end_time_str:
-            end_datetime_str = f"{end_date_str} {end_time_str}"
-            end_date = datetime.strptime(end_datetime_str, '%Y-%m-%d %H:%M')
-        else:
-            end_date = datetime.strptime(end_date_str, '%Y-%m-%d')
-
-    event = Event(
-        project_id=project_id,
-        title=title,
-        description=description,
-        location=location,
-        start_date=start_date,
-        end_date=end_date,
-        created_by=current_user.id
-    )
-
-    try:
-        db.session.add(event)
-        db.session.commit()
-        flash('Событие создано', 'success')
-    except Exception as e:
-        db.session.rollback()
-        flash('Ошибка при создании события: ' + str(e), 'error')
-
-    return redirect(url_for('project_calendar', project_id=project_id))
-
-
-# Event modal / Модальное окно события
-@app.route('/project/<int:project_id>/events/<int:event_id>/modal')
-@login_required
-def event_modal(project_id, event_id):
-    event = Event.query.get_or_404(event_id)
-
-    return render_template('event_modal.html', event=event, project_id=project_id)
-
-
-# Update event / Изменение события
-@app.route('/project/<int:project_id>/events/<int:event_id>/update', methods=['POST'])
-@login_required
-def update_event(project_id, event_id):
-    event = Event.query.get_or_404(event_id)
-
-    # Event creator check / Проверка на создателя события
-    if event.created_by != current_user.id:
-        flash('Вы можете изменять только свои события', 'error')
-        return redirect(url_for('project_calendar', project_id=project_id))
-
-    event.title = request.form['title']
-    event.description = request.form.get('description', '')
-    event.location = request.form.get('location', '')
-
-    # Start date and time / Начальные дата и время
-    start_date_str = request.form['start_date']
-    start_time_str = request.form.get('start_time')
-
-    if start_time_str:
-        start_datetime_str = f"{start_date_str} {start_time_str}"
-        event.start_date = datetime.strptime(start_datetime_str, '%Y-%m-%d %H:%M')
-    else:
-        event.start_date = datetime.strptime(start_date_str, '%Y-%m-%d')
-
-    # End date and time / Конечные дата и время
-    end_date_str = request.form.get('end_date')
-    if end_date_str:
-        end_time_str = request.form.get('end_time')
-        if end_time_str:
-            end_datetime_str = f"{end_date_str} {end_time_str}"
-            event.end_date = datetime.strptime(end_datetime_str, '%Y-%m-%d %H:%M')
-        else:
-            event.end_date = datetime.strptime(end_date_str, '%Y-%m-%d')
-    else:
-        event.end_date = None
-
-    try:
-        db.session.commit()
-        flash('Событие изменено', 'success')
-    except Exception as e:
-        db.session.rollback()
-        flash('Ошибка при обновлении события: ' + str(e), 'error')
-
-    return redirect(url_for('project_calendar', project_id=project_id))
-
-
-# Delete event / Удаление события
-@app.route('/project/<int:project_id>/events/<int:event_id>/delete', methods=['POST'])
-@login_required
-def delete_event(project_id, event_id):
-    event = Event.query.get_or_404(event_id)
-
-    # Event creator check / Проверка на владельца события
-    if event.created_by != current_user.id:
-        flash('Вы можете удалять только свои события', 'error')
-        return redirect(url_for('project_calendar', project_id=project_id))
-
-    try:
-        db.session.delete(event)
-        db.session.commit()
-        flash('Событие удалено', 'success')
-    except Exception as e:
-        db.session.rollback()
-        flash('Ошибка при удалении события: ' + str(e), 'error')
-
-    return redirect(url_for('project_calendar', project_id=project_id))
+    return config
+
+
+# Application factory / Фабрика приложения
+def create_app(config=None):
+    app = Flask(__name__)
+    app.config.update(default_config())
+    # Uploads waiting for the photo job, shared with the worker process / Загрузки, ожидающие обработки фото
+    app.config['PHOTO_INCOMING_FOLDER'] = os.path.join(app.instance_path, 'photo_uploads')
+    if config:
+        app.config.update(config)
+
+    # Engine options follow the final URLs / Параметры движков по итоговым адресам
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config['SQLALCHEMY_DATABASE_URI']))
+    app.config['SQLALCHEMY_BINDS'] = {name: {'url': bind, **engine_options(bind)} if isinstance(bind, str) else bind
+                                      for name, bind in app.config['SQLALCHEMY_BINDS'].items()}
+
+    # Adds the replica bind before the engines are created / Добавляет реплику до создания движков
+    replica_routing.init_app(app)
+
+    os.makedirs(app.config['PROFILE_PHOTO_FOLDER'], exist_ok=True)
+    os.makedirs(app.config['PHOTO_INCOMING_FOLDER'], exist_ok=True)
+    os.makedirs('static/images', exist_ok=True)
+
+    db.init_app(app)
+    login_manager.init_app(app)
+    user_cache.init_app(app)
+    login_manager.login_view = 'auth.login'
+    login_manager.login_message = 'Войдите в аккаунт для доступа к этой странице'
+    login_manager.login_message_category = 'error'
+    password_hasher.init_app(app)
+    metrics.init_app(app)
+    fragment_cache.init_app(app)
+    project_deleter.init_app(app)
+    job_queue.init_app(app)
+    live_updates.init_app(app)
+    assets.init_app(app)
+
+    # g.query_count is counted in metrics.py / g.query_count считается в metrics.py
+    @app.after_request
+    def check_query_budget(response):
+        budget = app.config['QUERY_BUDGET'].get(request.endpoint)
+        if app.testing and budget is not None and g.get('query_count', 0) > budget:
+            raise AssertionError(f'{request.endpoint} ran {g.query_count} queries, budget is {budget}')
+        return response
+
+    # Hashing pool is full / Пул хеширования переполнен
+    @app.errorhandler(PasswordHasherBusy)
+    def password_hasher_busy(error):
+        return 'Сервер перегружен, попробуйте ещё раз через несколько секунд', 503, {'Retry-After': '5'}
+
+    register_blueprints(app)
+    register_commands(app)
+    return app
+
+
+def register_blueprints(app):
+    from importlib import import_module
+    from constants import CATEGORIES
+
+    @app.context_processor
+    def inject_categories():
+        return dict(CATEGORIES=CATEGORIES)
+
+    for name in BLUEPRINTS:
+        app.register_blueprint(import_module(name).bp)
+
+
+def register_commands(app):
+    # Database upgrade command / Команда обновления базы данных
+    @app.cli.command('upgrade-db')
+    def upgrade_db():
+        db.create_all()
+        upgrade()
+
+    # Orphan cleanup command / Команда очистки осиротевших строк
+    @app.cli.command('purge-orphans')
+    def purge_orphans():
+        for name, count in project_deleter.purge_orphans().items():
+            print(f'{name}: {count}')
+
+    # Static assets build step / Шаг сборки статических файлов
+    @app.cli.command('build-assets')
+    def build_assets_command():
+        manifest = build_assets(app.static_folder)
+        for name, hashed in sorted(manifest.items()):
+            print(f'{name} -> {hashed}')
+
+    # Project export to a file or stdout / Экспорт проекта в файл или stdout
+    @app.cli.command('export-project')
+    @click.argument('project_id', type=int)
+    @click.option('--format', 'fmt', type=click.Choice(['ndjson', 'csv']), default='ndjson')
+    @click.option('--output', type=click.File('w', encoding='utf-8'), default='-')
+    def export_project_command(project_id, fmt, output):
+        from transfer import export_project
+        project = db.session.get(Project, project_id)
+        if project is None:
+            raise click.ClickException(f'Unknown project {project_id}')
+        for chunk in export_project(project, fmt):
+            output.write(chunk)
+
+    # Project import from a file / Импорт проекта из файла
+    @app.cli.command('import-project')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--owner', required=True, help='Username of the new owner')
+    def import_project_command(path, owner):
+        from transfer import read_records, ProjectImporter, InvalidImport
+        user = User.query.filter_by(username=owner).first()
+        if user is None:
+            raise click.ClickException(f'Unknown user {owner}')
+        importer = ProjectImporter(user)
+        with open(path, 'rb') as file:
+            try:
+                for step in importer.run(read_records(file, 'csv' if path.lower().endswith('.csv') else 'ndjson')):
+                    print(f'{step["stage"]}: {step["count"]}')
+                db.session.commit()
+            except InvalidImport as e:
+                db.session.rollback()
+                raise click.ClickException(str(e))
+        print(f'Project {importer.project.id} imported')
+
+    # Job worker process / Процесс обработки фоновых задач
+    @app.cli.command('run-jobs')
+    @click.option('--once', is_flag=True, help='Run due jobs and exit')
+    def run_jobs(once):
+        job_queue.work(once=once)
 
 
 # Website launch / Запуск сайта
 if __name__ == '__main__':
+    app = create_app()
     with app.app_context():
         db.create_all()
+        upgrade()
     app.run(debug=True, port=5000)
@@ -0,0 +1,8 @@
+# ASGI entry point, needs the asgiref package / Точка входа ASGI, нужен пакет asgiref
+# uvicorn asgi:app --workers 4
+# Each request runs in a thread of asgiref, live update streams hold one thread each
+# Каждый запрос выполняется в потоке asgiref, поток живых обновлений занимает один поток
+from asgiref.wsgi import WsgiToAsgi
+from wsgi import app as wsgi_app
+
+app = WsgiToAsgi(wsgi_app)
@@ -0,0 +1,147 @@
+# Static asset fingerprinting and compression / Отпечатки и сжатие статических файлов
+# `flask build-assets` copies static files under content-hash names with gzip/brotli variants, url_for('static')
+# then points to them and they are served with far-future cache headers. HTML and JSON responses are gzipped.
+# `flask build-assets` копирует статические файлы под именами с хэшем содержимого вместе с вариантами gzip/brotli,
+# url_for('static') указывает на них, и они отдаются с долгим кэшированием. Ответы HTML и JSON сжимаются gzip.
+from flask import abort, current_app, request, send_file
+from werkzeug.security import safe_join
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import shutil
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+BUILD_DIR = 'build'
+MANIFEST = 'manifest.json'
+# Folders with user files or build output / Папки с пользовательскими файлами или результатом сборки
+SKIP_DIRS = ('uploads', BUILD_DIR)
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.svg', '.json', '.txt', '.html', '.ico')
+COMPRESSIBLE_MIMETYPES = ('text/html', 'application/json')
+ASSET_MAX_AGE = 365 * 24 * 3600
+
+
+def fingerprint(name, data):
+    root, ext = os.path.splitext(name)
+    return f'{root}.{hashlib.sha256(data).hexdigest()[:12]}{ext}'
+
+
+# Build step, returns {source name: hashed name} / Шаг сборки, возвращает {исходное имя: имя с хэшем}
+def build_assets(static_folder):
+    build_folder = os.path.join(static_folder, BUILD_DIR)
+    shutil.rmtree(build_folder, ignore_errors=True)
+
+    manifest = {}
+    for root, dirs, files in os.walk(static_folder):
+        if root == static_folder:
+            dirs[:] = [name for name in dirs if name not in SKIP_DIRS]
+        for filename in files:
+            path = os.path.join(root, filename)
+            name = os.path.relpath(path, static_folder).replace(os.sep, '/')
+            with open(path, 'rb') as f:
+                data = f.read()
+
+            hashed = fingerprint(name, data)
+            target = os.path.join(build_folder, hashed)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, 'wb') as f:
+                f.write(data)
+            manifest[name] = f'{BUILD_DIR}/{hashed}'
+
+            # Compressed copies only when they are smaller / Сжатые копии, только если они меньше
+            if not filename.endswith(COMPRESSIBLE_EXTENSIONS):
+                continue
+            variants = [('.gz', gzip.compress(data, 9, mtime=0))]
+            if brotli is not None:
+                variants.append(('.br', brotli.compress(data, quality=11)))
+            for ext, compressed in variants:
+                if len(compressed) < len(data):
+                    with open(target + ext, 'wb') as f:
+                        f.write(compressed)
+
+    with open(os.path.join(build_folder, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+# Without a build static files are served as before / Без сборки статика отдаётся как раньше
+def load_manifest(static_folder):
+    try:
+        with open(os.path.join(static_folder, BUILD_DIR, MANIFEST)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+class Assets:
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        # Off when nginx compresses responses / Выключается, если ответы сжимает nginx
+        app.config.setdefault('COMPRESS_RESPONSES', True)
+        app.config.setdefault('COMPRESS_MIN_SIZE', 1024)  # bytes / байт
+        app.config.setdefault('COMPRESS_LEVEL', 6)
+
+        app.extensions['assets'] = load_manifest(app.static_folder)
+        app.url_defaults(self.hashed_url)
+        app.add_url_rule(f'{app.static_url_path}/{BUILD_DIR}/<path:filename>', 'asset', self.serve)
+        app.after_request(self.compress_response)
+
+    # url_for('static', filename='css/style.css') -> /static/build/css/style.<hash>.css
+    def hashed_url(self, endpoint, values):
+        manifest = current_app.extensions['assets']
+        if endpoint == 'static' and values.get('filename') in manifest:
+            values['filename'] = manifest[values['filename']]
+
+    # Hashed files never change, precompressed variant when the client accepts it
+    # Файлы с хэшем никогда не меняются, сжатый вариант, если клиент его принимает
+    def serve(self, filename):
+        path = safe_join(os.path.join(current_app.static_folder, BUILD_DIR), filename)
+        if path is None or filename == MANIFEST or not os.path.isfile(path):
+            abort(404)
+
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        for encoding, ext in (('br', '.br'), ('gzip', '.gz')):
+            if encoding in request.accept_encodings and os.path.isfile(path + ext):
+                response = send_file(path + ext, mimetype=mimetype, max_age=ASSET_MAX_AGE)
+                response.content_encoding = encoding
+                break
+        else:
+            response = send_file(path, mimetype=mimetype, max_age=ASSET_MAX_AGE)
+
+        response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
+    # gzip for pages and JSON, also covers inline CSS / gzip для страниц и JSON, покрывает и встроенный CSS
+    def compress_response(self, response):
+        config = current_app.config
+        if (not config['COMPRESS_RESPONSES'] or response.status_code != 200 or response.is_streamed or response.direct_passthrough
+                or response.content_encoding or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+            return response
+
+        response.vary.add('Accept-Encoding')
+        if 'gzip' not in request.accept_encodings:
+            return response
+        data = response.get_data()
+        if len(data) < config['COMPRESS_MIN_SIZE']:
+            return response
+
+        response.set_data(gzip.compress(data, config['COMPRESS_LEVEL']))
+        response.content_encoding = 'gzip'
+        # Other bytes than the identity body / Байты отличаются от несжатого тела
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+
+
+assets = Assets()
@@ -0,0 +1,274 @@
+# Benchmark harness / Нагрузочный тест
+# Drives scripted user sessions through the app and reports latency, throughput and queries per route
+# Прогоняет сценарии пользователей и считает задержки, пропускную способность и запросы к БД по страницам
+# python benchmark.py --sessions 50 --concurrency 4 --output results.json [--url http://127.0.0.1:5000]
+#                     [--compare baseline.json]
+# python benchmark.py --startup 10 --output startup.json  # import, create_app() and first request in fresh processes
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http.cookiejar import CookieJar
+from threading import local, Lock
+import argparse
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+
+os.environ.setdefault('DATABASE_URL', 'sqlite:///benchmark.db')
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app import create_app
+from constants import CATEGORIES
+from models import db, User, Project, ProjectMember, Task
+from migrations import upgrade
+from seed import seed, seed_username, SEED_PASSWORD
+
+REGRESSION_THRESHOLD = 0.2  # p95 slower by 20% / p95 медленнее на 20%
+
+query_counter = local()
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def count_benchmark_query(conn, cursor, statement, parameters, context, executemany):
+    query_counter.count = getattr(query_counter, 'count', 0) + 1
+
+
+# In-process client / Клиент внутри процесса
+class TestClient:
+    counts_queries = True
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, data=None):
+        response = self.client.open(path, method=method, data=data)
+        return response.status_code
+
+
+# Client for a running server / Клиент для запущенного сервера
+class HttpClient:
+    counts_queries = False
+
+    class NoRedirect(urllib.request.HTTPRedirectHandler):
+        def redirect_request(self, *args, **kwargs):
+            return None
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(CookieJar()), self.NoRedirect)
+
+    def request(self, method, path, data=None):
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        try:
+            with self.opener.open(urllib.request.Request(self.base_url + path, data=body, method=method)) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = {}
+        self.lock = Lock()
+
+    def call(self, client, route, method, path, data=None):
+        query_counter.count = 0
+        started = time.perf_counter()
+        status = client.request(method, path, data)
+        elapsed = time.perf_counter() - started
+        queries = query_counter.count if client.counts_queries else None
+        with self.lock:
+            self.samples.setdefault(route, []).append((elapsed, queries, status))
+        return status
+
+
+# Scripted session / Сценарий сессии
+def user_session(client, recorder, rng, plan):
+    if rng.random() < plan['register_share']:
+        name = f'bench_new_{uuid.uuid4().hex[:16]}'
+        recorder.call(client, 'register', 'POST', '/register',
+                      {'username': name, 'email': f'{name}@example.com', 'password': SEED_PASSWORD})
+        recorder.call(client, 'login', 'POST', '/login', {'username': name, 'password': SEED_PASSWORD})
+        recorder.call(client, 'home', 'GET', '/home')
+        return
+
+    username, project_id, task_ids = rng.choice(plan['members'])
+    recorder.call(client, 'login', 'POST', '/login', {'username': username, 'password': SEED_PASSWORD})
+    recorder.call(client, 'home', 'GET', '/home')
+    recorder.call(client, 'project_tasks', 'GET', f'/project/{project_id}/tasks')
+    recorder.call(client, 'create_task', 'POST', f'/project/{project_id}/tasks/create',
+                  {'task_title': 'Benchmark task', 'priority': 'medium'})
+    if task_ids:
+        task_id = rng.choice(task_ids)
+        recorder.call(client, 'task_modal', 'GET', f'/project/{project_id}/tasks/{task_id}/modal')
+        recorder.call(client, 'update_task', 'POST', f'/project/{project_id}/tasks/{task_id}/update',
+                      {'title': 'Benchmark update', 'status': rng.choice(('todo', 'in_progress', 'done')),
+                       'priority': 'high'})
+    recorder.call(client, 'project_calendar', 'GET', f'/project/{project_id}/calendar')
+    recorder.call(client, 'profile', 'GET', f'/profile/{username}')
+    recorder.call(client, 'logout', 'GET', '/logout')
+
+
+def percentile(values, share):
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(share * len(ordered)) - 1)]
+
+
+def summarize(samples, elapsed):
+    routes = {}
+    for route, rows in sorted(samples.items()):
+        times = [row[0] * 1000 for row in rows]
+        queries = [row[1] for row in rows if row[1] is not None]
+        routes[route] = {
+            'count': len(rows),
+            'errors': sum(1 for row in rows if row[2] >= 500),
+            'p50_ms': round(percentile(times, 0.50), 3),
+            'p95_ms': round(percentile(times, 0.95), 3),
+            'p99_ms': round(percentile(times, 0.99), 3),
+            'mean_ms': round(sum(times) / len(times), 3),
+            'throughput_rps': round(len(rows) / elapsed, 2),
+            'queries_mean': round(sum(queries) / len(queries), 2) if queries else None,
+            'queries_max': max(queries) if queries else None,
+        }
+    total = sum(len(rows) for rows in samples.values())
+    return {'routes': routes, 'total': {'requests': total, 'elapsed_s': round(elapsed, 3),
+                                        'throughput_rps': round(total / elapsed, 2)}}
+
+
+# p95 regressions against a previous run / Регрессии p95 относительно прошлого запуска
+def compare(current, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+
+    regressions = []
+    for route, stats in current['routes'].items():
+        old = baseline['routes'].get(route)
+        if not old:
+            continue
+        change = (stats['p95_ms'] - old['p95_ms']) / old['p95_ms'] if old['p95_ms'] else 0
+        print(f"{route:20} p95 {old['p95_ms']:9.2f} -> {stats['p95_ms']:9.2f} ms ({change:+.0%})")
+        if change > REGRESSION_THRESHOLD:
+            regressions.append(route)
+    return regressions
+
+
+# Runs in a fresh interpreter, prints seconds of each startup step / Выполняется в новом интерпретаторе, печатает секунды шагов запуска
+STARTUP_SCRIPT = '''
+import json, time
+started = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+app = create_app()
+created = time.perf_counter()
+client = app.test_client()
+status = client.get('/login').status_code
+first = time.perf_counter()
+client.get('/login')
+warm = time.perf_counter()
+print(json.dumps({'status': status, 'import': imported - started, 'create_app': created - imported,
+                  'first_request': first - created, 'warm_request': warm - first}))
+'''
+STARTUP_STEPS = ('import', 'create_app', 'first_request', 'warm_request')
+
+
+# Cold start, what a new worker pays before its first response / Холодный старт, цена нового воркера до первого ответа
+def startup(processes):
+    env = dict(os.environ, JOB_WORKERS='0')
+    samples = {}
+    started = time.perf_counter()
+    for _ in range(processes):
+        output = subprocess.run([sys.executable, '-c', STARTUP_SCRIPT], env=env, check=True,
+                                capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+        timings = json.loads(output.stdout.strip().splitlines()[-1])
+        for step in STARTUP_STEPS:
+            samples.setdefault(step, []).append((timings[step], None, timings['status']))
+    return summarize(samples, time.perf_counter() - started)
+
+
+def load_plan(app, args):
+    with app.app_context():
+        db.create_all()
+        upgrade()
+        if not User.query.filter_by(username=seed_username(args.seed, 0)).first():
+            print('Seeding:', seed(args.users, args.projects, args.seed, tuple(CATEGORIES)))
+
+        # Seeded memberships with a few task ids each / Участия из тестовых данных с несколькими задачами
+        rows = db.session.query(User.username, ProjectMember.project_id) \
+            .join(ProjectMember, ProjectMember.user_id == User.id) \
+            .filter(User.username.like(f'bench\\_{args.seed}\\_%', escape='\\')).all()
+        project_ids = {project_id for _, project_id in rows}
+        task_ids = {}
+        for project_id, task_id in db.session.query(Task.project_id, Task.id) \
+                .filter(Task.project_id.in_(project_ids)).order_by(Task.id.desc()):
+            if len(task_ids.setdefault(project_id, [])) < 20:
+                task_ids[project_id].append(task_id)
+        project_count = Project.query.count()
+
+    return {'register_share': args.register_share, 'project_count': project_count,
+            'members': [(username, project_id, task_ids.get(project_id, [])) for username, project_id in rows]}
+
+
+def report(results, args):
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+
+    for route, stats in results['routes'].items():
+        print(f"{route:20} n={stats['count']:5} p50={stats['p50_ms']:8.2f} p95={stats['p95_ms']:8.2f} "
+              f"p99={stats['p99_ms']:8.2f} ms  q={stats['queries_mean']}")
+    print(f"total {results['total']['requests']} requests, {results['total']['throughput_rps']} req/s")
+
+    if args.compare and compare(results, args.compare):
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='TeamEasy benchmark')
+    parser.add_argument('--sessions', type=int, default=50)
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--projects', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--register-share', type=float, default=0.1)
+    parser.add_argument('--url', help='Benchmark a running server instead of the test client')
+    parser.add_argument('--output', default='benchmark.json')
+    parser.add_argument('--compare', help='Previous results to compare p95 with')
+    parser.add_argument('--startup', type=int, metavar='PROCESSES', help='Measure cold start in this many processes')
+    args = parser.parse_args()
+
+    if args.startup:
+        results = startup(args.startup)
+        results['meta'] = {'date': datetime.now().isoformat(timespec='seconds'), 'processes': args.startup}
+        report(results, args)
+        return
+
+    app = create_app()
+    plan = load_plan(app, args)
+    recorder = Recorder()
+
+    def run(index):
+        client = HttpClient(args.url) if args.url else TestClient(app)
+        user_session(client, recorder, random.Random(args.seed * 100003 + index), plan)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        list(executor.map(run, range(args.sessions)))
+    elapsed = time.perf_counter() - started
+
+    results = summarize(recorder.samples, elapsed)
+    results['meta'] = {'date': datetime.now().isoformat(timespec='seconds'), 'sessions': args.sessions,
+                       'concurrency': args.concurrency, 'target': args.url or 'test-client',
+                       'database': app.config['SQLALCHEMY_DATABASE_URI'], 'projects': plan['project_count']}
+    report(results, args)
+
+
+if __name__ == '__main__':
+    main()
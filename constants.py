@@ -0,0 +1,22 @@
+# Values shared by pages, export/import and the CLI / Значения, общие для страниц, экспорта/импорта и CLI
+
+
+# Matching category names / Сопоставление названий категорий
+CATEGORIES = {
+    "software-development": "Разработка программного обеспечения",
+    "web-development": "Веб-разработка",
+    "mobile-apps": "Мобильные приложения",
+    "game-development": "Игровая разработка",
+    "blockchain-cryptocurrency": "Блокчейн и криптовалюты",
+    "artificial-intelligence": "Искусственный интеллект",
+    "internet-of-things": "Интернет вещей",
+    "cybersecurity": "Кибербезопасность",
+    "data-analytics": "Аналитика данных",
+    "cloud-technologies": "Облачные технологии",
+    "other": "Другое"
+}
+
+
+# Task board columns and priorities / Колонки и приоритеты доски задач
+TASK_STATUSES = ('todo', 'in_progress', 'done')
+TASK_PRIORITIES = ('low', 'medium', 'high')
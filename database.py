@@ -0,0 +1,95 @@
+# Database engine setup / Настройка подключения к базе данных
+# SQLite gets WAL pragmas, PostgreSQL gets a connection pool and an optional read replica
+# SQLite получает прагмы WAL, PostgreSQL - пул соединений и необязательную реплику для чтения
+from flask import current_app, g, has_request_context, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+from functools import wraps
+import os
+import sqlite3
+import time
+
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+
+
+def database_uri(uri):
+    # SQLAlchemy needs 'postgresql://' / SQLAlchemy требует 'postgresql://'
+    if uri.startswith('postgres://'):
+        return 'postgresql://' + uri[len('postgres://'):]
+    return uri
+
+
+def engine_options(uri):
+    if make_url(uri).get_backend_name() == 'sqlite':
+        return {}
+    return {
+        'pool_size': int(os.environ.get('DATABASE_POOL_SIZE', 5)),
+        'max_overflow': int(os.environ.get('DATABASE_MAX_OVERFLOW', 10)),
+        'pool_pre_ping': os.environ.get('DATABASE_POOL_PRE_PING', '1') == '1',
+        'pool_recycle': int(os.environ.get('DATABASE_POOL_RECYCLE', 1800)),
+    }
+
+
+# SQLite pragmas for concurrent workers / Прагмы SQLite для нескольких воркеров
+@event.listens_for(Engine, 'connect')
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.execute(f'PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}')
+    cursor.execute(f'PRAGMA mmap_size={SQLITE_MMAP_SIZE}')
+    cursor.close()
+
+
+# Session that sends reads of marked views to the replica / Сессия, отправляющая чтение отмеченных страниц в реплику
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and has_request_context() and g.get('use_replica'):
+            replica = self._db.engines.get('replica')
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+# Read-only view decorator / Декоратор страниц только для чтения
+def read_replica(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if session.get('primary_until', 0) < time.time():
+            g.use_replica = True
+        return view(*args, **kwargs)
+
+    return wrapper
+
+
+# Replica bind and primary stickiness from app.config, call before db.init_app
+# Подключение реплики и привязка к основной базе из app.config, вызывать до db.init_app
+class ReplicaRouting:
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        # e.g. 'postgresql://replica/teameasy', None for no replica / None - без реплики
+        app.config.setdefault('DATABASE_REPLICA_URL', None)
+        # Reads go to primary for a while after the user writes / После записи чтение какое-то время идёт с основной базы
+        app.config.setdefault('DATABASE_PRIMARY_STICKY_SECONDS', 5)
+
+        binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+        if app.config['DATABASE_REPLICA_URL']:
+            url = database_uri(app.config['DATABASE_REPLICA_URL'])
+            binds['replica'] = {'url': url, **engine_options(url)}
+        app.config['SQLALCHEMY_BINDS'] = binds
+        app.after_request(self.stick_to_primary)
+
+    def stick_to_primary(self, response):
+        if request.method not in ('GET', 'HEAD', 'OPTIONS') and 'replica' in current_app.config['SQLALCHEMY_BINDS']:
+            session['primary_until'] = time.time() + current_app.config['DATABASE_PRIMARY_STICKY_SECONDS']
+        return response
+
+
+replica_routing = ReplicaRouting()
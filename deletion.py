@@ -0,0 +1,87 @@
+# Project deletion / Удаление проектов
+# Small projects are deleted in one transaction, large ones in chunks by a background job
+# Небольшие проекты удаляются одной транзакцией, большие - частями фоновой задачей
+from flask import current_app
+from models import db, Project, ProjectMember, Task, Event, EventOverride
+from jobs import job_queue
+
+# Backends where foreign keys are declared ON DELETE CASCADE / Базы, где внешние ключи объявлены с ON DELETE CASCADE
+CASCADE_DIALECTS = ('postgresql',)
+PROJECT_CHILDREN = (Task, EventOverride, Event, ProjectMember)
+
+
+class ProjectDeleter:
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        # Tasks and events above which deletion goes to background / Число задач и событий для фонового удаления
+        app.config.setdefault('PROJECT_DELETE_BACKGROUND_THRESHOLD', 5000)
+        app.config.setdefault('PROJECT_DELETE_CHUNK_SIZE', 1000)
+
+    def project_size(self, project_id):
+        tasks = db.session.query(db.func.count(Task.id)).filter(Task.project_id == project_id).scalar_subquery()
+        events = db.session.query(db.func.count(Event.id)).filter(Event.project_id == project_id).scalar_subquery()
+        return db.session.query(tasks + events).scalar()
+
+    # Returns True when deletion continues in background / Возвращает True, если удаление продолжится в фоне
+    def delete(self, project):
+        if self.project_size(project.id) <= current_app.config['PROJECT_DELETE_BACKGROUND_THRESHOLD']:
+            self.delete_now(project.id)
+            return False
+
+        # Hide the project right away, rows go later / Проект сразу скрывается, строки удаляются позже
+        project.deleting = True
+        project.is_public = False
+        db.session.execute(db.delete(ProjectMember).where(ProjectMember.project_id == project.id))
+        # Queued in the same transaction / Ставится в очередь в той же транзакции
+        job_queue.enqueue('delete_project', {'project_id': project.id}, key=f'delete_project:{project.id}')
+        db.session.commit()
+        return True
+
+    # Set-based deletes in the caller's transaction / Удаление множествами в транзакции вызывающего
+    def delete_now(self, project_id):
+        if db.session.get_bind().dialect.name not in CASCADE_DIALECTS:
+            for model in PROJECT_CHILDREN:
+                db.session.execute(db.delete(model).where(model.project_id == project_id))
+        db.session.execute(db.delete(Project).where(Project.id == project_id))
+
+    # Short transactions so SQLite writers are not blocked for long / Короткие транзакции, чтобы не блокировать SQLite
+    def delete_chunked(self, project_id):
+        deleted = 0
+        for model in PROJECT_CHILDREN:
+            deleted += self.purge(model, model.project_id == project_id)
+        db.session.execute(db.delete(Project).where(Project.id == project_id))
+        db.session.commit()
+        return deleted
+
+    def purge(self, model, condition):
+        chunk_size = current_app.config['PROJECT_DELETE_CHUNK_SIZE']
+        deleted = 0
+        while True:
+            chunk = db.select(model.id).where(condition).limit(chunk_size)
+            count = db.session.execute(db.delete(model).where(model.id.in_(chunk))).rowcount
+            db.session.commit()
+            deleted += count
+            if count < chunk_size:
+                return deleted
+
+    # Rows of missing projects and unfinished deletions / Строки удалённых проектов и незавершённые удаления
+    def purge_orphans(self):
+        counts = {}
+        for model in PROJECT_CHILDREN:
+            missing = ~db.exists().where(Project.id == model.project_id)
+            counts[model.__tablename__] = self.purge(model, missing)
+        for (project_id,) in db.session.query(Project.id).filter(Project.deleting == db.true()).all():
+            counts[f'project {project_id}'] = self.delete_chunked(project_id)
+        return counts
+
+
+project_deleter = ProjectDeleter()
+
+
+# Retried by the queue, chunks already deleted stay deleted / Повторяется очередью, удалённые части не возвращаются
+@job_queue.task('delete_project')
+def delete_project_job(project_id):
+    project_deleter.delete_chunked(project_id)
@@ -0,0 +1,133 @@
+# Versioned fragment cache / Кэш фрагментов страниц с версиями
+# Rendered HTML is keyed by (fragment, project id, project version), writes bump the version
+# Готовый HTML хранится по ключу (фрагмент, id проекта, версия проекта), изменения увеличивают версию
+from flask import current_app
+from markupsafe import Markup
+from collections import OrderedDict
+from threading import Lock
+import time
+
+
+# Shared backend stand-in for development and tests / Замена общего хранилища для разработки и тестов
+class LocalBackend:
+    def __init__(self):
+        self.data = {}
+        self.lock = Lock()
+
+    def get(self, key):
+        with self.lock:
+            item = self.data.get(key)
+        if item is None or item[1] < time.time():
+            return None
+        return item[0]
+
+    def set(self, key, value, timeout):
+        with self.lock:
+            self.data[key] = (value, time.time() + timeout)
+
+
+# Cache shared by all workers, needs the redis package / Общий кэш для всех воркеров, нужен пакет redis
+class RedisBackend:
+    def __init__(self, url):
+        import redis
+        self.client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        value = self.client.get(key)
+        return value.decode() if value is not None else None
+
+    def set(self, key, value, timeout):
+        self.client.set(key, value.encode(), ex=timeout)
+
+
+# Local LRU and shared backend of one app / Локальный LRU и общее хранилище одного приложения
+class FragmentStore:
+    def __init__(self, max_size, timeout, backend):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.backend = backend
+        self.items = OrderedDict()
+        self.size = 0
+        self.lock = Lock()
+
+    def get(self, key):
+        with self.lock:
+            value = self.items.get(key)
+            if value is not None:
+                self.items.move_to_end(key)
+                return value
+
+        if self.backend is not None:
+            value = self.backend.get(key)
+            if value is not None:
+                self.store(key, value)
+        return value
+
+    # Local LRU limited by total size / Локальный LRU с ограничением по общему размеру
+    def store(self, key, value):
+        if len(value) > self.max_size:
+            return
+        with self.lock:
+            if key in self.items:
+                self.size -= len(self.items.pop(key))
+            self.items[key] = value
+            self.size += len(value)
+            while self.size > self.max_size:
+                _, old = self.items.popitem(last=False)
+                self.size -= len(old)
+
+    def set(self, key, value):
+        self.store(key, value)
+        if self.backend is not None:
+            self.backend.set(key, value, self.timeout)
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+            self.size = 0
+
+
+class FragmentCache:
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('FRAGMENT_CACHE_ENABLED', True)
+        app.config.setdefault('FRAGMENT_CACHE_MAX_SIZE', 16 * 1024 * 1024)  # characters / символов
+        # None, 'local://' or 'redis://host:6379/0' / None, 'local://' или 'redis://host:6379/0'
+        app.config.setdefault('FRAGMENT_CACHE_URL', None)
+        app.config.setdefault('FRAGMENT_CACHE_TIMEOUT', 24 * 60 * 60)
+
+        url = app.config['FRAGMENT_CACHE_URL']
+        if not url:
+            backend = None
+        elif url.startswith('local://'):
+            backend = LocalBackend()
+        else:
+            backend = RedisBackend(url)
+        app.extensions['fragment_cache'] = FragmentStore(app.config['FRAGMENT_CACHE_MAX_SIZE'],
+                                                         app.config['FRAGMENT_CACHE_TIMEOUT'], backend)
+
+    @property
+    def store(self):
+        return current_app.extensions['fragment_cache']
+
+    # Cached HTML or render() result / HTML из кэша или результат render()
+    def render(self, name, scope_id, version, render, *key_parts):
+        if not current_app.config['FRAGMENT_CACHE_ENABLED']:
+            return Markup(render())
+
+        store = self.store
+        key = ':'.join(['fragment', name, str(scope_id), str(version), *map(str, key_parts)])
+        html = store.get(key)
+        if html is None:
+            html = str(render())
+            store.set(key, html)
+        return Markup(html)
+
+    def clear(self):
+        self.store.clear()
+
+
+fragment_cache = FragmentCache()
@@ -0,0 +1,36 @@
+# gunicorn settings from environment / Настройки gunicorn из переменных окружения
+# gunicorn -c gunicorn.conf.py wsgi:app
+import multiprocessing
+import os
+
+bind = os.environ.get('BIND', '127.0.0.1:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+# Threads per worker, live update streams hold one each / Потоки на воркер, каждый поток живых обновлений занимает один
+threads = int(os.environ.get('WEB_THREADS', 8))
+# With threads at most LIVE_MAX_STREAMS of them stream, later clients poll every LIVE_POLL_INTERVAL.
+# WEB_WORKER_CLASS=gevent (needs the gevent package) streams without holding threads, raise LIVE_MAX_STREAMS with it.
+# С потоками стримят не больше LIVE_MAX_STREAMS из них, остальные клиенты опрашивают раз в LIVE_POLL_INTERVAL.
+# WEB_WORKER_CLASS=gevent (нужен пакет gevent) стримит без занятия потоков, вместе с ним увеличьте LIVE_MAX_STREAMS.
+worker_class = os.environ.get('WEB_WORKER_CLASS', 'gthread' if threads > 1 else 'sync')
+worker_connections = int(os.environ.get('WEB_WORKER_CONNECTIONS', 1000))
+# App is created once in the master, workers share its memory / Приложение создаётся один раз в мастере, воркеры делят память
+preload_app = os.environ.get('WEB_PRELOAD', '1') == '1'
+# Live update streams are closed by the app after LIVE_STREAM_TIMEOUT / Потоки закрываются приложением по LIVE_STREAM_TIMEOUT
+timeout = int(os.environ.get('WEB_TIMEOUT', 60))
+keepalive = int(os.environ.get('WEB_KEEPALIVE', 5))
+# Restart workers from time to time against slow leaks / Периодический перезапуск воркеров против утечек
+max_requests = int(os.environ.get('WEB_MAX_REQUESTS', 0))
+max_requests_jitter = max_requests // 10
+accesslog = os.environ.get('WEB_ACCESS_LOG')
+
+
+# Connections opened in the master are not shared with workers / Соединения мастера не используются воркерами
+# Live updates need LIVE_UPDATES_URL with several workers, otherwise pages poll
+# Живым обновлениям нужен LIVE_UPDATES_URL при нескольких воркерах, иначе страницы опрашивают сервер
+def post_fork(server, worker):
+    from models import db
+    app = server.app.wsgi()
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+    app.extensions['live_updates'].use_processes(server.cfg.workers)
@@ -0,0 +1,136 @@
+# Cached current user / Кэш текущего пользователя
+# Pages only need id, username and photo of the current user, they are kept in memory by (user id, user version).
+# The session stores "id:version", so a profile or password change moves every session to a new key.
+# Страницам нужны только id, имя и фото текущего пользователя, они хранятся в памяти по ключу (id, версия).
+# Сессия хранит "id:версия", поэтому изменение профиля или пароля переводит все сессии на новый ключ.
+from flask import current_app, has_request_context, session
+from flask_login import UserMixin
+from models import db, login_manager, User, profile_photo_url
+from collections import OrderedDict
+from threading import Lock
+import time
+
+IDENTITY_FIELDS = ('id', 'username', 'profile_photo', 'version')
+
+
+# Stands in for User, the row is loaded on first use of any other attribute
+# Заменяет User, строка загружается при первом обращении к другому атрибуту
+class CachedUser(UserMixin):
+    def __init__(self, fields):
+        self.__dict__.update(fields)
+
+    def get_id(self):
+        return f'{self.id}:{self.version}'
+
+    def get_profile_photo_url(self, size='small'):
+        return profile_photo_url(self.profile_photo, size)
+
+    @property
+    def user(self):
+        if '_user' not in self.__dict__:
+            self.__dict__['_user'] = db.session.get(User, self.id)
+        return self.__dict__['_user']
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.user, name)
+
+    # Writes go to the row / Запись идёт в строку
+    def __setattr__(self, name, value):
+        setattr(self.user, name, value)
+        if name in IDENTITY_FIELDS:
+            self.__dict__[name] = value
+
+
+# Cached identities of one app / Кэшированные пользователи одного приложения
+class CacheEntries:
+    def __init__(self, max_size, timeout):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.items = OrderedDict()
+        self.lock = Lock()
+
+
+class UserCache:
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('USER_CACHE_SIZE', 10000)  # users / пользователей
+        # Other processes see a change after this at most / Другие процессы видят изменение не позже этого
+        app.config.setdefault('USER_CACHE_TIMEOUT', 60)  # seconds / секунды
+
+        app.extensions['user_cache'] = CacheEntries(app.config['USER_CACHE_SIZE'], app.config['USER_CACHE_TIMEOUT'])
+        login_manager.user_loader(self.load_user)
+
+    @property
+    def entries(self):
+        return current_app.extensions['user_cache']
+
+    def get(self, key):
+        entries = self.entries
+        with entries.lock:
+            item = entries.items.get(key)
+            if item is None:
+                return None
+            if item[0] < time.monotonic():
+                del entries.items[key]
+                return None
+            entries.items.move_to_end(key)
+            return item[1]
+
+    def store(self, user):
+        fields = {name: getattr(user, name) for name in IDENTITY_FIELDS}
+        entries = self.entries
+        with entries.lock:
+            entries.items[(user.id, user.version)] = (time.monotonic() + entries.timeout, fields)
+            entries.items.move_to_end((user.id, user.version))
+            while len(entries.items) > entries.max_size:
+                entries.items.popitem(last=False)
+        return fields
+
+    def invalidate(self, user_id):
+        entries = self.entries
+        with entries.lock:
+            for key in [key for key in entries.items if key[0] == user_id]:
+                del entries.items[key]
+
+    # Session id is "id:version", older sessions have only the id / Id сессии "id:версия", у старых сессий только id
+    def load_user(self, user_id):
+        user_id, _, version = user_id.partition(':')
+        try:
+            user_id = int(user_id)
+            version = int(version) if version else None
+        except ValueError:
+            return None
+
+        fields = self.get((user_id, version))
+        if fields is None:
+            user = db.session.get(User, user_id)
+            if user is None:
+                return None
+            fields = self.store(user)
+            # Session of another version moves to the current one / Сессия другой версии переходит на текущую
+            if fields['version'] != version and has_request_context():
+                session['_user_id'] = f'{user_id}:{fields["version"]}'
+        return CachedUser(fields)
+
+    # Call after commit of a touched user / Вызывать после commit изменённого пользователя
+    def refresh(self, user_id):
+        self.invalidate(user_id)
+        user = db.session.get(User, user_id)
+        if user is None:
+            return
+        self.store(user)
+        if has_request_context() and session.get('_user_id', '').partition(':')[0] == str(user_id):
+            session['_user_id'] = user.get_id()
+
+    def clear(self):
+        entries = self.entries
+        with entries.lock:
+            entries.items.clear()
+
+
+user_cache = UserCache()
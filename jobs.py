@@ -0,0 +1,202 @@
+# Background job queue / Очередь фоновых задач
+# Jobs are rows of the job table, so the queue survives restarts and needs no external services.
+# Workers run as threads inside the app or as a separate process: flask run-jobs
+# Задачи хранятся в таблице job, поэтому очередь переживает перезапуск и не требует внешних сервисов.
+# Воркеры работают потоками внутри приложения или отдельным процессом: flask run-jobs
+from flask import current_app
+from models import db, Job
+from datetime import datetime, timedelta, timezone
+from threading import Event, Lock, Thread
+import json
+import logging
+import time
+
+logger = logging.getLogger('teameasy.jobs')
+
+CLAIM_BATCH = 10
+
+
+def utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+# Worker threads of one app / Потоки-воркеры одного приложения
+class Workers:
+    def __init__(self):
+        self.threads = []
+        self.lock = Lock()
+        self.stopping = Event()
+        self.last_cleanup = 0
+
+
+# Handlers are shared by all apps, workers are kept per app in app.extensions['job_queue']
+# Обработчики общие для всех приложений, воркеры хранятся отдельно в app.extensions['job_queue']
+class JobQueue:
+    def __init__(self, app=None):
+        self.handlers = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        # Worker threads started with the first request, 0 for a separate process only
+        # Потоки-воркеры запускаются с первым запросом, 0 - только отдельный процесс
+        app.config.setdefault('JOB_WORKERS', 1)
+        app.config.setdefault('JOB_POLL_INTERVAL', 1.0)  # seconds / секунды
+        # Running job is given back to the queue after this / Через это время задача возвращается в очередь
+        app.config.setdefault('JOB_VISIBILITY_TIMEOUT', 600)
+        app.config.setdefault('JOB_MAX_ATTEMPTS', 5)
+        app.config.setdefault('JOB_BACKOFF_BASE', 5)  # seconds, doubles per attempt / секунды, удваивается
+        app.config.setdefault('JOB_BACKOFF_MAX', 60 * 60)
+        # Finished jobs are kept for this long / Столько хранятся завершённые задачи
+        app.config.setdefault('JOB_RETENTION', 7 * 24 * 60 * 60)
+
+        app.extensions['job_queue'] = Workers()
+        app.before_request(self.start_workers)
+
+    # Handler registration / Регистрация обработчика
+    def task(self, name):
+        def decorator(handler):
+            self.handlers[name] = handler
+            return handler
+
+        return decorator
+
+    # Adds a job to the caller's transaction, it becomes visible on commit.
+    # A job with the same key that is not finished yet is returned instead of a new one.
+    # Добавляет задачу в транзакцию вызывающего, она станет видна после commit.
+    # Если незавершённая задача с тем же ключом уже есть, возвращается она.
+    def enqueue(self, name, payload=None, key=None, delay=0, max_attempts=None):
+        if name not in self.handlers:
+            raise LookupError(f'Unknown job: {name}')
+        if key is not None:
+            existing = Job.query.filter_by(idempotency_key=key).first()
+            if existing is not None:
+                return existing
+
+        now = utcnow()
+        job = Job(name=name, payload=json.dumps(payload or {}), idempotency_key=key,
+                  max_attempts=max_attempts or current_app.config['JOB_MAX_ATTEMPTS'],
+                  run_at=now + timedelta(seconds=delay), created_at=now)
+        db.session.add(job)
+        return job
+
+    def backoff(self, attempts):
+        return min(current_app.config['JOB_BACKOFF_BASE'] * 2 ** (attempts - 1), current_app.config['JOB_BACKOFF_MAX'])
+
+    # Takes the next due job or one whose worker stopped answering / Берёт следующую задачу или задачу зависшего воркера
+    def claim(self):
+        now = utcnow()
+        due = db.or_(db.and_(Job.status == 'queued', Job.run_at <= now),
+                     db.and_(Job.status == 'running', Job.locked_until <= now))
+        candidates = db.session.query(Job.id).filter(due).order_by(Job.run_at, Job.id).limit(CLAIM_BATCH).all()
+        db.session.commit()
+
+        for (job_id,) in candidates:
+            # Conditional update, so only one worker gets the job / Условное обновление: задачу получит один воркер
+            locked_until = now + timedelta(seconds=current_app.config['JOB_VISIBILITY_TIMEOUT'])
+            claimed = db.session.execute(db.update(Job).where(Job.id == job_id, due).values(
+                status='running', attempts=Job.attempts + 1, locked_until=locked_until)).rowcount
+            db.session.commit()
+            if not claimed:
+                continue
+
+            job = db.session.get(Job, job_id)
+            if job.attempts > job.max_attempts:
+                # Worker died on the last attempt / Воркер остановился на последней попытке
+                self.finish(job.id, job.locked_until, 'failed', last_error='Visibility timeout expired')
+                continue
+            return job
+        return None
+
+    def run(self, job):
+        job_id, name, lock = job.id, job.name, job.locked_until
+        attempts, max_attempts = job.attempts, job.max_attempts
+        payload = json.loads(job.payload)
+
+        started = time.perf_counter()
+        try:
+            handler = self.handlers.get(name)
+            if handler is None:
+                raise LookupError(f'Unknown job: {name}')
+            handler(**payload)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            error = f'{type(e).__name__}: {e}'
+            if attempts >= max_attempts:
+                logger.exception('Job %s (%s) failed after %d attempts', job_id, name, attempts)
+                self.finish(job_id, lock, 'failed', last_error=error)
+            else:
+                delay = self.backoff(attempts)
+                logger.warning('Job %s (%s) attempt %d failed, retry in %ds: %s', job_id, name, attempts, delay, error)
+                self.finish(job_id, lock, 'queued', last_error=error, run_at=utcnow() + timedelta(seconds=delay))
+            return False
+
+        logger.info('Job %s (%s) done in %.1f ms', job_id, name, (time.perf_counter() - started) * 1000)
+        self.finish(job_id, lock, 'done')
+        return True
+
+    # Lock check keeps a late worker from overwriting a reclaimed job / Проверка блокировки не даёт опоздавшему воркеру перезаписать задачу
+    def finish(self, job_id, lock, status, **values):
+        if status != 'queued':
+            # Key is free again once the job is finished / Ключ снова свободен после завершения задачи
+            values.update(idempotency_key=None, finished_at=utcnow())
+        db.session.execute(db.update(Job).where(Job.id == job_id, Job.locked_until == lock)
+                           .values(status=status, locked_until=None, **values))
+        db.session.commit()
+
+    # Runs due jobs until none are left / Выполняет готовые задачи, пока они есть
+    def run_pending(self):
+        count = 0
+        while (job := self.claim()) is not None:
+            self.run(job)
+            count += 1
+        return count
+
+    def cleanup(self):
+        before = utcnow() - timedelta(seconds=current_app.config['JOB_RETENTION'])
+        db.session.execute(db.delete(Job).where(Job.status.in_(('done', 'failed')), Job.finished_at < before))
+        db.session.commit()
+
+    # Worker loop, app is taken from the current context when not given / Цикл воркера, app по умолчанию из контекста
+    def work(self, app=None, once=False):
+        app = app or current_app._get_current_object()
+        workers = app.extensions['job_queue']
+        while not workers.stopping.is_set():
+            with app.app_context():
+                try:
+                    self.run_pending()
+                    if time.time() - workers.last_cleanup > 60 * 60:
+                        workers.last_cleanup = time.time()
+                        self.cleanup()
+                except Exception:
+                    db.session.rollback()
+                    logger.exception('Job worker error')
+            if once:
+                return
+            workers.stopping.wait(app.config['JOB_POLL_INTERVAL'])
+
+    def start_workers(self):
+        workers = current_app.extensions['job_queue']
+        if workers.threads or not current_app.config['JOB_WORKERS']:
+            return
+        app = current_app._get_current_object()
+        with workers.lock:
+            if workers.threads:
+                return
+            for i in range(app.config['JOB_WORKERS']):
+                # Daemon threads: jobs of a stopped process are reclaimed after the visibility timeout
+                # Фоновые потоки: задачи остановленного процесса забираются после таймаута видимости
+                thread = Thread(target=self.work, args=(app,), name=f'job-worker-{i}', daemon=True)
+                thread.start()
+                workers.threads.append(thread)
+
+    # Stops the worker threads of the current app / Останавливает потоки-воркеры текущего приложения
+    def stop(self, timeout=None):
+        workers = current_app.extensions['job_queue']
+        workers.stopping.set()
+        for thread in workers.threads:
+            thread.join(timeout)
+
+
+job_queue = JobQueue()
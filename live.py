@@ -0,0 +1,292 @@
+# Live project updates over Server-Sent Events / Живые обновления проекта через Server-Sent Events
+# Write routes publish compact changes after commit, the broker fans them out to every open stream of the project.
+# Several app processes share changes through a pub/sub backend.
+# Изменяющие страницы публикуют короткие изменения после commit, брокер рассылает их всем открытым потокам проекта.
+# Несколько процессов приложения обмениваются изменениями через pub/sub.
+from flask import current_app, g
+from collections import deque, OrderedDict
+from threading import Lock, Thread
+import json
+import logging
+import queue
+import time
+
+logger = logging.getLogger('teameasy.live')
+
+CHANNEL = 'teameasy:live'
+
+
+# Pub/sub stand-in for development and tests / Замена pub/sub для разработки и тестов
+class LocalPubSub:
+    def __init__(self):
+        self.listeners = []
+
+    def publish(self, message):
+        for listener in self.listeners:
+            listener(message)
+
+    def subscribe(self, listener):
+        self.listeners.append(listener)
+
+
+# Shared by all processes, needs the redis package / Общий для всех процессов, нужен пакет redis
+class RedisPubSub:
+    def __init__(self, url):
+        import redis
+        self.client = redis.Redis.from_url(url)
+
+    def publish(self, message):
+        self.client.publish(CHANNEL, message)
+
+    def subscribe(self, listener):
+        def listen():
+            while True:
+                try:
+                    pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                    pubsub.subscribe(CHANNEL)
+                    for item in pubsub.listen():
+                        listener(item['data'].decode())
+                except Exception:
+                    logger.exception('Live updates subscription lost, reconnecting')
+                    time.sleep(1)
+
+        Thread(target=listen, name='live-pubsub', daemon=True).start()
+
+
+class Subscriber:
+    def __init__(self, size):
+        self.queue = queue.Queue(maxsize=size)
+        self.overflow = False
+
+    def put(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except queue.Full:
+            # Client is too slow, it reloads instead / Клиент не успевает, вместо этого он перезагрузит страницу
+            self.overflow = True
+
+
+def sse(event, data, event_id=None):
+    head = f'id: {event_id}\n' if event_id is not None else ''
+    return f'{head}event: {event}\ndata: {data}\n\n'
+
+
+# Histories and open streams of one app / Истории и открытые потоки одного приложения
+class LiveBroker:
+    def __init__(self, config):
+        self.history_size = config['LIVE_HISTORY_SIZE']
+        self.history_projects = config['LIVE_HISTORY_PROJECTS']
+        self.keepalive = config['LIVE_KEEPALIVE']
+        self.stream_timeout = config['LIVE_STREAM_TIMEOUT']
+        self.queue_size = config['LIVE_QUEUE_SIZE']
+        self.max_streams = config['LIVE_MAX_STREAMS']
+        self.poll_interval = config['LIVE_POLL_INTERVAL']
+
+        url = config['LIVE_UPDATES_URL']
+        if not url:
+            self.backend = None
+        elif url.startswith('local://'):
+            self.backend = LocalPubSub()
+        else:
+            self.backend = RedisPubSub(url)
+        self.listening = False
+        # Set when several processes share no pub/sub / Включается, когда у нескольких процессов нет общего pub/sub
+        self.polling = False
+        self.streams = 0
+        self.histories = OrderedDict()
+        self.floors = {}
+        self.floor = 0
+        self.subscribers = {}
+        self.last_id = 0
+        self.started = time.time_ns()
+        self.lock = Lock()
+
+    # On the first request, so a preloading server subscribes in each worker, not in the master
+    # При первом запросе, чтобы сервер с preload подписывался в каждом воркере, а не в мастере
+    def listen(self):
+        with self.lock:
+            if self.listening:
+                return
+            self.listening = True
+        self.backend.subscribe(lambda message: self.dispatch(json.loads(message)))
+
+    # Called in each server worker. Without a shared backend the workers do not see each other's changes,
+    # so pages poll the project version and reload when it changes.
+    # Вызывается в каждом воркере сервера. Без общего pub/sub воркеры не видят изменений друг друга,
+    # поэтому страницы опрашивают версию проекта и перезагружаются при её изменении.
+    def use_processes(self, count):
+        if count > 1 and not isinstance(self.backend, RedisPubSub):
+            logger.warning('%d worker processes without a shared LIVE_UPDATES_URL, live updates fall back to polling '
+                           'every %d s', count, self.poll_interval)
+            self.polling = True
+
+    # Time based ids, so they are ordered across processes / Id по времени, упорядочены между процессами
+    def next_id(self):
+        with self.lock:
+            self.last_id = max(time.time_ns(), self.last_id + 1)
+            return self.last_id
+
+    # Call after commit / Вызывать после commit
+    def publish(self, project_id, event, data):
+        message = {'id': self.next_id(), 'project_id': project_id, 'event': event, 'data': data}
+        if self.backend is None:
+            self.dispatch(message)
+        else:
+            self.backend.publish(json.dumps(message))
+
+    def dispatch(self, message):
+        project_id = message['project_id']
+        with self.lock:
+            history = self.histories.get(project_id)
+            if history is None:
+                history = self.histories[project_id] = deque(maxlen=self.history_size)
+                # Resuming from before a dropped history needs a reload / Продолжение до удалённой истории требует перезагрузки
+                while len(self.histories) > self.history_projects:
+                    old_id, old = self.histories.popitem(last=False)
+                    self.floor = max(self.floor, old[-1]['id'] if old else 0, self.floors.pop(old_id, 0))
+            self.histories.move_to_end(project_id)
+
+            if len(history) == history.maxlen:
+                self.floors[project_id] = history[0]['id']
+            history.append(message)
+            for subscriber in self.subscribers.get(project_id, ()):
+                subscriber.put(message)
+
+    # Messages after last_id, None if they are gone, call with the lock held
+    # Сообщения после last_id, None если их уже нет, вызывать под блокировкой
+    def history_after(self, project_id, last_id):
+        floor = max(self.floor, self.floors.get(project_id, 0), self.started)
+        if last_id is not None and last_id < floor:
+            return None
+        return [message for message in self.histories.get(project_id, ())
+                if last_id is None or message['id'] > last_id]
+
+    # Backlog after last_id and registration in one step, so nothing is lost in between, None if it is gone
+    # Пропущенные изменения и подписка за один шаг, чтобы ничего не потерять, None если их уже нет
+    def subscribe(self, project_id, last_id):
+        subscriber = Subscriber(self.queue_size)
+        with self.lock:
+            backlog = self.history_after(project_id, last_id)
+            if backlog is not None:
+                self.subscribers.setdefault(project_id, set()).add(subscriber)
+        return subscriber, backlog
+
+    def unsubscribe(self, project_id, subscriber):
+        with self.lock:
+            subscribers = self.subscribers.get(project_id)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self.subscribers[project_id]
+
+    # SSE body for one project, stale if the project changed since the page was rendered
+    # Тело SSE для одного проекта, stale если проект изменился после отрисовки страницы
+    def stream(self, project_id, last_id, stale=False):
+        if self.polling:
+            return self.poll_version(stale)
+
+        def generate():
+            # The slot is taken when the body starts, so an unsent response holds nothing
+            # Место занимается с началом тела, поэтому неотправленный ответ ничего не держит
+            with self.lock:
+                streaming = self.streams < self.max_streams
+                if streaming:
+                    self.streams += 1
+            if not streaming:
+                yield from self.poll(project_id, last_id)
+                return
+
+            subscriber, backlog = self.subscribe(project_id, last_id)
+            try:
+                yield 'retry: 3000\n\n'
+                if backlog is None:
+                    yield sse('reload', '{}')
+                    return
+                for message in backlog:
+                    yield sse(message['event'], json.dumps(message['data']), message['id'])
+
+                deadline = time.monotonic() + self.stream_timeout
+                while time.monotonic() < deadline:
+                    try:
+                        message = subscriber.queue.get(timeout=self.keepalive)
+                    except queue.Empty:
+                        yield ': keepalive\n\n'
+                        continue
+                    if subscriber.overflow:
+                        yield sse('reload', '{}')
+                        return
+                    yield sse(message['event'], json.dumps(message['data']), message['id'])
+            finally:
+                self.unsubscribe(project_id, subscriber)
+                with self.lock:
+                    self.streams -= 1
+
+        return generate()
+
+    # All streams are taken: the backlog now, the browser comes back after the retry delay with Last-Event-ID
+    # Все потоки заняты: пропущенное сразу, браузер вернётся после паузы retry с Last-Event-ID
+    def poll(self, project_id, last_id):
+        with self.lock:
+            backlog = self.history_after(project_id, last_id)
+        yield f'retry: {self.poll_interval * 1000}\n\n'
+        if backlog is None:
+            yield sse('reload', '{}')
+            return
+        for message in backlog:
+            yield sse(message['event'], json.dumps(message['data']), message['id'])
+
+
+    # Polling without a shared backend: reload once the project version differs from the page's
+    # Опрос без общего pub/sub: перезагрузка, как только версия проекта отличается от версии страницы
+    def poll_version(self, stale):
+        yield f'retry: {self.poll_interval * 1000}\n\n'
+        if stale:
+            yield sse('reload', '{}')
+
+
+class LiveUpdates:
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        # None for one process, 'local://' or 'redis://host:6379/0' / None для одного процесса, 'local://' или 'redis://'
+        app.config.setdefault('LIVE_UPDATES_URL', None)
+        # Changes kept per project for reconnecting clients / Изменения проекта для переподключившихся клиентов
+        app.config.setdefault('LIVE_HISTORY_SIZE', 256)
+        app.config.setdefault('LIVE_HISTORY_PROJECTS', 1000)
+        app.config.setdefault('LIVE_KEEPALIVE', 15)  # seconds / секунды
+        # Streams are closed after this, the browser reconnects with Last-Event-ID
+        # Поток закрывается через это время, браузер переподключается с Last-Event-ID
+        app.config.setdefault('LIVE_STREAM_TIMEOUT', 300)
+        app.config.setdefault('LIVE_QUEUE_SIZE', 1000)
+        # Open streams per process, each holds a server thread, other clients poll instead
+        # Открытых потоков на процесс, каждый занимает поток сервера, остальные клиенты опрашивают
+        app.config.setdefault('LIVE_MAX_STREAMS', 4)
+        app.config.setdefault('LIVE_POLL_INTERVAL', 10)  # seconds / секунды
+
+        app.extensions['live_updates'] = LiveBroker(app.config)
+        app.before_request(self.start_request)
+
+    @property
+    def broker(self):
+        return current_app.extensions['live_updates']
+
+    # Pages resume from the start of their request, before anything is read
+    # Страницы продолжают с начала своего запроса, до любого чтения
+    def start_request(self):
+        broker = self.broker
+        if broker.backend is not None and not broker.listening:
+            broker.listen()
+        g.live_id = max(time.time_ns(), broker.last_id)
+
+    # Call after commit / Вызывать после commit
+    def publish(self, project_id, event, data):
+        self.broker.publish(project_id, event, data)
+
+    # SSE body for one project / Тело SSE для одного проекта
+    def stream(self, project_id, last_id, stale=False):
+        return self.broker.stream(project_id, last_id, stale)
+
+
+live_updates = LiveUpdates()
@@ -0,0 +1,178 @@
+# Per-request performance metrics / Метрики производительности запросов
+# SQL, template and password hashing time per endpoint, Server-Timing header and Prometheus histograms
+# Время SQL, шаблонов и хеширования паролей по страницам, заголовок Server-Timing и гистограммы Prometheus
+# Histograms live in process memory: with several gunicorn workers /metrics shows only the worker that answered,
+# so scrape every worker on its own (e.g. one instance per port) or run with WEB_CONCURRENCY=1.
+# Гистограммы хранятся в памяти процесса: при нескольких воркерах gunicorn /metrics показывает только ответивший воркер,
+# поэтому опрашивайте каждый воркер отдельно (например, по экземпляру на порт) или запускайте с WEB_CONCURRENCY=1.
+from flask import g, has_request_context, request, abort, current_app, before_render_template, template_rendered
+from models import db
+from sqlalchemy import event
+from threading import Lock
+import hmac
+import logging
+import time
+
+logger = logging.getLogger('teameasy.slow')
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+MAX_LOGGED_STATEMENTS = 200
+LOOPBACK_ADDRESSES = ('127.0.0.1', '::1')
+
+
+class Histogram:
+    def __init__(self, name, description, buckets):
+        self.name = name
+        self.description = description
+        self.buckets = buckets
+        self.series = {}
+
+    def observe(self, label, value):
+        counts, total = self.series.get(label, ([0] * (len(self.buckets) + 1), 0))
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+                break
+        else:
+            counts[-1] += 1
+        self.series[label] = (counts, total + value)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} histogram']
+        for label, (counts, total) in sorted(self.series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{endpoint="{label}",le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{endpoint="{label}"}} {total}')
+            lines.append(f'{self.name}_count{{endpoint="{label}"}} {cumulative}')
+        return lines
+
+
+# Histograms of one app / Гистограммы одного приложения
+class MetricsStore:
+    def __init__(self):
+        self.lock = Lock()
+        self.histograms = {
+            'request': Histogram('teameasy_request_duration_seconds', 'Total handler time', DURATION_BUCKETS),
+            'sql': Histogram('teameasy_sql_duration_seconds', 'SQL time per request', DURATION_BUCKETS),
+            'queries': Histogram('teameasy_sql_queries', 'SQL queries per request', QUERY_COUNT_BUCKETS),
+            'template': Histogram('teameasy_template_duration_seconds', 'Template render time per request',
+                                  DURATION_BUCKETS),
+            'kdf': Histogram('teameasy_password_hash_seconds', 'Password hashing time per request', DURATION_BUCKETS),
+        }
+
+
+# Histograms are kept per app in app.extensions['metrics'] / Гистограммы хранятся в app.extensions['metrics']
+class Metrics:
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('SERVER_TIMING', False)
+        app.config.setdefault('SLOW_REQUEST_THRESHOLD', 1.0)  # seconds / секунды
+        # Bearer token for /metrics, without it only loopback clients are served
+        # Bearer-токен для /metrics, без него отвечает только локальным клиентам
+        app.config.setdefault('METRICS_TOKEN', None)
+
+        app.extensions['metrics'] = MetricsStore()
+        # Engines of this app only, call after db.init_app / Только движки этого приложения, вызывать после db.init_app
+        with app.app_context():
+            for engine in db.engines.values():
+                if not event.contains(engine, 'before_cursor_execute', self.before_query):
+                    event.listen(engine, 'before_cursor_execute', self.before_query)
+                    event.listen(engine, 'after_cursor_execute', self.after_query)
+                    event.listen(engine, 'handle_error', self.failed_query)
+        before_render_template.connect(self.before_template, app)
+        template_rendered.connect(self.after_template, app)
+        app.before_request(self.start_request)
+        app.after_request(lambda response: self.finish_request(app, response))
+        app.add_url_rule('/metrics', 'metrics', self.metrics_view)
+
+    def before_query(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    def after_query(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_started'].pop()
+        if not has_request_context():
+            return
+        g.query_count = g.get('query_count', 0) + 1
+        g.sql_time = g.get('sql_time', 0) + elapsed
+        if elapsed > g.get('slowest_query', (0, None))[0]:
+            g.slowest_query = (elapsed, statement)
+        statements = g.setdefault('statements', [])
+        if len(statements) < MAX_LOGGED_STATEMENTS:
+            statements.append((elapsed, statement))
+
+    # A failed statement never reaches after_query, drop its start time
+    # Ошибочный запрос не доходит до after_query, убираем его время начала
+    def failed_query(self, context):
+        started = context.connection.info.get('query_started') if context.connection is not None else None
+        if context.execution_context is not None and started:
+            started.pop()
+
+    def before_template(self, sender, template, context, **extra):
+        g.setdefault('template_started', []).append(time.perf_counter())
+
+    def after_template(self, sender, template, context, **extra):
+        g.template_time = g.get('template_time', 0) + time.perf_counter() - g.template_started.pop()
+
+    def start_request(self):
+        g.request_started = time.perf_counter()
+
+    def finish_request(self, app, response):
+        if 'request_started' not in g or request.endpoint in ('static', 'metrics'):
+            return response
+
+        total = time.perf_counter() - g.request_started
+        endpoint = request.endpoint or 'unknown'
+        sql_time = g.get('sql_time', 0)
+        template_time = g.get('template_time', 0)
+        kdf_time = g.get('kdf_time', 0)
+
+        store = app.extensions['metrics']
+        with store.lock:
+            store.histograms['request'].observe(endpoint, total)
+            store.histograms['sql'].observe(endpoint, sql_time)
+            store.histograms['queries'].observe(endpoint, g.get('query_count', 0))
+            store.histograms['template'].observe(endpoint, template_time)
+            if kdf_time:
+                store.histograms['kdf'].observe(endpoint, kdf_time)
+
+        if app.config['SERVER_TIMING']:
+            response.headers['Server-Timing'] = ', '.join([
+                f'sql;dur={sql_time * 1000:.2f};desc="{g.get("query_count", 0)} queries"',
+                f'tpl;dur={template_time * 1000:.2f}',
+                f'kdf;dur={kdf_time * 1000:.2f}',
+                f'app;dur={total * 1000:.2f}',
+            ])
+
+        # Slow request log with its SQL / Лог медленных запросов с их SQL
+        if total > app.config['SLOW_REQUEST_THRESHOLD']:
+            slowest = g.get('slowest_query', (0, None))
+            logger.warning('Slow request %s %s (%s): %.1f ms total, %.1f ms SQL in %d queries, %.1f ms templates, '
+                           '%.1f ms password hashing, slowest query %.1f ms\n%s',
+                           request.method, request.path, endpoint, total * 1000, sql_time * 1000,
+                           g.get('query_count', 0), template_time * 1000, kdf_time * 1000, slowest[0] * 1000,
+                           '\n'.join(f'[{elapsed * 1000:.1f} ms] {statement}'
+                                     for elapsed, statement in g.get('statements', [])))
+        return response
+
+    def metrics_view(self):
+        token = current_app.config['METRICS_TOKEN']
+        if token:
+            if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+                abort(404)
+        # Requests proxied from outside also come from loopback / Запросы через прокси тоже приходят с loopback
+        elif request.remote_addr not in LOOPBACK_ADDRESSES or 'X-Forwarded-For' in request.headers:
+            abort(404)
+        # This process only, see the note at the top / Только этот процесс, см. примечание в начале
+        store = current_app.extensions['metrics']
+        with store.lock:
+            lines = [line for histogram in store.histograms.values() for line in histogram.render()]
+        return '\n'.join(lines) + '\n', 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+
+metrics = Metrics()
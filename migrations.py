@@ -0,0 +1,214 @@
+# Versioned schema migrations / Версионные миграции схемы
+# Upgrades an existing database in place / Обновляют существующую базу на месте
+import secrets
+from sqlalchemy import inspect, text
+from models import db, Job, EventOverride
+from search import create_search_index
+
+
+def add_column(conn, table, column, ddl):
+    columns = [c['name'] for c in inspect(conn).get_columns(table)]
+    if column not in columns:
+        conn.execute(text(f'ALTER TABLE {conn.dialect.identifier_preparer.quote(table)} ADD COLUMN {column} {ddl}'))
+
+
+# 1: indexes for project-scoped queries / Индексы для запросов внутри проекта
+def indexes_for_project_queries(conn):
+    # Drop duplicate memberships before the unique index / Удаление дублей участников перед уникальным индексом
+    conn.execute(text('DELETE FROM project_member WHERE id NOT IN '
+                      '(SELECT MIN(id) FROM project_member GROUP BY project_id, user_id)'))
+    conn.execute(text('CREATE UNIQUE INDEX IF NOT EXISTS uq_project_member ON project_member (project_id, user_id)'))
+    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_project_member_user ON project_member (user_id)'))
+    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_project_owner_created ON project (owner_id, created_at)'))
+    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_task_project_created ON task (project_id, created_at)'))
+    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_event_project_start ON event (project_id, start_date)'))
+
+
+# 2: keyset index for task board columns / Индекс для постраничных колонок доски задач
+def task_board_index(conn):
+    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_task_project_status_created '
+                      'ON task (project_id, status, created_at, id)'))
+
+
+# 3: calendar feed tokens and event versions / Токены подписки и версии событий календаря
+def calendar_feeds(conn):
+    add_column(conn, 'project', 'events_version', 'INTEGER NOT NULL DEFAULT 0')
+    add_column(conn, 'project', 'events_updated_at', 'TIMESTAMP')
+    add_column(conn, 'user', 'feed_token', 'VARCHAR(64)')
+
+    for (user_id,) in conn.execute(text('SELECT id FROM "user" WHERE feed_token IS NULL')).fetchall():
+        conn.execute(text('UPDATE "user" SET feed_token = :token WHERE id = :id'),
+                     {'token': secrets.token_urlsafe(32), 'id': user_id})
+    conn.execute(text('CREATE UNIQUE INDEX IF NOT EXISTS ix_user_feed_token ON "user" (feed_token)'))
+
+
+# 4: room for stronger password hashes / Место для более стойких хэшей паролей
+def longer_password_hash(conn):
+    # SQLite does not enforce VARCHAR length / SQLite не ограничивает длину VARCHAR
+    if conn.dialect.name != 'sqlite':
+        conn.execute(text('ALTER TABLE "user" ALTER COLUMN password_hash TYPE VARCHAR(256)'))
+
+
+# 5: project version for the fragment cache / Версия проекта для кэша фрагментов
+def project_version(conn):
+    add_column(conn, 'project', 'version', 'INTEGER NOT NULL DEFAULT 0')
+
+
+# 6: explicit task order for the board / Явный порядок задач на доске
+def task_sort_order(conn):
+    add_column(conn, 'task', 'sort_order', 'FLOAT NOT NULL DEFAULT 0')
+    # Older tasks keep their order below new ones / Старые задачи сохраняют порядок ниже новых
+    conn.execute(text('UPDATE task SET sort_order = id WHERE sort_order = 0'))
+    conn.execute(text('DROP INDEX IF EXISTS ix_task_project_status_created'))
+    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_task_project_status_order '
+                      'ON task (project_id, status, sort_order, id)'))
+
+
+# 7: full-text search index with triggers / Полнотекстовый индекс с триггерами
+def search_index(conn):
+    create_search_index(conn)
+
+
+SQLITE_ROLLUP_TRIGGERS = [
+    'CREATE TRIGGER IF NOT EXISTS project_member_count_insert AFTER INSERT ON project_member '
+    'BEGIN UPDATE project SET member_count = member_count + 1 WHERE id = new.project_id; END',
+    'CREATE TRIGGER IF NOT EXISTS project_member_count_delete AFTER DELETE ON project_member '
+    'BEGIN UPDATE project SET member_count = member_count - 1 WHERE id = old.project_id; END',
+    'CREATE TRIGGER IF NOT EXISTS category_stats_insert AFTER INSERT ON project WHEN new.is_public '
+    'BEGIN INSERT INTO category_stats (category, public_projects) VALUES (new.category, 1) '
+    'ON CONFLICT (category) DO UPDATE SET public_projects = public_projects + 1; END',
+    'CREATE TRIGGER IF NOT EXISTS category_stats_delete AFTER DELETE ON project WHEN old.is_public '
+    'BEGIN UPDATE category_stats SET public_projects = public_projects - 1 WHERE category = old.category; END',
+    'CREATE TRIGGER IF NOT EXISTS category_stats_update_old AFTER UPDATE OF category, is_public ON project '
+    'WHEN old.is_public '
+    'BEGIN UPDATE category_stats SET public_projects = public_projects - 1 WHERE category = old.category; END',
+    'CREATE TRIGGER IF NOT EXISTS category_stats_update_new AFTER UPDATE OF category, is_public ON project '
+    'WHEN new.is_public '
+    'BEGIN INSERT INTO category_stats (category, public_projects) VALUES (new.category, 1) '
+    'ON CONFLICT (category) DO UPDATE SET public_projects = public_projects + 1; END',
+]
+
+POSTGRESQL_ROLLUP_TRIGGERS = [
+    '''CREATE OR REPLACE FUNCTION project_member_count() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            UPDATE project SET member_count = member_count + 1 WHERE id = NEW.project_id;
+        ELSE
+            UPDATE project SET member_count = member_count - 1 WHERE id = OLD.project_id;
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql''',
+    'DROP TRIGGER IF EXISTS project_member_count ON project_member',
+    'CREATE TRIGGER project_member_count AFTER INSERT OR DELETE ON project_member '
+    'FOR EACH ROW EXECUTE FUNCTION project_member_count()',
+    '''CREATE OR REPLACE FUNCTION category_stats_sync() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            IF OLD.is_public THEN
+                UPDATE category_stats SET public_projects = public_projects - 1 WHERE category = OLD.category;
+            END IF;
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            IF NEW.is_public THEN
+                INSERT INTO category_stats (category, public_projects) VALUES (NEW.category, 1)
+                ON CONFLICT (category) DO UPDATE SET public_projects = category_stats.public_projects + 1;
+            END IF;
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql''',
+    'DROP TRIGGER IF EXISTS category_stats_sync ON project',
+    'CREATE TRIGGER category_stats_sync AFTER INSERT OR UPDATE OF category, is_public OR DELETE ON project '
+    'FOR EACH ROW EXECUTE FUNCTION category_stats_sync()',
+]
+
+
+# 8: member counts and category facets for the explore page / Число участников и фасеты категорий для обзора
+def project_rollups(conn):
+    add_column(conn, 'project', 'member_count', 'INTEGER NOT NULL DEFAULT 0')
+    conn.execute(text('CREATE TABLE IF NOT EXISTS category_stats '
+                      '(category VARCHAR(40) PRIMARY KEY, public_projects INTEGER NOT NULL DEFAULT 0)'))
+    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_project_public_category_created '
+                      'ON project (is_public, category, created_at, id)'))
+    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_project_public_category_members '
+                      'ON project (is_public, category, member_count, id)'))
+
+    triggers = POSTGRESQL_ROLLUP_TRIGGERS if conn.dialect.name == 'postgresql' else SQLITE_ROLLUP_TRIGGERS
+    for statement in triggers:
+        conn.execute(text(statement))
+
+    # Counts of existing rows / Счётчики для существующих записей
+    conn.execute(text('UPDATE project SET member_count = '
+                      '(SELECT COUNT(*) FROM project_member WHERE project_member.project_id = project.id)'))
+    conn.execute(text('DELETE FROM category_stats'))
+    conn.execute(text('INSERT INTO category_stats (category, public_projects) '
+                      'SELECT category, COUNT(*) FROM project WHERE is_public GROUP BY category'))
+
+
+# 9: cascading project deletion / Каскадное удаление проектов
+def project_deletion(conn):
+    add_column(conn, 'project', 'deleting', 'BOOLEAN NOT NULL DEFAULT FALSE')
+    # SQLite can't alter foreign keys, deletion.py deletes children there / SQLite не меняет внешние ключи
+    if conn.dialect.name == 'postgresql':
+        for table in ('project_member', 'task', 'event'):
+            conn.execute(text(f'ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {table}_project_id_fkey, '
+                              f'ADD CONSTRAINT {table}_project_id_fkey FOREIGN KEY (project_id) '
+                              f'REFERENCES project (id) ON DELETE CASCADE'))
+
+
+# 10: background job queue / Очередь фоновых задач
+def job_queue(conn):
+    Job.__table__.create(conn, checkfirst=True)
+
+
+# 11: user version for the identity cache / Версия пользователя для кэша текущего пользователя
+def user_version(conn):
+    add_column(conn, 'user', 'version', 'INTEGER NOT NULL DEFAULT 0')
+
+
+# 12: recurring events / Повторяющиеся события
+def recurring_events(conn):
+    add_column(conn, 'event', 'recurrence', 'VARCHAR(10)')
+    add_column(conn, 'event', 'recurrence_interval', 'INTEGER NOT NULL DEFAULT 1')
+    add_column(conn, 'event', 'recurrence_until', 'TIMESTAMP')
+    add_column(conn, 'event', 'recurrence_count', 'INTEGER')
+    add_column(conn, 'event', 'series_end', 'TIMESTAMP')
+    EventOverride.__table__.create(conn, checkfirst=True)
+
+
+# 13: effective end of one-off events for window queries / Фактический конец разовых событий для запросов по окну
+def event_window_index(conn):
+    conn.execute(text('UPDATE event SET series_end = CASE WHEN end_date > start_date THEN end_date ELSE start_date END '
+                      'WHERE recurrence IS NULL'))
+    # start_date too, so the index covers the window test / И start_date, чтобы индекс покрывал проверку окна
+    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_event_project_series_end '
+                      'ON event (project_id, series_end, start_date)'))
+
+
+MIGRATIONS = [
+    (1, indexes_for_project_queries),
+    (2, task_board_index),
+    (3, calendar_feeds),
+    (4, longer_password_hash),
+    (5, project_version),
+    (6, task_sort_order),
+    (7, search_index),
+    (8, project_rollups),
+    (9, project_deletion),
+    (10, job_queue),
+    (11, user_version),
+    (12, recurring_events),
+    (13, event_window_index),
+]
+
+
+def upgrade():
+    with db.engine.begin() as conn:
+        conn.execute(text('CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)'))
+        current = conn.execute(text('SELECT MAX(version) FROM schema_version')).scalar() or 0
+
+        for version, migration in MIGRATIONS:
+            if version > current:
+                migration(conn)
+                conn.execute(text('INSERT INTO schema_version (version) VALUES (:version)'), {'version': version})
@@ -1,16 +1,20 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import LoginManager
+from passwords import password_hasher
+from database import RoutingSession
 from datetime import datetime, timezone, timedelta
+import secrets
+import time
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 login_manager = LoginManager()
 
 # Profile photo / Фото профиля
 PROFILE_PHOTO_FOLDER = 'static/uploads/profile_photos'
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
 MAX_FILE_SIZE = 2 * 1024 * 1024  # 2MB
+PHOTO_SIZES = {'small': 80, 'medium': 240, 'large': 480}  # square side in px / сторона квадрата в пикселях
 
 
 def allowed_file(filename):
@@ -18,6 +22,19 @@ def allowed_file(filename):
         filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
+def photo_filename(photo_hash, size):
+    return f'{photo_hash}_{size}.jpg'
+
+
+def profile_photo_url(photo, size='small'):
+    if photo and photo != 'default-avatar.png':
+        # Uploads before thumbnails keep their original file / Загрузки до миниатюр хранятся как есть
+        if '.' in photo:
+            return f'/static/uploads/profile_photos/{photo}'
+        return f'/static/uploads/profile_photos/{photo_filename(photo, size)}'
+    return '/static/images/default-avatar.png'
+
+
 # User / Пользователь
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -27,22 +44,36 @@ class User(UserMixin, db.Model):
     telegram = db.Column(db.String(33))
     discord = db.Column(db.String(32))
     bio = db.Column(db.String(500))
-    password_hash = db.Column(db.String(128))
+    password_hash = db.Column(db.String(256))
     profile_photo = db.Column(db.String(255), default='default-avatar.png')
+    feed_token = db.Column(db.String(64), unique=True, index=True, default=lambda: secrets.token_urlsafe(32))
+    # Bumped when cached identity or password changes / Увеличивается при изменении кэшированных данных или пароля
+    version = db.Column(db.Integer, nullable=False, default=0)
     projects = db.relationship('Project', backref='owner', lazy=True)
     project_memberships = db.relationship('ProjectMember', backref='user', lazy=True)
     created_at = db.Column(db.DateTime, default=datetime.now(timezone(timedelta(hours=3))))
 
+    # Session id with version, see identity.py / Id сессии с версией, см. identity.py
+    def get_id(self):
+        return f'{self.id}:{self.version}'
+
+    # Bump version of the cached identity, atomic in SQL / Увеличение версии кэшированных данных, атомарно в SQL
+    def touch(self):
+        self.version = User.version + 1
+
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = password_hasher.hash(password)
+        if self.id is not None:
+            self.touch()
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return password_hasher.verify(self.password_hash, password)
+
+    def password_needs_rehash(self):
+        return password_hasher.needs_rehash(self.password_hash)
 
-    def get_profile_photo_url(self):
-        if self.profile_photo and self.profile_photo != 'default-avatar.png':
-            return f'/static/uploads/profile_photos/{self.profile_photo}'
-        return '/static/images/default-avatar.png'
+    def get_profile_photo_url(self, size='small'):
+        return profile_photo_url(self.profile_photo, size)
 
 
 # Project / Проект
@@ -55,22 +86,57 @@ class Project(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.now(timezone(timedelta(hours=3))))
     category = db.Column(db.String(40), nullable=False)
     is_public = db.Column(db.Boolean, default=True)
-    members = db.relationship('ProjectMember', backref='project', lazy=True)
+    events_version = db.Column(db.Integer, nullable=False, default=0)
+    events_updated_at = db.Column(db.DateTime)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    # Kept by database triggers / Поддерживается триггерами базы данных
+    member_count = db.Column(db.Integer, nullable=False, default=0)
+    # Hidden while rows are deleted in background / Скрыт, пока строки удаляются в фоне
+    deleting = db.Column(db.Boolean, nullable=False, default=False)
+    members = db.relationship('ProjectMember', backref='project', lazy=True, passive_deletes=True)
+
+    __table_args__ = (
+        db.Index('ix_project_owner_created', 'owner_id', 'created_at'),
+        db.Index('ix_project_public_category_created', 'is_public', 'category', 'created_at', 'id'),
+        db.Index('ix_project_public_category_members', 'is_public', 'category', 'member_count', 'id'),
+    )
+
+    # Bump version of cached fragments, atomic in SQL / Увеличение версии кэшированных фрагментов, атомарно в SQL
+    def touch(self):
+        self.version = Project.version + 1
+
+    # Bump calendar version for feeds / Увеличение версии календаря для подписок
+    def touch_events(self):
+        self.touch()
+        self.events_version = Project.events_version + 1
+        self.events_updated_at = datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+# Public projects per category, kept by database triggers / Публичные проекты по категориям, поддерживается триггерами
+class CategoryStat(db.Model):
+    __tablename__ = 'category_stats'
+    category = db.Column(db.String(40), primary_key=True)
+    public_projects = db.Column(db.Integer, nullable=False, default=0)
 
 
 # Project Member / Участник проекта
 class ProjectMember(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    project_id = db.Column(db.Integer, db.ForeignKey('project.id'), nullable=False)
+    project_id = db.Column(db.Integer, db.ForeignKey('project.id', ondelete='CASCADE'), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     role = db.Column(db.String(100), default='Участник')
     joined_at = db.Column(db.DateTime, default=datetime.now(timezone(timedelta(hours=3))))
 
+    __table_args__ = (
+        db.Index('uq_project_member', 'project_id', 'user_id', unique=True),
+        db.Index('ix_project_member_user', 'user_id'),
+    )
+
 
 # Tasks / Задачи
 class Task(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    project_id = db.Column(db.Integer, db.ForeignKey('project.id'), nullable=False)
+    project_id = db.Column(db.Integer, db.ForeignKey('project.id', ondelete='CASCADE'), nullable=False)
     title = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text)
     assigned_to = db.Column(db.Integer, db.ForeignKey('user.id'))
@@ -79,15 +145,22 @@ class Task(db.Model):
     status = db.Column(db.String(20), default='todo')  # todo, in_progress, done
     created_at = db.Column(db.DateTime, default=datetime.now(timezone(timedelta(hours=3))))
     created_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    project = db.relationship('Project', backref='tasks', lazy=True)
+    # Board position, higher is closer to the top, new tasks go on top / Позиция на доске, новые задачи сверху
+    sort_order = db.Column(db.Float, nullable=False, default=time.time)
+    project = db.relationship('Project', backref=db.backref('tasks', passive_deletes=True), lazy=True)
     assignee = db.relationship('User', foreign_keys=[assigned_to], lazy=True)
     creator = db.relationship('User', foreign_keys=[created_by], lazy=True)
 
+    __table_args__ = (
+        db.Index('ix_task_project_created', 'project_id', 'created_at'),
+        db.Index('ix_task_project_status_order', 'project_id', 'status', 'sort_order', 'id'),
+    )
+
 
 # Events / События
 class Event(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    project_id = db.Column(db.Integer, db.ForeignKey('project.id'), nullable=False)
+    project_id = db.Column(db.Integer, db.ForeignKey('project.id', ondelete='CASCADE'), nullable=False)
     title = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text)
     start_date = db.Column(db.DateTime, nullable=False)
@@ -95,10 +168,73 @@ class Event(db.Model):
     location = db.Column(db.String(200))
     created_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.now(timezone(timedelta(hours=3))))
-    project = db.relationship('Project', backref='events', lazy=True)
+    # Recurrence rule, None for one-off events, see recurrence.py / Правило повторения, None для разовых событий
+    recurrence = db.Column(db.String(10))  # daily, weekly, monthly
+    recurrence_interval = db.Column(db.Integer, nullable=False, default=1)
+    recurrence_until = db.Column(db.DateTime)
+    recurrence_count = db.Column(db.Integer)
+    # End of the last occurrence for window queries, also set for one-off events, None for endless series
+    # Конец последнего повторения для запросов по окну, есть и у разовых событий, None для бесконечных серий
+    series_end = db.Column(db.DateTime)
+    project = db.relationship('Project', backref=db.backref('events', passive_deletes=True), lazy=True)
     creator = db.relationship('User', foreign_keys=[created_by], lazy=True)
 
+    # Original start of an expanded occurrence / Исходное начало развёрнутого повторения
+    occurrence = None
+
+    __table_args__ = (
+        db.Index('ix_event_project_start', 'project_id', 'start_date'),
+        db.Index('ix_event_project_series_end', 'project_id', 'series_end', 'start_date'),
+    )
 
-@login_manager.user_loader
-def load_user(user_id):
-    return User.query.get(int(user_id))
+
+# Changed or cancelled occurrence of a recurring event / Изменённое или отменённое повторение события
+class EventOverride(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    event_id = db.Column(db.Integer, db.ForeignKey('event.id', ondelete='CASCADE'), nullable=False)
+    project_id = db.Column(db.Integer, db.ForeignKey('project.id', ondelete='CASCADE'), nullable=False)
+    occurrence = db.Column(db.DateTime, nullable=False)  # original start / исходное начало
+    cancelled = db.Column(db.Boolean, nullable=False, default=False)
+    # None keeps the value of the series / None оставляет значение серии
+    title = db.Column(db.String(200))
+    description = db.Column(db.Text)
+    location = db.Column(db.String(200))
+    start_date = db.Column(db.DateTime)
+    end_date = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.UniqueConstraint('event_id', 'occurrence', name='uq_event_override'),
+        db.Index('ix_event_override_project_start', 'project_id', 'start_date'),
+    )
+
+
+# Background job, see jobs.py / Фоновая задача, см. jobs.py
+class Job(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(80), nullable=False)
+    payload = db.Column(db.Text, nullable=False, default='{}')  # JSON
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, done, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_at = db.Column(db.DateTime, nullable=False)
+    locked_until = db.Column(db.DateTime)
+    idempotency_key = db.Column(db.String(200), unique=True)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False)
+    finished_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_job_status_run_at', 'status', 'run_at'),
+    )
+
+
+# Eager loading profiles per view / Профили жадной загрузки связей для страниц
+LOADER_PROFILES = {
+    'task_board': lambda: (db.joinedload(Task.assignee),),
+    'members': lambda: (db.joinedload(ProjectMember.user),),
+    'calendar': lambda: (db.joinedload(Event.creator),),
+}
+
+
+def with_loaders(query, profile):
+    return query.options(*LOADER_PROFILES[profile]())
@@ -0,0 +1,108 @@
+# Password hashing on a bounded worker pool / Хеширование паролей в ограниченном пуле потоков
+# hashlib's scrypt and pbkdf2 release the GIL, so threads keep request workers free
+# scrypt и pbkdf2 из hashlib отпускают GIL, поэтому потоки не блокируют обработку запросов
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from flask import current_app, g, has_app_context, has_request_context
+from threading import BoundedSemaphore, Lock
+from werkzeug.security import generate_password_hash, check_password_hash
+import time
+import weakref
+
+
+class PasswordHasherBusy(Exception):
+    pass
+
+
+DEFAULT_METHOD = 'scrypt:32768:8:1'
+
+
+# Worker pool and settings of one app / Пул потоков и настройки одного приложения
+class HasherPool:
+    def __init__(self, method, timeout, workers, queue_size):
+        self.method = method
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+        self.slots = BoundedSemaphore(workers + queue_size)
+        self.method_prefix = None
+        self.prefix_lock = Lock()
+
+
+class PasswordHasher:
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        # Method in werkzeug format, e.g. 'scrypt:32768:8:1' or 'pbkdf2:sha256:600000' / Метод в формате werkzeug
+        app.config.setdefault('PASSWORD_HASH_METHOD', DEFAULT_METHOD)
+        app.config.setdefault('PASSWORD_HASH_WORKERS', 2)
+        app.config.setdefault('PASSWORD_HASH_QUEUE', 16)
+        app.config.setdefault('PASSWORD_HASH_TIMEOUT', 10)
+
+        old = app.extensions.get('password_hasher')
+        if old is not None:
+            old.executor.shutdown(wait=False)
+        pool = app.extensions['password_hasher'] = HasherPool(
+            app.config['PASSWORD_HASH_METHOD'], app.config['PASSWORD_HASH_TIMEOUT'],
+            app.config['PASSWORD_HASH_WORKERS'], app.config['PASSWORD_HASH_QUEUE'])
+        # Pool threads end together with their app / Потоки пула завершаются вместе с приложением
+        weakref.finalize(app, pool.executor.shutdown, wait=False)
+
+    # Pool of the current app, None outside of an app / Пул текущего приложения, None вне приложения
+    @property
+    def pool(self):
+        return current_app.extensions.get('password_hasher') if has_app_context() else None
+
+    # Time spent per request goes to metrics / Время на запрос попадает в метрики
+    def run(self, func, *args):
+        started = time.perf_counter()
+        try:
+            return self.submit(func, *args)
+        finally:
+            if has_request_context():
+                g.kdf_time = g.get('kdf_time', 0) + time.perf_counter() - started
+
+    # Run on the pool, fail fast when it is full / Запуск в пуле, быстрый отказ при переполнении
+    def submit(self, func, *args):
+        pool = self.pool
+        if pool is None:
+            return func(*args)
+
+        if not pool.slots.acquire(blocking=False):
+            raise PasswordHasherBusy()
+        try:
+            future = pool.executor.submit(func, *args)
+        except RuntimeError:
+            pool.slots.release()
+            raise
+        future.add_done_callback(lambda _: pool.slots.release())
+
+        try:
+            return future.result(timeout=pool.timeout)
+        except TimeoutError:
+            raise PasswordHasherBusy()
+
+    def method(self):
+        pool = self.pool
+        return pool.method if pool is not None else DEFAULT_METHOD
+
+    def hash(self, password):
+        return self.run(generate_password_hash, password, self.method())
+
+    def verify(self, password_hash, password):
+        return self.run(check_password_hash, password_hash, password)
+
+    # Stored hash made with other parameters / Хэш создан с другими параметрами
+    def needs_rehash(self, password_hash):
+        pool = self.pool
+        if pool is None:
+            # werkzeug expands short names like 'scrypt' / werkzeug раскрывает короткие имена вроде 'scrypt'
+            return password_hash.split('$', 1)[0] != self.hash('').split('$', 1)[0]
+        if pool.method_prefix is None:
+            with pool.prefix_lock:
+                if pool.method_prefix is None:
+                    pool.method_prefix = self.hash('').split('$', 1)[0]
+        return password_hash.split('$', 1)[0] != pool.method_prefix
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,68 @@
+# Profile photo processing / Обработка фото профиля
+# Uploads are decoded, stripped of metadata and resized to fixed sizes under content-hash names
+# Загрузки декодируются, очищаются от метаданных и сжимаются до фиксированных размеров с именами по хэшу
+from PIL import Image, ImageOps, UnidentifiedImageError
+from models import PHOTO_SIZES, photo_filename
+from io import BytesIO
+import hashlib
+import os
+
+PHOTO_MAX_PIXELS = 40_000_000
+
+
+# Header check without decoding pixels / Проверка заголовка без декодирования пикселей
+def is_photo(data):
+    try:
+        with Image.open(BytesIO(data)) as image:
+            return image.width * image.height <= PHOTO_MAX_PIXELS
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError):
+        return False
+
+
+def decode_photo(data):
+    try:
+        image = Image.open(BytesIO(data))
+        if image.width * image.height > PHOTO_MAX_PIXELS:
+            return None
+        image = ImageOps.exif_transpose(image)
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError):
+        return None
+
+    # Flatten transparency on white / Прозрачность заливается белым
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGBA', image.size, (255, 255, 255, 255))
+        image = Image.alpha_composite(background, image)
+    return image.convert('RGB')
+
+
+# Returns content hash or None if the file is not an image / Возвращает хэш содержимого или None, если это не изображение
+def save_profile_photo(file, folder):
+    data = file.read()
+    photo_hash = hashlib.sha256(data).hexdigest()[:32]
+
+    image = decode_photo(data)
+    if image is None:
+        return None
+
+    for size, side in PHOTO_SIZES.items():
+        path = os.path.join(folder, photo_filename(photo_hash, size))
+        if os.path.exists(path):
+            continue
+
+        # Write then rename, so a half-written file is never served / Запись во временный файл, затем переименование
+        thumbnail = ImageOps.fit(image, (side, side), Image.LANCZOS)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        thumbnail.save(tmp_path, 'JPEG', quality=85, optimize=True, progressive=True)
+        os.replace(tmp_path, path)
+
+    return photo_hash
+
+
+def remove_profile_photo(photo, folder):
+    # Uploads before thumbnails kept the original name / Загрузки до миниатюр хранились под исходным именем
+    names = [photo] if '.' in photo else [photo_filename(photo, size) for size in PHOTO_SIZES]
+    for name in names:
+        path = os.path.join(folder, name)
+        if os.path.exists(path):
+            os.remove(path)
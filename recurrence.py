@@ -0,0 +1,133 @@
+# Recurring events / Повторяющиеся события
+# A series is one Event row with a rule, occurrences are generated only for the requested window.
+# Changed or cancelled occurrences are EventOverride rows keyed by their original start.
+# Серия - одна строка Event с правилом, повторения генерируются только для запрошенного окна.
+# Изменённые или отменённые повторения - строки EventOverride по исходному началу.
+from datetime import datetime, timedelta
+import calendar as cal
+import heapq
+import itertools
+import math
+
+RECURRENCE_RULES = {'daily': 'Ежедневно', 'weekly': 'Еженедельно', 'monthly': 'Ежемесячно'}
+RECURRENCE_MAX_INTERVAL = 365
+RECURRENCE_MAX_COUNT = 1000
+
+
+def duration(event):
+    return event.end_date - event.start_date if event.end_date and event.end_date > event.start_date else timedelta(0)
+
+
+# Day 31 falls on the last day of shorter months / 31-е число переносится на последний день коротких месяцев
+def add_months(start, months):
+    month = start.month - 1 + months
+    year = start.year + month // 12
+    month = month % 12 + 1
+    return start.replace(year=year, month=month, day=min(start.day, cal.monthrange(year, month)[1]))
+
+
+def nth_start(event, n):
+    if event.recurrence == 'monthly':
+        return add_months(event.start_date, n * event.recurrence_interval)
+    days = 7 if event.recurrence == 'weekly' else 1
+    return event.start_date + timedelta(days=n * days * event.recurrence_interval)
+
+
+# First index that can reach window_start, without walking earlier occurrences
+# Первый номер, который может попасть в окно, без перебора более ранних повторений
+def first_index(event, window_start):
+    earliest = window_start - duration(event)
+    if earliest <= event.start_date:
+        return 0
+    if event.recurrence == 'monthly':
+        months = (earliest.year - event.start_date.year) * 12 + earliest.month - event.start_date.month
+        # Clamped days may start a month early / Перенесённые дни могут начаться на месяц раньше
+        return max(0, months // event.recurrence_interval - 1)
+    step = timedelta(days=(7 if event.recurrence == 'weekly' else 1) * event.recurrence_interval)
+    return max(0, math.ceil((earliest - event.start_date) / step) - 1)
+
+
+# Original starts overlapping [window_start, window_end), window_end None for no limit
+# Исходные начала повторений, пересекающих [window_start, window_end), window_end None - без ограничения
+def occurrence_starts(event, window_start, window_end=None):
+    length = duration(event)
+    for n in itertools.count(first_index(event, window_start)):
+        if event.recurrence_count is not None and n >= event.recurrence_count:
+            return
+        start = nth_start(event, n)
+        if event.recurrence_until is not None and start.date() > event.recurrence_until.date():
+            return
+        if window_end is not None and start >= window_end:
+            return
+        if start + length >= window_start:
+            yield start
+
+
+def is_occurrence(event, start):
+    return bool(event.recurrence) and next(
+        occurrence_starts(event, start + duration(event), start + timedelta(microseconds=1)), None) == start
+
+
+# End of the last occurrence, the event's own end for one-off events, None for endless series
+# Конец последнего повторения, собственный конец у разовых событий, None для бесконечных серий
+def series_end(event):
+    if not event.recurrence:
+        return event.start_date + duration(event)
+    if event.recurrence_count is not None:
+        return nth_start(event, event.recurrence_count - 1) + duration(event)
+    if event.recurrence_until is not None:
+        return datetime.combine(event.recurrence_until.date() + timedelta(days=1), datetime.min.time()) + duration(event)
+    return None
+
+
+def overlaps(start, end, window_start, window_end):
+    if window_end is not None and start >= window_end:
+        return False
+    return (end or start) >= window_start
+
+
+# One occurrence of a series, other attributes come from the series row / Одно повторение серии, остальное берётся из серии
+class Occurrence:
+    def __init__(self, event, occurrence, override=None):
+        self.event = event
+        self.occurrence = occurrence
+        self.start_date = occurrence
+        self.end_date = occurrence + (event.end_date - event.start_date) if event.end_date else None
+        self.cancelled = False
+        if override is not None:
+            self.cancelled = override.cancelled
+            for name in ('title', 'description', 'location', 'start_date', 'end_date'):
+                if getattr(override, name) is not None:
+                    setattr(self, name, getattr(override, name))
+
+    def __getattr__(self, name):
+        if name == 'event':
+            raise AttributeError(name)
+        return getattr(self.event, name)
+
+
+# Occurrences of one series in start order / Повторения одной серии по порядку начала
+def series_occurrences(event, changed, window_start, window_end=None):
+    # Overridden occurrences go by their new time / Изменённые повторения идут по новому времени
+    moved = sorted((occurrence for occurrence in (Occurrence(event, start, override)
+                                                  for start, override in changed.items())
+                    if not occurrence.cancelled and is_occurrence(event, occurrence.occurrence)
+                    and overlaps(occurrence.start_date, occurrence.end_date, window_start, window_end)),
+                   key=lambda occurrence: occurrence.start_date)
+    regular = (Occurrence(event, start) for start in occurrence_starts(event, window_start, window_end)
+               if start not in changed)
+    return heapq.merge(regular, moved, key=lambda occurrence: occurrence.start_date)
+
+
+# Events and occurrences in the window by start, overrides are {event id: {occurrence: EventOverride}}
+# События и повторения в окне по началу, overrides - {id события: {повторение: EventOverride}}
+def expand(events, overrides, window_start, window_end=None):
+    streams = []
+    one_off = []
+    for event in events:
+        if event.recurrence:
+            streams.append(series_occurrences(event, overrides.get(event.id, {}), window_start, window_end))
+        elif overlaps(event.start_date, event.end_date, window_start, window_end):
+            one_off.append(event)
+    one_off.sort(key=lambda event: event.start_date)
+    return heapq.merge(one_off, *streams, key=lambda event: event.start_date)
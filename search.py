@@ -0,0 +1,173 @@
+# Full-text search over projects, tasks and events / Полнотекстовый поиск по проектам, задачам и событиям
+# SQLite uses an FTS5 table, PostgreSQL a tsvector column with a GIN index, both kept in sync by triggers
+# SQLite использует таблицу FTS5, PostgreSQL - колонку tsvector с индексом GIN, обе обновляются триггерами
+from flask import abort
+from markupsafe import escape, Markup
+from sqlalchemy import text
+from models import db
+import re
+
+# Row id in the index is item id * 4 + kind / Id строки в индексе - id записи * 4 + тип
+SEARCH_KINDS = {'project': 1, 'task': 2, 'event': 3}
+SEARCH_PAGE_SIZE = 20
+MAX_SEARCH_TERMS = 8
+# Snippet highlight markers, replaced after escaping / Маркеры подсветки, заменяются после экранирования
+MARK_START, MARK_END = '\ue000', '\ue001'
+
+# Indexed text of every table and columns it comes from / Индексируемый текст каждой таблицы и его колонки
+SEARCH_SOURCES = {
+    'project': ('name', "coalesce({row}.description, '')", 'name, description'),
+    'task': ('title', "coalesce({row}.description, '')", 'title, description, project_id'),
+    'event': ('title', "coalesce({row}.description, '') || ' ' || coalesce({row}.location, '')",
+              'title, description, location, project_id'),
+}
+
+
+def create_sqlite_index(conn):
+    conn.execute(text("CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+                      "title, body, kind UNINDEXED, project_id UNINDEXED, "
+                      "tokenize='unicode61 remove_diacritics 2', prefix='2 3')"))
+
+    for table, (title, body, columns) in SEARCH_SOURCES.items():
+        kind = SEARCH_KINDS[table]
+        project_id = 'id' if table == 'project' else 'project_id'
+        insert = (f"INSERT INTO search_index (rowid, title, body, kind, project_id) "
+                  f"VALUES (new.id * 4 + {kind}, new.{title}, {body.format(row='new')}, '{table}', new.{project_id});")
+        delete = f'DELETE FROM search_index WHERE rowid = old.id * 4 + {kind};'
+        conn.execute(text(f'CREATE TRIGGER IF NOT EXISTS search_{table}_insert AFTER INSERT ON {table} '
+                          f'BEGIN {insert} END'))
+        conn.execute(text(f'CREATE TRIGGER IF NOT EXISTS search_{table}_update '
+                          f'AFTER UPDATE OF {columns} ON {table} BEGIN {delete} {insert} END'))
+        conn.execute(text(f'CREATE TRIGGER IF NOT EXISTS search_{table}_delete AFTER DELETE ON {table} '
+                          f'BEGIN {delete} END'))
+
+        # Existing rows / Существующие записи
+        conn.execute(text(f"INSERT INTO search_index (rowid, title, body, kind, project_id) "
+                          f"SELECT id * 4 + {kind}, {title}, {body.format(row=table)}, '{table}', {project_id} "
+                          f"FROM {table} WHERE id * 4 + {kind} NOT IN (SELECT rowid FROM search_index)"))
+
+
+def create_postgresql_index(conn):
+    conn.execute(text("CREATE TABLE IF NOT EXISTS search_index ("
+                      "id BIGINT PRIMARY KEY, kind VARCHAR(10) NOT NULL, project_id INTEGER NOT NULL, "
+                      "title TEXT NOT NULL, body TEXT NOT NULL, "
+                      "document tsvector GENERATED ALWAYS AS "
+                      "(setweight(to_tsvector('simple', title), 'A') || setweight(to_tsvector('simple', body), 'B')) "
+                      "STORED)"))
+    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_search_index_document ON search_index USING GIN (document)'))
+
+    branches = ' ELSIF '.join(
+        f"TG_TABLE_NAME = '{table}' THEN INSERT INTO search_index (id, kind, project_id, title, body) "
+        f"VALUES (NEW.id * 4 + {SEARCH_KINDS[table]}, '{table}', NEW.{'id' if table == 'project' else 'project_id'}, "
+        f"NEW.{title}, {body.format(row='NEW')});"
+        for table, (title, body, _) in SEARCH_SOURCES.items())
+    conn.execute(text(f"""
+        CREATE OR REPLACE FUNCTION search_index_sync() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                DELETE FROM search_index WHERE id = OLD.id * 4 + TG_ARGV[0]::int;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                IF {branches} END IF;
+            END IF;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql"""))
+
+    for table, (title, body, columns) in SEARCH_SOURCES.items():
+        kind = SEARCH_KINDS[table]
+        project_id = 'id' if table == 'project' else 'project_id'
+        conn.execute(text(f'DROP TRIGGER IF EXISTS search_{table} ON {table}'))
+        conn.execute(text(f"CREATE TRIGGER search_{table} AFTER INSERT OR UPDATE OF {columns} OR DELETE ON {table} "
+                          f"FOR EACH ROW EXECUTE FUNCTION search_index_sync('{kind}')"))
+        conn.execute(text(f"INSERT INTO search_index (id, kind, project_id, title, body) "
+                          f"SELECT id * 4 + {kind}, '{table}', {project_id}, {title}, {body.format(row=table)} "
+                          f"FROM {table} ON CONFLICT (id) DO NOTHING"))
+
+
+def create_search_index(conn):
+    if conn.dialect.name == 'postgresql':
+        create_postgresql_index(conn)
+    else:
+        create_sqlite_index(conn)
+
+
+# Words of the query as prefix terms / Слова запроса как префиксы
+def search_terms(query):
+    return re.findall(r'\w+', query.lower())[:MAX_SEARCH_TERMS]
+
+
+def highlight(snippet):
+    return Markup(str(escape(snippet)).replace(MARK_START, '<mark>').replace(MARK_END, '</mark>'))
+
+
+MEMBER_FILTER = """
+    (p.owner_id = :user_id
+     OR EXISTS (SELECT 1 FROM project_member m WHERE m.project_id = p.id AND m.user_id = :user_id))
+"""
+# Projects: public or own, tasks and events: only own projects
+# Проекты: публичные или свои, задачи и события: только из своих проектов
+ACCESS_FILTER = f"NOT p.deleting AND ({MEMBER_FILTER} OR (s.kind = 'project' AND p.is_public))"
+
+
+# Ranked results after (score, row id) cursor, lower score is better / Результаты после курсора (score, id строки)
+def search_items(user_id, query, cursor=None):
+    terms = search_terms(query)
+    if not terms:
+        return [], None
+
+    params = {'user_id': user_id, 'limit': SEARCH_PAGE_SIZE + 1}
+    if db.session.get_bind().dialect.name == 'postgresql':
+        params['query'] = ' & '.join(f'{term}:*' for term in terms)
+        matches = f"""
+            SELECT s.id AS row_id, s.kind, s.project_id, s.title, s.body,
+                   -ts_rank(s.document, to_tsquery('simple', :query))::float8 AS score,
+                   p.name AS project_name, u.username AS owner_name, {MEMBER_FILTER} AS is_member
+            FROM search_index s JOIN project p ON p.id = s.project_id JOIN "user" u ON u.id = p.owner_id
+            WHERE s.document @@ to_tsquery('simple', :query) AND {ACCESS_FILTER}
+        """
+        # Headline only for rows of the page / Выдержка только для строк страницы
+        snippet = (f", ts_headline('simple', body, to_tsquery('simple', :query), "
+                   f"'StartSel={MARK_START}, StopSel={MARK_END}, MaxWords=20, MinWords=5') AS snippet")
+    else:
+        params['query'] = ' '.join('"{}"*'.format(term.replace('"', '')) for term in terms)
+        matches = f"""
+            SELECT s.*, p.name AS project_name, u.username AS owner_name, {MEMBER_FILTER} AS is_member
+            FROM (SELECT rowid AS row_id, kind, project_id, title,
+                         snippet(search_index, -1, '{MARK_START}', '{MARK_END}', '…', 16) AS snippet,
+                         bm25(search_index, 10.0, 1.0) AS score
+                  FROM search_index WHERE search_index MATCH :query) s
+            JOIN project p ON p.id = s.project_id JOIN "user" u ON u.id = p.owner_id
+            WHERE {ACCESS_FILTER}
+        """
+        snippet = ''
+
+    after = ''
+    if cursor:
+        after = 'WHERE score > :score OR (score = :score AND row_id > :row_id)'
+        params['score'], params['row_id'] = cursor
+
+    rows = db.session.execute(text(f"""
+        SELECT *{snippet} FROM ({matches}) results {after}
+        ORDER BY score, row_id
+        LIMIT :limit
+    """), params).mappings().all()
+
+    next_cursor = None
+    if len(rows) > SEARCH_PAGE_SIZE:
+        rows = rows[:SEARCH_PAGE_SIZE]
+        next_cursor = f"{rows[-1]['score']!r}_{rows[-1]['row_id']}"
+
+    results = [{'kind': row['kind'], 'id': row['row_id'] // 4, 'project_id': row['project_id'],
+                'project_name': row['project_name'], 'owner_name': row['owner_name'],
+                'is_member': bool(row['is_member']), 'title': row['title'], 'snippet': highlight(row['snippet'])}
+               for row in rows]
+    return results, next_cursor
+
+
+def parse_search_cursor(cursor):
+    try:
+        score, _, row_id = cursor.rpartition('_')
+        return float(score), int(row_id)
+    except ValueError:
+        abort(400)
@@ -0,0 +1,99 @@
+# Synthetic data generator / Генератор тестовых данных
+# A few huge projects and many tiny ones / Несколько огромных проектов и много маленьких
+# python seed.py --users 500 --projects 200 --seed 1
+from models import db, User, Project, ProjectMember, Task, Event
+from passwords import password_hasher
+from datetime import datetime, timedelta
+import argparse
+import random
+
+SEED_PASSWORD = 'password'
+STATUS_WEIGHTS = {'todo': 25, 'in_progress': 15, 'done': 60}
+PRIORITIES = ('low', 'medium', 'high')
+
+
+def seed_username(seed, index):
+    return f'bench_{seed}_{index}'
+
+
+# Must run inside app context / Запускать внутри контекста приложения
+def seed(users=200, projects=100, seed_value=1, categories=('other',)):
+    rng = random.Random(seed_value)
+    now = datetime.now()
+
+    if User.query.filter_by(username=seed_username(seed_value, 0)).first():
+        raise ValueError(f'Seed {seed_value} is already loaded')
+
+    # One hash for every user, the KDF is slow on purpose / Один хэш на всех, KDF медленный специально
+    password_hash = password_hasher.hash(SEED_PASSWORD)
+    user_rows = [User(username=seed_username(seed_value, i), email=f'{seed_username(seed_value, i)}@example.com',
+                      password_hash=password_hash, created_at=now - timedelta(days=rng.randint(0, 730)))
+                 for i in range(users)]
+    db.session.add_all(user_rows)
+    db.session.flush()
+    user_ids = [user.id for user in user_rows]
+
+    project_rows = []
+    for i in range(projects):
+        created_at = now - timedelta(days=rng.randint(0, 730), seconds=rng.randint(0, 86400))
+        project_rows.append(Project(name=f'Project {seed_value}-{i}', description=f'Synthetic project {i}',
+                                    github_url='', owner_id=rng.choice(user_ids), category=rng.choice(categories),
+                                    is_public=rng.random() < 0.6, created_at=created_at))
+    db.session.add_all(project_rows)
+    db.session.flush()
+
+    members, tasks, events = [], [], []
+    for project in project_rows:
+        # Pareto-sized team / Размер команды по Парето
+        size = min(users, max(1, int(rng.paretovariate(1.2))))
+        team = {project.owner_id} | set(rng.sample(user_ids, size - 1) if size > 1 else [])
+        team = list(team)
+        for user_id in team:
+            members.append({'project_id': project.id, 'user_id': user_id,
+                            'role': 'Владелец' if user_id == project.owner_id else 'Участник',
+                            'joined_at': project.created_at})
+
+        for _ in range(int(len(team) * rng.uniform(2, 12))):
+            created_at = project.created_at + timedelta(minutes=rng.randint(0, 500000))
+            tasks.append({'project_id': project.id, 'title': f'Task {rng.randint(1, 10 ** 6)}',
+                          'description': 'Synthetic task', 'priority': rng.choice(PRIORITIES),
+                          'status': rng.choices(list(STATUS_WEIGHTS), weights=STATUS_WEIGHTS.values())[0],
+                          'assigned_to': rng.choice(team) if rng.random() < 0.7 else None,
+                          'due_date': created_at + timedelta(days=rng.randint(1, 60)) if rng.random() < 0.5 else None,
+                          'created_by': rng.choice(team), 'created_at': created_at,
+                          'sort_order': created_at.timestamp()})
+
+        for _ in range(int(len(team) * rng.uniform(0.5, 4))):
+            start_date = now + timedelta(days=rng.randint(-90, 90), hours=rng.randint(8, 19))
+            end_date = start_date + timedelta(days=rng.randint(1, 4)) if rng.random() < 0.3 else None
+            events.append({'project_id': project.id, 'title': f'Event {rng.randint(1, 10 ** 6)}',
+                           'description': 'Synthetic event', 'location': 'Онлайн', 'start_date': start_date,
+                           'end_date': end_date, 'series_end': end_date or start_date, 'created_by': rng.choice(team),
+                           'created_at': now})
+
+    # Bulk inserts / Пакетные вставки
+    for model, rows in ((ProjectMember, members), (Task, tasks), (Event, events)):
+        if rows:
+            db.session.execute(db.insert(model), rows)
+    db.session.commit()
+
+    return {'users': len(user_rows), 'projects': len(project_rows), 'members': len(members),
+            'tasks': len(tasks), 'events': len(events)}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Fill the database with synthetic data')
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--projects', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    from app import create_app
+    from constants import CATEGORIES
+    from migrations import upgrade
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        upgrade()
+        print(seed(args.users, args.projects, args.seed, tuple(CATEGORIES)))
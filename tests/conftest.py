@@ -0,0 +1,113 @@
+# Test app on a temporary SQLite database / Тестовое приложение на временной базе SQLite
+from datetime import datetime, timedelta
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from migrations import upgrade
+from models import db, User, Project, ProjectMember, Task, Event, EventOverride
+from recurrence import series_end
+
+PASSWORD = 'password'
+
+
+# Several projects with members, tasks and events, so per-row queries show up
+# Несколько проектов с участниками, задачами и событиями, чтобы запросы на каждую строку были заметны
+def seed_projects(app):
+    with app.app_context():
+        users = [User(username=name, email=f'{name}@example.com') for name in ('alice', 'bob', 'carol', 'dave')]
+        for user in users:
+            user.set_password(PASSWORD)
+        db.session.add_all(users)
+        db.session.flush()
+
+        now = datetime.now().replace(hour=10, minute=0, second=0, microsecond=0)
+        projects = []
+        for i in range(3):
+            project = Project(name=f'Project {i}', description=f'Project number {i}', github_url='',
+                              owner_id=users[0].id, category='other', is_public=i != 2)
+            db.session.add(project)
+            db.session.flush()
+            projects.append(project)
+
+            for user in users:
+                db.session.add(ProjectMember(project_id=project.id, user_id=user.id,
+                                             role='Владелец' if user is users[0] else 'Участник'))
+            for j in range(12):
+                db.session.add(Task(project_id=project.id, title=f'Task {i}-{j}', description='Task',
+                                    status=('todo', 'in_progress', 'done')[j % 3],
+                                    priority=('low', 'medium', 'high')[j % 3],
+                                    assigned_to=users[j % len(users)].id, created_by=users[(j + 1) % len(users)].id,
+                                    due_date=now + timedelta(days=j), sort_order=j * 1024.0))
+            for j in range(4):
+                event = Event(project_id=project.id, title=f'Event {i}-{j}', description='Event',
+                              start_date=now + timedelta(days=j), created_by=users[j].id,
+                              end_date=now + timedelta(days=j + 2) if j % 2 else None)
+                event.series_end = series_end(event)
+                db.session.add(event)
+            # Daily series with one moved and one cancelled occurrence / Ежедневная серия с перенесённым и отменённым повторением
+            standup = Event(project_id=project.id, title=f'Standup {i}', start_date=now, created_by=users[0].id,
+                            recurrence='daily', recurrence_interval=1, recurrence_count=10)
+            standup.series_end = series_end(standup)
+            db.session.add(standup)
+            db.session.flush()
+            db.session.add(EventOverride(event_id=standup.id, project_id=project.id, occurrence=now + timedelta(days=1),
+                                         title='Moved standup', start_date=now + timedelta(days=1, hours=2)))
+            db.session.add(EventOverride(event_id=standup.id, project_id=project.id, occurrence=now + timedelta(days=2),
+                                         cancelled=True))
+        db.session.commit()
+
+        task = Task.query.filter_by(project_id=projects[0].id).first()
+        return {'project_id': projects[0].id, 'task_id': task.id}
+
+
+# Factory, so a test can build several apps in one process / Фабрика, чтобы тест мог создать несколько приложений
+@pytest.fixture
+def make_app(tmp_path):
+    count = 0
+
+    def make(**config):
+        nonlocal count
+        count += 1
+        app = create_app({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / f"app{count}.db"}',
+            'JOB_WORKERS': 0,
+            'LIVE_UPDATES_URL': None,
+            'FRAGMENT_CACHE_URL': None,
+            # Cheap hash, the KDF is slow on purpose / Дешёвый хэш, KDF медленный специально
+            'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1000',
+            **config,
+        })
+        with app.app_context():
+            db.create_all()
+            upgrade()
+        return app
+
+    return make
+
+
+@pytest.fixture
+def app(make_app):
+    return make_app()
+
+
+@pytest.fixture
+def data(app):
+    return seed_projects(app)
+
+
+def login(app, username='alice'):
+    client = app.test_client()
+    response = client.post('/login', data={'username': username, 'password': PASSWORD})
+    assert response.status_code == 302
+    return client
+
+
+@pytest.fixture
+def client(app, data):
+    return login(app)
@@ -0,0 +1,58 @@
+# Events of a calendar window / События окна календаря
+from datetime import datetime
+
+from conftest import seed_projects
+from models import db, Event, User
+from recurrence import series_end
+from views.calendar import events_in_window
+
+WINDOW_START = datetime(2026, 3, 1)
+WINDOW_END = datetime(2026, 4, 1)
+
+
+def add_event(project_id, title, start, end=None, **recurrence):
+    event = Event(project_id=project_id, title=title, start_date=start, end_date=end, created_by=1,
+                  recurrence_interval=1, **recurrence)
+    event.series_end = series_end(event)
+    db.session.add(event)
+    return event
+
+
+def test_window_uses_effective_end(app, data):
+    project_id = data['project_id']
+    with app.app_context():
+        add_event(project_id, 'long, ends inside', datetime(2025, 12, 1), datetime(2026, 3, 2))
+        add_event(project_id, 'ended before', datetime(2026, 2, 1), datetime(2026, 2, 28))
+        add_event(project_id, 'point inside', datetime(2026, 3, 15))
+        add_event(project_id, 'end before start', datetime(2026, 3, 20), datetime(2026, 3, 10))
+        add_event(project_id, 'after', datetime(2026, 4, 1))
+        add_event(project_id, 'endless weekly', datetime(2020, 1, 6, 9), recurrence='weekly')
+        add_event(project_id, 'finished series', datetime(2025, 1, 6, 9), recurrence='daily', recurrence_count=30)
+        db.session.commit()
+
+        titles = [event.title for event in events_in_window(project_id, WINDOW_START, WINDOW_END)]
+    assert titles.count('endless weekly') in (4, 5)
+    assert [title for title in titles if title != 'endless weekly'] == \
+        ['long, ends inside', 'point inside', 'end before start']
+
+
+def feed_url(app, fmt):
+    with app.app_context():
+        return f'/feeds/{User.query.filter_by(username="alice").one().feed_token}/calendar.{fmt}'
+
+
+def test_feed_cache_is_per_app_and_bounded(app, data, make_app):
+    client = app.test_client()
+    first = client.get(feed_url(app, 'ics'))
+    assert first.status_code == 200
+    cache = app.extensions['feed_cache']
+    assert len(cache.items) == 1 and cache.size == len(first.get_data())
+    assert client.get(feed_url(app, 'ics')).get_data() == first.get_data()
+    assert len(cache.items) == 1
+
+    # Bodies larger than the limit are not kept / Тела больше лимита не сохраняются
+    small = make_app(FEED_CACHE_MAX_SIZE=100)
+    seed_projects(small)
+    assert small.test_client().get(feed_url(small, 'json')).status_code == 200
+    assert small.extensions['feed_cache'] is not cache
+    assert small.extensions['feed_cache'].size == 0
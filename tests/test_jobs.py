@@ -0,0 +1,111 @@
+# Job queue retries, backoff and reclaiming of stuck jobs / Повторы, задержки и возврат зависших задач очереди
+from datetime import timedelta
+
+import pytest
+
+from jobs import job_queue, utcnow
+from models import db, Job
+
+calls = []
+
+
+@job_queue.task('test_record')
+def record(value):
+    calls.append(value)
+
+
+@job_queue.task('test_fail')
+def fail(message):
+    raise RuntimeError(message)
+
+
+@pytest.fixture
+def ctx(app):
+    calls.clear()
+    with app.app_context():
+        yield app
+
+
+def make_due(job_id, **values):
+    db.session.execute(db.update(Job).where(Job.id == job_id).values(**values))
+    db.session.commit()
+
+
+def test_runs_and_finishes(ctx):
+    job = job_queue.enqueue('test_record', {'value': 1}, key='record-1')
+    db.session.commit()
+
+    assert job_queue.run_pending() == 1
+    job = db.session.get(Job, job.id)
+    assert calls == [1]
+    assert (job.status, job.attempts, job.idempotency_key) == ('done', 1, None)
+    assert job.finished_at is not None
+
+
+def test_unfinished_key_returns_existing_job(ctx):
+    first = job_queue.enqueue('test_record', {'value': 1}, key='same')
+    db.session.commit()
+    assert job_queue.enqueue('test_record', {'value': 2}, key='same').id == first.id
+
+
+def test_backoff_doubles_up_to_max(ctx):
+    ctx.config.update(JOB_BACKOFF_BASE=5, JOB_BACKOFF_MAX=30)
+    assert [job_queue.backoff(attempts) for attempts in range(1, 6)] == [5, 10, 20, 30, 30]
+
+
+def test_failure_is_retried_then_failed(ctx):
+    job = job_queue.enqueue('test_fail', {'message': 'boom'}, key='fail', max_attempts=2)
+    db.session.commit()
+    job_id = job.id
+
+    before = utcnow()
+    assert job_queue.run_pending() == 1
+    job = db.session.get(Job, job_id)
+    assert (job.status, job.attempts, job.last_error) == ('queued', 1, 'RuntimeError: boom')
+    backoff = timedelta(seconds=ctx.config['JOB_BACKOFF_BASE'])
+    assert before + backoff <= job.run_at <= utcnow() + backoff
+    # Not due until the backoff passes / Не готова, пока не прошла задержка
+    assert job_queue.run_pending() == 0
+
+    make_due(job_id, run_at=utcnow() - timedelta(seconds=1))
+    assert job_queue.run_pending() == 1
+    db.session.expire_all()
+    job = db.session.get(Job, job_id)
+    assert (job.status, job.attempts, job.idempotency_key) == ('failed', 2, None)
+
+
+def test_stuck_job_is_reclaimed(ctx):
+    job = job_queue.enqueue('test_record', {'value': 7})
+    db.session.commit()
+    job_id = job.id
+
+    claimed = job_queue.claim()
+    assert (claimed.id, claimed.status) == (job_id, 'running')
+    # Invisible while its worker holds the lock / Невидима, пока воркер держит блокировку
+    assert job_queue.claim() is None
+
+    # The worker stopped answering / Воркер перестал отвечать
+    stale_lock = utcnow() - timedelta(seconds=1)
+    make_due(job_id, locked_until=stale_lock)
+    assert job_queue.run_pending() == 1
+    assert calls == [7]
+
+    # A late finish of the first worker is ignored / Запоздалое завершение первого воркера игнорируется
+    job_queue.finish(job_id, stale_lock, 'failed', last_error='late')
+    db.session.expire_all()
+    job = db.session.get(Job, job_id)
+    assert (job.status, job.attempts, job.last_error) == ('done', 2, None)
+
+
+def test_stuck_job_on_last_attempt_fails(ctx):
+    job = job_queue.enqueue('test_record', {'value': 1}, max_attempts=1)
+    db.session.commit()
+    job_id = job.id
+    job_queue.claim()
+    make_due(job_id, locked_until=utcnow() - timedelta(seconds=1))
+
+    assert job_queue.run_pending() == 0
+    db.session.expire_all()
+    job = db.session.get(Job, job_id)
+    assert (job.status, job.last_error) == ('failed', 'Visibility timeout expired')
+    assert calls == []
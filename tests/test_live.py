@@ -0,0 +1,32 @@
+# Live updates when several workers share no pub/sub / Живые обновления, когда у воркеров нет общего pub/sub
+import logging
+
+from models import db, Project
+
+
+def stream(client, project_id, version):
+    response = client.get(f'/project/{project_id}/stream?last_event_id=0&version={version}')
+    assert response.status_code == 200
+    return response.get_data(as_text=True)
+
+
+def test_several_workers_fall_back_to_polling(app, client, data, caplog):
+    project_id = data['project_id']
+    broker = app.extensions['live_updates']
+    broker.use_processes(1)
+    assert not broker.polling
+
+    with caplog.at_level(logging.WARNING, logger='teameasy.live'):
+        broker.use_processes(3)
+    assert broker.polling
+    assert 'fall back to polling' in caplog.text
+
+    with app.app_context():
+        version = db.session.get(Project, project_id).version
+    assert stream(client, project_id, version) == f'retry: {broker.poll_interval * 1000}\n\n'
+
+    # A change made by another worker / Изменение, сделанное другим воркером
+    with app.app_context():
+        db.session.get(Project, project_id).touch()
+        db.session.commit()
+    assert 'event: reload' in stream(client, project_id, version)
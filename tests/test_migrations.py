@@ -0,0 +1,98 @@
+# In-place upgrade of a database made by the first release / Обновление на месте базы первой версии
+from datetime import datetime
+import sqlite3
+
+from werkzeug.security import generate_password_hash
+
+from conftest import login
+from migrations import MIGRATIONS, upgrade
+from models import db, User, Project, Task, Event, CategoryStat
+
+# Schema of the first release / Схема первой версии
+BASELINE_SCHEMA = '''
+CREATE TABLE user (
+    id INTEGER NOT NULL, username VARCHAR(80) NOT NULL, email VARCHAR(120) NOT NULL, github VARCHAR(120),
+    telegram VARCHAR(33), discord VARCHAR(32), bio VARCHAR(500), password_hash VARCHAR(128),
+    profile_photo VARCHAR(255), created_at DATETIME,
+    PRIMARY KEY (id), UNIQUE (username), UNIQUE (email)
+);
+CREATE TABLE project (
+    id INTEGER NOT NULL, name VARCHAR(80) NOT NULL, description VARCHAR(500) NOT NULL,
+    github_url VARCHAR(120) NOT NULL, owner_id INTEGER NOT NULL, created_at DATETIME,
+    category VARCHAR(40) NOT NULL, is_public BOOLEAN,
+    PRIMARY KEY (id), FOREIGN KEY(owner_id) REFERENCES user (id)
+);
+CREATE TABLE project_member (
+    id INTEGER NOT NULL, project_id INTEGER NOT NULL, user_id INTEGER NOT NULL, role VARCHAR(100),
+    joined_at DATETIME,
+    PRIMARY KEY (id), FOREIGN KEY(project_id) REFERENCES project (id), FOREIGN KEY(user_id) REFERENCES user (id)
+);
+CREATE TABLE task (
+    id INTEGER NOT NULL, project_id INTEGER NOT NULL, title VARCHAR(200) NOT NULL, description TEXT,
+    assigned_to INTEGER, due_date DATETIME, priority VARCHAR(20), status VARCHAR(20), created_at DATETIME,
+    created_by INTEGER NOT NULL,
+    PRIMARY KEY (id), FOREIGN KEY(project_id) REFERENCES project (id),
+    FOREIGN KEY(assigned_to) REFERENCES user (id), FOREIGN KEY(created_by) REFERENCES user (id)
+);
+CREATE TABLE event (
+    id INTEGER NOT NULL, project_id INTEGER NOT NULL, title VARCHAR(200) NOT NULL, description TEXT,
+    start_date DATETIME NOT NULL, end_date DATETIME, location VARCHAR(200), created_by INTEGER NOT NULL,
+    created_at DATETIME,
+    PRIMARY KEY (id), FOREIGN KEY(project_id) REFERENCES project (id), FOREIGN KEY(created_by) REFERENCES user (id)
+);
+'''
+
+
+def baseline_database(path):
+    password_hash = generate_password_hash('password', 'pbkdf2:sha256:1000')
+    conn = sqlite3.connect(path)
+    conn.executescript(BASELINE_SCHEMA)
+    conn.executemany('INSERT INTO user (id, username, email, password_hash, created_at) VALUES (?, ?, ?, ?, ?)',
+                     [(1, 'alice', 'alice@example.com', password_hash, '2024-01-01 10:00:00.000000'),
+                      (2, 'bob', 'bob@example.com', password_hash, '2024-01-01 10:00:00.000000')])
+    conn.executemany('INSERT INTO project (id, name, description, github_url, owner_id, created_at, category, '
+                     'is_public) VALUES (?, ?, ?, ?, 1, ?, ?, ?)',
+                     [(1, 'Old public', 'Before migrations', '', '2024-02-01 10:00:00.000000', 'web', 1),
+                      (2, 'Old private', 'Before migrations', '', '2024-02-02 10:00:00.000000', 'other', 0)])
+    # The first release allowed duplicate memberships / Первая версия допускала повторное членство
+    conn.executemany('INSERT INTO project_member (project_id, user_id, role, joined_at) VALUES (?, ?, ?, ?)',
+                     [(1, 1, 'Владелец', '2024-02-01 10:00:00.000000'), (1, 2, 'Участник', '2024-02-01 10:00:00.000000'),
+                      (1, 2, 'Участник', '2024-02-03 10:00:00.000000'), (2, 1, 'Владелец', '2024-02-02 10:00:00.000000')])
+    conn.executemany('INSERT INTO task (id, project_id, title, status, priority, created_at, created_by) '
+                     'VALUES (?, 1, ?, ?, ?, ?, 1)',
+                     [(i, f'Old task {i}', ('todo', 'in_progress', 'done')[i % 3], 'medium',
+                       f'2024-03-{i:02d} 10:00:00.000000') for i in range(1, 7)])
+    conn.execute("INSERT INTO event (project_id, title, start_date, created_by, created_at) "
+                 "VALUES (1, 'Old event', '2024-03-05 10:00:00.000000', 1, '2024-03-01 10:00:00.000000')")
+    conn.commit()
+    conn.close()
+
+
+def test_baseline_database_is_upgraded_in_place(tmp_path, make_app):
+    path = tmp_path / 'baseline.db'
+    baseline_database(path)
+    # make_app runs create_all() and upgrade() like `flask upgrade-db` / make_app запускает create_all() и upgrade()
+    app = make_app(SQLALCHEMY_DATABASE_URI=f'sqlite:///{path}')
+
+    with app.app_context():
+        versions = db.session.execute(db.text('SELECT version FROM schema_version ORDER BY version')).scalars().all()
+        assert versions == [version for version, _ in MIGRATIONS]
+
+        assert Project.query.count() == 2
+        assert {project.id: project.member_count for project in Project.query} == {1: 2, 2: 1}
+        assert {stat.category: stat.public_projects for stat in CategoryStat.query} == {'web': 1}
+        assert all(user.feed_token for user in User.query)
+        assert [event.series_end for event in Event.query] == [datetime(2024, 3, 5, 10)]
+        # Older tasks keep their order / Старые задачи сохраняют порядок
+        assert all(task.sort_order == task.id for task in Task.query)
+
+        # Second run changes nothing / Повторный запуск ничего не меняет
+        upgrade()
+        assert db.session.execute(db.text('SELECT COUNT(*) FROM schema_version')).scalar() == len(MIGRATIONS)
+
+    client = login(app)
+    for url in ('/home', '/project/1/members', '/project/1/tasks', '/project/1/calendar/2024/3',
+                '/search?q=Old', '/explore'):
+        assert client.get(url).status_code == 200
+    assert 'Old task 1' in client.get('/search?q=task').get_data(as_text=True)
+    assert 'Old event' in client.get('/project/1/calendar/2024/3').get_data(as_text=True)
@@ -0,0 +1,30 @@
+# Password hashing pool / Пул хеширования паролей
+from app import default_config
+from conftest import PASSWORD, login
+
+
+def test_pool_settings_from_environment(monkeypatch, make_app):
+    monkeypatch.setenv('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:2000')
+    monkeypatch.setenv('PASSWORD_HASH_WORKERS', '1')
+    monkeypatch.setenv('PASSWORD_HASH_QUEUE', '3')
+    monkeypatch.setenv('PASSWORD_HASH_TIMEOUT', '2.5')
+    config = default_config()
+    assert config['PASSWORD_HASH_METHOD'] == 'pbkdf2:sha256:2000'
+
+    app = make_app(**{name: config[name] for name in ('PASSWORD_HASH_WORKERS', 'PASSWORD_HASH_QUEUE',
+                                                      'PASSWORD_HASH_TIMEOUT')})
+    pool = app.extensions['password_hasher']
+    assert (pool.executor._max_workers, pool.timeout, pool.slots._value) == (1, 2.5, 4)
+
+
+def test_full_pool_answers_503(app, data):
+    pool = app.extensions['password_hasher']
+    while pool.slots.acquire(blocking=False):
+        pass
+
+    response = app.test_client().post('/login', data={'username': 'alice', 'password': PASSWORD})
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '5'
+
+    pool.slots.release()
+    login(app)
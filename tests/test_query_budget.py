@@ -0,0 +1,63 @@
+# Every view in QUERY_BUDGET stays within its SQL query limit / Каждая страница из QUERY_BUDGET укладывается в лимит запросов
+# The app raises AssertionError in test mode when a view runs more queries than its budget
+# В тестовом режиме приложение бросает AssertionError, если страница выполнила больше запросов, чем позволяет лимит
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from conftest import login, seed_projects
+from models import db
+
+BUDGET_URLS = {
+    'projects.home': '/home',
+    'projects.project_members': '/project/{project_id}/members',
+    'tasks.project_tasks': '/project/{project_id}/tasks',
+    'tasks.task_column': '/project/{project_id}/tasks/column/todo',
+    'tasks.task_modal': '/project/{project_id}/tasks/{task_id}/modal',
+    'calendar.project_calendar': '/project/{project_id}/calendar',
+    'projects.search': '/search?q=Task',
+    'projects.explore': '/explore',
+}
+
+
+def test_every_budget_is_covered(app):
+    assert set(BUDGET_URLS) == set(app.config['QUERY_BUDGET'])
+
+
+@pytest.mark.parametrize('endpoint', BUDGET_URLS)
+def test_view_within_budget(client, data, endpoint):
+    response = client.get(BUDGET_URLS[endpoint].format(**data))
+    assert response.status_code == 200
+
+
+# Cached fragments must not hide the cost of a render / Кэш фрагментов не должен скрывать стоимость отрисовки
+def test_views_within_budget_with_warm_cache(client, data):
+    for url in BUDGET_URLS.values():
+        assert client.get(url.format(**data)).status_code == 200
+        assert client.get(url.format(**data)).status_code == 200
+
+
+def test_budget_overrun_fails(app, client, monkeypatch):
+    monkeypatch.setitem(app.config, 'QUERY_BUDGET', {**app.config['QUERY_BUDGET'], 'projects.home': 0})
+    with pytest.raises(AssertionError, match='projects.home ran'):
+        client.get('/home')
+
+
+# Query listeners of one app must not count queries of another / Слушатели запросов одного приложения не считают запросы другого
+def test_second_app_counts_its_own_queries(app, data, make_app):
+    other = make_app()
+    other_data = seed_projects(other)
+
+    for current, current_data in ((other, other_data), (app, data)):
+        client = login(current)
+        for url in BUDGET_URLS.values():
+            assert client.get(url.format(**current_data)).status_code == 200
+
+
+# A failed statement leaves no start time behind / Ошибочный запрос не оставляет времени начала
+def test_failed_query_is_not_left_on_the_stack(app):
+    with app.app_context(), db.engine.connect() as conn:
+        with pytest.raises(OperationalError):
+            conn.execute(db.text('SELECT * FROM missing_table'))
+        assert conn.info['query_started'] == []
+        conn.execute(db.text('SELECT 1'))
+        assert conn.info['query_started'] == []
@@ -0,0 +1,86 @@
+# Expansion of recurring events and their overrides / Развёртывание повторяющихся событий и их изменений
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import Event, EventOverride
+from recurrence import expand, occurrence_starts, series_end, is_occurrence
+
+START = datetime(2026, 1, 31, 9, 0)
+
+
+def series(rule='daily', interval=1, count=None, until=None, start=START, end=None):
+    event = Event(id=1, title='Series', start_date=start, end_date=end, recurrence=rule, recurrence_interval=interval,
+                  recurrence_count=count, recurrence_until=until)
+    event.series_end = series_end(event)
+    return event
+
+
+# Every occurrence from the start, for comparison with window expansion / Все повторения с начала, для сравнения
+def all_starts(event, limit=400):
+    return list(occurrence_starts(event, event.start_date))[:limit]
+
+
+def test_daily_count():
+    event = series(count=5)
+    assert all_starts(event) == [START + timedelta(days=n) for n in range(5)]
+    assert series_end(event) == START + timedelta(days=4)
+
+
+def test_until_includes_its_day():
+    event = series(rule='weekly', until=datetime(2026, 2, 14))
+    assert all_starts(event) == [START + timedelta(weeks=n) for n in range(3)]
+
+
+def test_monthly_clamps_to_last_day():
+    starts = all_starts(series(rule='monthly', count=4))
+    assert [start.date() for start in starts] == [datetime(2026, 1, 31).date(), datetime(2026, 2, 28).date(),
+                                                  datetime(2026, 3, 31).date(), datetime(2026, 4, 30).date()]
+
+
+@pytest.mark.parametrize('rule, interval', [('daily', 1), ('daily', 3), ('weekly', 2), ('monthly', 1), ('monthly', 5)])
+def test_window_matches_full_expansion(rule, interval):
+    # Three-day occurrences overlap the window from before it / Трёхдневные повторения заходят в окно слева
+    event = series(rule=rule, interval=interval, count=120, end=START + timedelta(days=3))
+    length = timedelta(days=3)
+    window_start, window_end = datetime(2026, 9, 1), datetime(2026, 10, 1)
+    expected = [start for start in all_starts(event) if start < window_end and start + length >= window_start]
+    assert list(occurrence_starts(event, window_start, window_end)) == expected
+
+
+def test_is_occurrence():
+    event = series(rule='weekly', count=10)
+    assert is_occurrence(event, START + timedelta(weeks=3))
+    assert not is_occurrence(event, START + timedelta(days=3))
+    assert not is_occurrence(event, START + timedelta(weeks=10))
+
+
+def test_overrides_move_and_cancel():
+    event = series(count=5)
+    moved = EventOverride(event_id=1, occurrence=START + timedelta(days=1), title='Moved',
+                          start_date=START + timedelta(days=3, hours=1))
+    cancelled = EventOverride(event_id=1, occurrence=START + timedelta(days=2), cancelled=True)
+    overrides = {1: {moved.occurrence: moved, cancelled.occurrence: cancelled}}
+
+    items = list(expand([event], overrides, START, START + timedelta(days=10)))
+    assert [(item.start_date, item.title) for item in items] == [
+        (START, 'Series'),
+        (START + timedelta(days=3), 'Series'),
+        (START + timedelta(days=3, hours=1), 'Moved'),
+        (START + timedelta(days=4), 'Series'),
+    ]
+    assert all(item.occurrence in (START + timedelta(days=n) for n in range(5)) for item in items)
+
+
+# A moved occurrence shows up in the window it was moved to / Перенесённое повторение видно в окне, куда его перенесли
+def test_override_moved_into_window():
+    event = series(count=5)
+    moved = EventOverride(event_id=1, occurrence=START, start_date=START + timedelta(days=20))
+    items = list(expand([event], {1: {START: moved}}, START + timedelta(days=15), START + timedelta(days=25)))
+    assert [item.start_date for item in items] == [START + timedelta(days=20)]
+
+
+def test_one_off_and_series_are_merged_by_start():
+    one_off = Event(id=2, title='Once', start_date=START + timedelta(days=1, hours=-1), end_date=None, recurrence=None)
+    items = list(expand([series(count=3), one_off], {}, START, START + timedelta(days=3)))
+    assert [item.title for item in items] == ['Series', 'Once', 'Series', 'Series']
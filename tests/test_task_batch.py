@@ -0,0 +1,136 @@
+# Batch task changes and board order / Пакетные изменения задач и порядок на доске
+import pytest
+
+from conftest import login
+from views.tasks import SORT_ORDER_MIN_GAP
+from models import db, Task, User
+
+
+def batch(client, project_id, *ops):
+    return client.post(f'/project/{project_id}/tasks/batch', json={'ops': list(ops)})
+
+
+# Card ids of a column from top to bottom / Id карточек колонки сверху вниз
+def column(app, project_id, status):
+    with app.app_context():
+        return [task.id for task in Task.query.filter_by(project_id=project_id, status=status)
+                .order_by(Task.sort_order.desc(), Task.id.desc())]
+
+
+def task_state(app, task_id):
+    with app.app_context():
+        task = db.session.get(Task, task_id)
+        return task.status, task.priority, task.assigned_to, task.sort_order
+
+
+def test_move_between_neighbours(app, client, data):
+    project_id = data['project_id']
+    todo, done = column(app, project_id, 'todo'), column(app, project_id, 'done')
+
+    response = batch(client, project_id, {'op': 'move', 'id': todo[0], 'status': 'done',
+                                          'after': done[0], 'before': done[1]})
+    assert response.status_code == 200
+    assert response.get_json()['renumbered'] == []
+    assert column(app, project_id, 'done') == [done[0], todo[0], *done[1:]]
+    assert column(app, project_id, 'todo') == todo[1:]
+
+
+def test_ops_apply_in_one_transaction(app, client, data):
+    project_id, task_id = data['project_id'], data['task_id']
+    with app.app_context():
+        bob = User.query.filter_by(username='bob').one().id
+    before = task_state(app, task_id)
+
+    # The last op fails, so the first ones are rolled back / Последняя операция ошибочна, первые откатываются
+    response = batch(client, project_id, {'op': 'priority', 'id': task_id, 'priority': 'high'},
+                     {'op': 'status', 'id': task_id, 'status': 'nowhere'})
+    assert response.status_code == 400
+    assert task_state(app, task_id) == before
+
+    response = batch(client, project_id, {'op': 'priority', 'id': task_id, 'priority': 'high'},
+                     {'op': 'assign', 'id': task_id, 'assignee': bob},
+                     {'op': 'status', 'id': task_id, 'status': 'in_progress'})
+    assert response.status_code == 200
+    assert task_state(app, task_id)[:3] == ('in_progress', 'high', bob)
+
+
+@pytest.mark.parametrize('op', [
+    {'op': 'status', 'id': True, 'status': 'done'},
+    {'op': 'status', 'id': '1', 'status': 'done'},
+    {'op': 'move', 'id': 1, 'after': True},
+    {'op': 'assign', 'id': 1, 'assignee': 10 ** 6},
+    {'op': 'priority', 'id': 1, 'priority': 'urgent'},
+    {'op': 'rename', 'id': 1},
+])
+def test_bad_ops_are_rejected(app, client, data, op):
+    before = task_state(app, 1)
+    assert batch(client, data['project_id'], op).status_code == 400
+    assert task_state(app, 1) == before
+
+
+def test_neighbours_from_other_columns_or_projects_are_rejected(app, client, data):
+    project_id = data['project_id']
+    todo, done = column(app, project_id, 'todo'), column(app, project_id, 'done')
+    with app.app_context():
+        foreign = Task.query.filter(Task.project_id != project_id, Task.status == 'todo').first().id
+
+    assert batch(client, project_id, {'op': 'move', 'id': todo[0], 'after': done[0]}).status_code == 400
+    assert batch(client, project_id, {'op': 'move', 'id': todo[0], 'after': foreign}).status_code == 400
+    assert batch(client, project_id, {'op': 'move', 'id': todo[0], 'after': todo[0]}).status_code == 400
+    assert batch(client, project_id, {'op': 'status', 'id': foreign, 'status': 'done'}).status_code == 404
+    assert column(app, project_id, 'todo') == todo
+
+
+def test_only_own_tasks_are_deleted(app, client, data):
+    project_id = data['project_id']
+    with app.app_context():
+        alice = User.query.filter_by(username='alice').one().id
+        own = Task.query.filter_by(project_id=project_id, created_by=alice).first().id
+        other = Task.query.filter(Task.project_id == project_id, Task.created_by != alice).first().id
+
+    assert batch(client, project_id, {'op': 'delete', 'id': other}).status_code == 403
+    response = batch(client, project_id, {'op': 'delete', 'id': own})
+    assert response.get_json()['deleted'] == [own]
+    assert batch(client, project_id, {'op': 'status', 'id': own, 'status': 'done'}).status_code == 404
+
+
+def test_narrow_gap_renumbers_column(app, client, data):
+    project_id = data['project_id']
+    todo = column(app, project_id, 'todo')
+    above, below, moving = todo[0], todo[1], todo[-1]
+    with app.app_context():
+        db.session.get(Task, below).sort_order = db.session.get(Task, above).sort_order - SORT_ORDER_MIN_GAP / 2
+        db.session.commit()
+
+    response = batch(client, project_id, {'op': 'move', 'id': moving, 'after': above, 'before': below})
+    assert response.get_json()['renumbered'] == ['todo']
+    assert column(app, project_id, 'todo') == [above, moving, below, *todo[2:-1]]
+    with app.app_context():
+        orders = [db.session.get(Task, task_id).sort_order for task_id in column(app, project_id, 'todo')]
+    assert all(upper - lower >= SORT_ORDER_MIN_GAP for upper, lower in zip(orders, orders[1:]))
+
+
+# Repeated moves into the same gap keep the order / Повторные перемещения в один промежуток сохраняют порядок
+def test_repeated_moves_into_one_gap(app, client, data):
+    project_id = data['project_id']
+    todo = column(app, project_id, 'todo')
+    top = todo[0]
+    for _ in range(60):
+        current = column(app, project_id, 'todo')
+        moving = current[-1]
+        assert batch(client, project_id, {'op': 'move', 'id': moving, 'after': top,
+                                          'before': current[1]}).status_code == 200
+        assert column(app, project_id, 'todo')[:2] == [top, moving]
+    assert sorted(column(app, project_id, 'todo')) == sorted(todo)
+
+
+def test_non_member_cannot_batch(app, data):
+    with app.app_context():
+        outsider = User(username='eve', email='eve@example.com')
+        outsider.set_password('password')
+        db.session.add(outsider)
+        db.session.commit()
+    client = login(app, 'eve')
+    before = task_state(app, data['task_id'])
+    assert batch(client, data['project_id'], {'op': 'status', 'id': data['task_id'], 'status': 'done'}).status_code == 302
+    assert task_state(app, data['task_id']) == before
@@ -0,0 +1,81 @@
+# Project export and import / Экспорт и импорт проектов
+from io import BytesIO
+import json
+
+import pytest
+
+from models import db, Project, Task, Event, EventOverride
+
+HEADER = '{"type": "teameasy-export", "version": 1}'
+PROJECT = '{"type": "project", "name": "Imported", "description": "From a file", "category": "other"}'
+
+
+def post_import(client, body, filename='export.ndjson'):
+    response = client.post('/projects/import', data={'export_file': (BytesIO(body), filename)},
+                           content_type='multipart/form-data')
+    assert response.status_code == 200
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def project_count(app):
+    with app.app_context():
+        return Project.query.count()
+
+
+def test_export_round_trip(app, client, data):
+    for fmt in ('ndjson', 'csv'):
+        body = client.get(f'/project/{data["project_id"]}/export.{fmt}').get_data()
+        steps = post_import(client, body, f'export.{fmt}')
+        assert steps[-1]['done']
+
+    with app.app_context():
+        source = db.session.get(Project, data['project_id'])
+        copies = Project.query.order_by(Project.id.desc()).limit(2).all()
+        for copy in copies:
+            assert copy.name == source.name
+            assert copy.member_count == source.member_count
+            for model in (Task, Event, EventOverride):
+                assert model.query.filter_by(project_id=copy.id).count() == \
+                    model.query.filter_by(project_id=source.id).count()
+            assert [task.sort_order for task in Task.query.filter_by(project_id=copy.id).order_by(Task.id)] == \
+                [task.sort_order for task in Task.query.filter_by(project_id=source.id).order_by(Task.id)]
+
+
+@pytest.mark.parametrize('lines, error', [
+    ([PROJECT], 'Это не файл экспорта TeamEasy'),
+    (['{"type": "teameasy-export", "version": 2}', PROJECT], 'Неподдерживаемая версия файла'),
+    ([HEADER, '{"type": "project", "name": "No description", "category": "other"}'], 'нет поля description'),
+    ([HEADER, '{"type": "project", "name": "X", "description": "X", "category": "moon"}'], 'поле category'),
+    ([HEADER, PROJECT, '{"type": "task", "title": "T", "sort_order": "soon"}'], 'поле sort_order'),
+    ([HEADER, PROJECT, '{"type": "task", "title": "T", "sort_order": NaN}'], 'поле sort_order'),
+    ([HEADER, PROJECT, '{"type": "task", "title": "T", "sort_order": -Infinity}'], 'поле sort_order'),
+    ([HEADER, PROJECT, '{"type": "task", "title": "T", "status": "lost"}'], 'поле status'),
+    ([HEADER, PROJECT, '{"type": "widget"}'], 'неизвестный тип записи'),
+    ([HEADER, PROJECT, '{"type": "task", "title": "T"}', '{"type": "member", "username": "bob"}'], 'не на своём месте'),
+    ([HEADER, PROJECT, PROJECT], 'не на своём месте'),
+    ([HEADER, PROJECT, 'not json'], 'Строка 3: неверный JSON'),
+    ([HEADER, PROJECT, '[1, 2]'], 'Строка 3: ожидается объект'),
+    ([HEADER, PROJECT, '{"type": "event", "id": 1, "title": "E", "start_date": "2026-01-01T10:00:00", '
+                       '"recurrence": "daily", "recurrence_interval": 400}'], 'неверные параметры повторения'),
+    ([HEADER, PROJECT, '{"type": "event_override", "event": 9, "occurrence": "2026-01-01T10:00:00"}'],
+     'нет события 9'),
+    ([HEADER], 'В файле нет проекта'),
+])
+def test_bad_input_is_rejected(app, client, data, lines, error):
+    before = project_count(app)
+    steps = post_import(client, '\n'.join(lines).encode())
+    assert error in steps[-1]['error']
+    # Nothing of a rejected file is kept / От отклонённого файла ничего не остаётся
+    assert project_count(app) == before
+
+
+def test_bad_encoding_and_csv_are_rejected(app, client, data):
+    before = project_count(app)
+    assert 'UTF-8' in post_import(client, HEADER.encode() + b'\n\xff\xfe')[-1]['error']
+    assert 'столбца type' in post_import(client, b'name,title\nx,y\n', 'export.csv')[-1]['error']
+    assert project_count(app) == before
+
+
+def test_missing_file(client):
+    response = client.post('/projects/import', data={}, content_type='multipart/form-data')
+    assert response.status_code == 400
@@ -0,0 +1,364 @@
+# Project export and import / Экспорт и импорт проектов
+# Export streams rows from server-side cursors in chunks, so memory does not grow with the project.
+# Import validates records and inserts them in batches in the caller's transaction, users are matched by username.
+# Экспорт читает строки серверными курсорами и отдаёт их частями, память не растёт с размером проекта.
+# Импорт проверяет записи и вставляет их пачками в транзакции вызывающего, пользователи сопоставляются по имени.
+from models import db, User, Project, ProjectMember, Task, Event, EventOverride
+from recurrence import RECURRENCE_RULES, RECURRENCE_MAX_INTERVAL, RECURRENCE_MAX_COUNT, series_end
+from constants import CATEGORIES, TASK_STATUSES, TASK_PRIORITIES
+from sqlalchemy.orm import aliased
+from datetime import datetime
+from types import SimpleNamespace
+import csv
+import io
+import json
+import math
+import time
+
+EXPORT_FORMAT = 'teameasy-export'
+EXPORT_VERSION = 1
+EXPORT_YIELD_PER = 1000  # rows per cursor fetch / строк за одно чтение курсора
+EXPORT_CHUNK_SIZE = 64 * 1024  # characters per response chunk / символов в части ответа
+IMPORT_BATCH_SIZE = 1000
+
+
+class InvalidImport(Exception):
+    pass
+
+
+# Field parsers, JSON and CSV values alike / Разбор полей, одинаково для JSON и CSV
+def text(max_length=None):
+    def parse(value):
+        value = str(value)
+        if max_length is not None and len(value) > max_length:
+            raise ValueError(f'длиннее {max_length} символов')
+        return value
+    return parse
+
+
+def integer(value):
+    if isinstance(value, bool) or not str(value).lstrip('-').isdigit():
+        raise ValueError('ожидается целое число')
+    return int(value)
+
+
+def number(value):
+    if isinstance(value, bool):
+        raise ValueError('ожидается число')
+    value = float(value)
+    # json and csv both accept NaN and Infinity / json и csv оба принимают NaN и Infinity
+    if not math.isfinite(value):
+        raise ValueError('ожидается конечное число')
+    return value
+
+
+def boolean(value):
+    if value in (True, 'true', '1', 1):
+        return True
+    if value in (False, 'false', '0', 0):
+        return False
+    raise ValueError('ожидается true или false')
+
+
+def timestamp(value):
+    return datetime.fromisoformat(str(value))
+
+
+def choice(values):
+    def parse(value):
+        if value not in values:
+            raise ValueError(f'ожидается одно из: {", ".join(values)}')
+        return value
+    return parse
+
+
+# Record types in file order, (field, parser, required) / Типы записей в порядке файла, (поле, разбор, обязательное)
+RECORDS = {
+    EXPORT_FORMAT: [('version', integer, True)],
+    'project': [('name', text(80), True), ('description', text(500), True), ('github_url', text(120), False),
+                ('category', choice(tuple(CATEGORIES)), True), ('is_public', boolean, False),
+                ('created_at', timestamp, False)],
+    'member': [('username', text(80), True), ('role', text(100), False), ('joined_at', timestamp, False)],
+    'task': [('title', text(200), True), ('description', text(), False), ('status', choice(TASK_STATUSES), False),
+             ('priority', choice(TASK_PRIORITIES), False), ('due_date', timestamp, False),
+             ('created_at', timestamp, False), ('sort_order', number, False), ('assignee', text(80), False),
+             ('created_by', text(80), False)],
+    'event': [('id', integer, True), ('title', text(200), True), ('description', text(), False),
+              ('location', text(200), False), ('start_date', timestamp, True), ('end_date', timestamp, False),
+              ('created_by', text(80), False), ('created_at', timestamp, False),
+              ('recurrence', choice(tuple(RECURRENCE_RULES)), False), ('recurrence_interval', integer, False),
+              ('recurrence_until', timestamp, False), ('recurrence_count', integer, False)],
+    'event_override': [('event', integer, True), ('occurrence', timestamp, True), ('cancelled', boolean, False),
+                       ('title', text(200), False), ('description', text(), False), ('location', text(200), False),
+                       ('start_date', timestamp, False), ('end_date', timestamp, False)],
+}
+RECORD_ORDER = list(RECORDS)
+CSV_COLUMNS = ['type'] + list(dict.fromkeys(name for fields in RECORDS.values() for name, _, _ in fields))
+
+
+# Export / Экспорт
+
+def stream_rows(query):
+    for row in db.session.execute(query.execution_options(yield_per=EXPORT_YIELD_PER)):
+        yield row._asdict()
+
+
+def export_records(project):
+    yield EXPORT_FORMAT, {'version': EXPORT_VERSION}
+    yield 'project', {'name': project.name, 'description': project.description, 'github_url': project.github_url,
+                      'category': project.category, 'is_public': project.is_public, 'created_at': project.created_at}
+
+    for row in stream_rows(db.select(User.username, ProjectMember.role, ProjectMember.joined_at)
+                           .join(User, User.id == ProjectMember.user_id)
+                           .where(ProjectMember.project_id == project.id).order_by(ProjectMember.id)):
+        yield 'member', row
+
+    assignee = aliased(User)
+    creator = aliased(User)
+    for row in stream_rows(db.select(Task.title, Task.description, Task.status, Task.priority, Task.due_date,
+                                     Task.created_at, Task.sort_order, assignee.username.label('assignee'),
+                                     creator.username.label('created_by'))
+                           .outerjoin(assignee, assignee.id == Task.assigned_to)
+                           .outerjoin(creator, creator.id == Task.created_by)
+                           .where(Task.project_id == project.id).order_by(Task.id)):
+        yield 'task', row
+
+    for row in stream_rows(db.select(Event.id, Event.title, Event.description, Event.location, Event.start_date,
+                                     Event.end_date, creator.username.label('created_by'), Event.created_at,
+                                     Event.recurrence, Event.recurrence_interval, Event.recurrence_until,
+                                     Event.recurrence_count)
+                           .outerjoin(creator, creator.id == Event.created_by)
+                           .where(Event.project_id == project.id).order_by(Event.id)):
+        yield 'event', row
+
+    for row in stream_rows(db.select(EventOverride.event_id.label('event'), EventOverride.occurrence,
+                                     EventOverride.cancelled, EventOverride.title, EventOverride.description,
+                                     EventOverride.location, EventOverride.start_date, EventOverride.end_date)
+                           .where(EventOverride.project_id == project.id).order_by(EventOverride.id)):
+        yield 'event_override', row
+
+
+def plain(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return plain(value)
+
+
+# Response body in chunks, fmt is 'ndjson' or 'csv' / Тело ответа частями, fmt - 'ndjson' или 'csv'
+def export_project(project, fmt):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if fmt == 'csv' else None
+    if writer is not None:
+        writer.writerow(CSV_COLUMNS)
+
+    for kind, fields in export_records(project):
+        if writer is not None:
+            writer.writerow([kind] + [csv_value(fields.get(name)) for name in CSV_COLUMNS[1:]])
+        else:
+            buffer.write(json.dumps({'type': kind, **{name: plain(value) for name, value in fields.items()}},
+                                    ensure_ascii=False) + '\n')
+        if buffer.tell() >= EXPORT_CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+# Import / Импорт
+
+# (line, type, raw fields) from an uploaded file / (строка, тип, исходные поля) из загруженного файла
+def read_records(stream, fmt):
+    lines = io.TextIOWrapper(stream, encoding='utf-8', newline='' if fmt == 'csv' else None)
+    try:
+        if fmt == 'csv':
+            reader = csv.DictReader(lines)
+            if not reader.fieldnames or 'type' not in reader.fieldnames:
+                raise InvalidImport('В файле нет столбца type')
+            for row in reader:
+                yield reader.line_num, row.pop('type'), row
+            return
+
+        for number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                raise InvalidImport(f'Строка {number}: неверный JSON')
+            if not isinstance(record, dict):
+                raise InvalidImport(f'Строка {number}: ожидается объект')
+            yield number, record.pop('type', None), record
+    except UnicodeDecodeError:
+        raise InvalidImport('Файл должен быть в кодировке UTF-8')
+
+
+def validate(line, kind, raw):
+    if kind not in RECORDS:
+        raise InvalidImport(f'Строка {line}: неизвестный тип записи {kind!r}')
+    fields = {}
+    for name, parse, required in RECORDS[kind]:
+        value = raw.get(name)
+        if value is None or value == '':
+            if required:
+                raise InvalidImport(f'Строка {line}: нет поля {name}')
+            fields[name] = None
+            continue
+        try:
+            fields[name] = parse(value)
+        except (TypeError, ValueError) as e:
+            raise InvalidImport(f'Строка {line}: поле {name}: {e}')
+    return fields
+
+
+class ProjectImporter:
+    def __init__(self, owner, batch_size=IMPORT_BATCH_SIZE):
+        self.owner = owner
+        self.batch_size = batch_size
+        self.project = None
+        self.user_ids = {owner.username: owner.id}
+        self.members = {owner.id}
+        self.event_ids = {}
+        self.counts = {}
+
+    # Yields progress {'stage': type, 'count': records}, the caller commits or rolls back
+    # Отдаёт прогресс {'stage': тип, 'count': записей}, commit или rollback делает вызывающий
+    def run(self, records):
+        stage = -1
+        batch = []
+        for line, kind, raw in records:
+            fields = validate(line, kind, raw)
+            position = RECORD_ORDER.index(kind)
+            if stage < 0 and kind != EXPORT_FORMAT:
+                raise InvalidImport('Это не файл экспорта TeamEasy')
+            if position < stage or (position == stage and position <= 1):
+                raise InvalidImport(f'Строка {line}: запись {kind} не на своём месте')
+            if position > 1 and self.project is None:
+                raise InvalidImport(f'Строка {line}: записи до описания проекта')
+
+            if position != stage and batch:
+                yield self.flush(RECORD_ORDER[stage], batch)
+                batch = []
+            stage = position
+
+            if kind == EXPORT_FORMAT:
+                if fields['version'] != EXPORT_VERSION:
+                    raise InvalidImport(f'Неподдерживаемая версия файла: {fields["version"]}')
+            elif kind == 'project':
+                self.create_project(fields)
+            else:
+                batch.append((line, fields))
+                if len(batch) >= self.batch_size:
+                    yield self.flush(kind, batch)
+                    batch = []
+
+        if batch:
+            yield self.flush(RECORD_ORDER[stage], batch)
+        if self.project is None:
+            raise InvalidImport('В файле нет проекта')
+
+    def create_project(self, fields):
+        self.project = Project(name=fields['name'], description=fields['description'],
+                               github_url=fields['github_url'] or '', category=fields['category'],
+                               is_public=bool(fields['is_public']), owner_id=self.owner.id,
+                               created_at=fields['created_at'] or datetime.now())
+        db.session.add(self.project)
+        db.session.flush()
+        db.session.add(ProjectMember(project_id=self.project.id, user_id=self.owner.id, role='Владелец'))
+        db.session.flush()
+
+    # One query per batch for usernames not seen yet / Один запрос на пачку для ещё не встречавшихся имён
+    def resolve_users(self, names):
+        missing = {name for name in names if name and name not in self.user_ids}
+        if missing:
+            for user_id, username in db.session.query(User.id, User.username).filter(User.username.in_(missing)):
+                self.user_ids[username] = user_id
+            for name in missing:
+                self.user_ids.setdefault(name, None)
+
+    def flush(self, kind, batch):
+        getattr(self, f'insert_{kind}')(batch)
+        self.counts[kind] = self.counts.get(kind, 0) + len(batch)
+        return {'stage': kind, 'count': self.counts[kind]}
+
+    # Unknown users and repeated members are skipped / Неизвестные пользователи и повторы пропускаются
+    def insert_member(self, batch):
+        self.resolve_users(fields['username'] for _, fields in batch)
+        rows = []
+        for _, fields in batch:
+            user_id = self.user_ids[fields['username']]
+            if user_id is None or user_id in self.members:
+                continue
+            self.members.add(user_id)
+            # The importing user is the only owner / Единственный владелец - импортирующий
+            role = fields['role'] if fields['role'] and fields['role'] != 'Владелец' else 'Участник'
+            rows.append({'project_id': self.project.id, 'user_id': user_id, 'role': role,
+                         'joined_at': fields['joined_at'] or datetime.now()})
+        if rows:
+            db.session.execute(db.insert(ProjectMember), rows)
+
+    # Unknown assignees are cleared, unknown authors become the importing user
+    # Неизвестные исполнители сбрасываются, автором неизвестных становится импортирующий
+    def insert_task(self, batch):
+        self.resolve_users(name for _, fields in batch for name in (fields['assignee'], fields['created_by']))
+        now = datetime.now()
+        db.session.execute(db.insert(Task), [{
+            'project_id': self.project.id,
+            'title': fields['title'],
+            'description': fields['description'],
+            'status': fields['status'] or 'todo',
+            'priority': fields['priority'] or 'medium',
+            'due_date': fields['due_date'],
+            'created_at': fields['created_at'] or now,
+            'sort_order': fields['sort_order'] if fields['sort_order'] is not None else time.time(),
+            'assigned_to': self.user_ids.get(fields['assignee']),
+            'created_by': self.user_ids.get(fields['created_by']) or self.owner.id,
+        } for _, fields in batch])
+
+    def insert_event(self, batch):
+        self.resolve_users(fields['created_by'] for _, fields in batch)
+        rows = []
+        for line, fields in batch:
+            if fields['id'] in self.event_ids:
+                raise InvalidImport(f'Строка {line}: повторный id события {fields["id"]}')
+            interval = fields['recurrence_interval'] or 1
+            count = fields['recurrence_count']
+            if not 1 <= interval <= RECURRENCE_MAX_INTERVAL or (count is not None and not 1 <= count <= RECURRENCE_MAX_COUNT):
+                raise InvalidImport(f'Строка {line}: неверные параметры повторения')
+            row = {
+                'project_id': self.project.id,
+                'title': fields['title'],
+                'description': fields['description'],
+                'location': fields['location'],
+                'start_date': fields['start_date'],
+                'end_date': fields['end_date'],
+                'created_by': self.user_ids.get(fields['created_by']) or self.owner.id,
+                'created_at': fields['created_at'] or datetime.now(),
+                'recurrence': fields['recurrence'],
+                'recurrence_interval': interval,
+                'recurrence_until': fields['recurrence_until'],
+                'recurrence_count': count,
+            }
+            row['series_end'] = series_end(SimpleNamespace(**row))
+            rows.append(row)
+
+        # New ids in file order for the overrides / Новые id в порядке файла для изменений повторений
+        new_ids = db.session.execute(db.insert(Event).returning(Event.id, sort_by_parameter_order=True), rows).scalars()
+        for (_, fields), event_id in zip(batch, new_ids):
+            self.event_ids[fields['id']] = event_id
+
+    def insert_event_override(self, batch):
+        rows = []
+        for line, fields in batch:
+            if fields['event'] not in self.event_ids:
+                raise InvalidImport(f'Строка {line}: нет события {fields["event"]}')
+            rows.append({'event_id': self.event_ids[fields['event']], 'project_id': self.project.id,
+                         'occurrence': fields['occurrence'], 'cancelled': bool(fields['cancelled']),
+                         **{name: fields[name] for name in ('title', 'description', 'location', 'start_date',
+                                                            'end_date')}})
+        db.session.execute(db.insert(EventOverride), rows)
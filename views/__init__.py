@@ -0,0 +1,47 @@
+# Blueprints of the app and helpers they share / Блюпринты приложения и их общие помощники
+# Registered by create_app() in app.py / Регистрируются в create_app() в app.py
+from flask import current_app, g, request, flash, redirect, url_for, abort
+from flask_login import current_user
+from models import db, Project, ProjectMember
+from functools import wraps
+
+
+# Project with caller's membership, cached per request / Проект и членство пользователя, кэш на запрос
+def load_project_access(project_id):
+    cache = g.setdefault('project_access', {})
+    if project_id not in cache:
+        cache[project_id] = db.session.query(Project, ProjectMember) \
+            .outerjoin(ProjectMember, db.and_(ProjectMember.project_id == Project.id,
+                                              ProjectMember.user_id == current_user.id)) \
+            .filter(Project.id == project_id, Project.deleting == db.false()).first()
+    return cache[project_id]
+
+
+# Access check decorator, passes project to the view / Декоратор проверки доступа, передаёт проект в view
+def project_access(view):
+    @wraps(view)
+    def wrapper(**kwargs):
+        access = load_project_access(kwargs['project_id'])
+        if access is None:
+            abort(404)
+
+        project, membership = access
+        if not membership and project.owner_id != current_user.id:
+            flash('У вас нет доступа к этому проекту', 'error')
+            return redirect(url_for('projects.my_projects'))
+
+        return view(project, **kwargs)
+
+    return wrapper
+
+
+# Fragment revalidated by ETag, rendered only when it changed / Фрагмент с проверкой по ETag, рендерится только при изменении
+def conditional_fragment(etag, render):
+    if request.if_none_match.contains_weak(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = current_app.response_class(render())
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
@@ -0,0 +1,90 @@
+# Registration, login and logout / Регистрация, вход и выход
+from flask import Blueprint, render_template, redirect, url_for, request, flash
+from flask_login import login_user, logout_user, login_required, current_user
+from models import db, User
+from identity import user_cache
+
+bp = Blueprint('auth', __name__)
+
+
+# Index page / Главная страница
+@bp.route('/')
+def index():
+    if current_user.is_authenticated:
+        return redirect(url_for('projects.home'))
+    return render_template('index.html')
+
+
+# Registration by Flask Login / Регистрация через библиотеку Flask Login
+@bp.route('/register', methods=['GET', 'POST'])
+def register():
+    if current_user.is_authenticated:
+        return redirect(url_for('auth.index'))
+
+    if request.method == 'POST':
+        username = request.form['username']
+        email = request.form['email']
+        password = request.form['password']
+        github = request.form.get('github', '')
+        telegram = request.form.get('telegram', '')
+        discord = request.form.get('discord', '')
+
+        if telegram and telegram.startswith('@'):
+            telegram = telegram[1:]
+
+        # Username unique check / Проверка уникальности имени пользователя
+        if User.query.filter_by(username=username).first():
+            flash('Имя пользователя уже занято', category='error')
+            return redirect(url_for('auth.register'))
+
+        # Mail unique check / Проверка уникальности почты
+        if User.query.filter_by(email=email).first():
+            flash('Эта почта уже привязана к другому аккаунту', category='error')
+            return redirect(url_for('auth.register'))
+
+        user = User(username=username, email=email, github=github, telegram=telegram, discord=discord)
+        user.set_password(password)
+        db.session.add(user)
+        db.session.commit()
+
+        flash('Успешная регистрация', 'success')
+        return redirect(url_for('auth.login'))
+
+    return render_template('register.html')
+
+
+# Login / Вход
+@bp.route('/login', methods=['GET', 'POST'])
+def login():
+    if current_user.is_authenticated:
+        return redirect(url_for('auth.index'))
+
+    if request.method == 'POST':
+        username = request.form['username']
+        password = request.form['password']
+        user = User.query.filter_by(username=username).first()
+
+        # Check username and password / Проверка имени и пароля
+        if user and user.check_password(password):
+            # Rehash with current parameters / Перехеширование с текущими параметрами
+            if user.password_needs_rehash():
+                user.set_password(password)
+                db.session.commit()
+
+            login_user(user)
+            # Next pages find the user in the cache / Следующие страницы найдут пользователя в кэше
+            user_cache.store(user)
+            next_page = request.args.get('next')
+            return redirect(next_page or url_for('auth.index'))
+        else:
+            flash('Неверное имя пользователя или пароль', 'error')
+
+    return render_template('login.html')
+
+
+# Logout / Выход
+@bp.route('/logout')
+@login_required
+def logout():
+    logout_user()
+    return redirect(url_for('auth.index'))
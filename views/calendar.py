@@ -0,0 +1,623 @@
+# Project calendar and calendar feeds / Календарь проекта и подписки на календарь
+from flask import Blueprint, current_app, render_template, redirect, url_for, request, flash, abort
+from flask_login import login_required, current_user
+from models import db, User, Project, ProjectMember, Event, EventOverride, with_loaders
+from database import read_replica
+from fragments import FragmentStore, fragment_cache
+from live import live_updates
+from recurrence import RECURRENCE_RULES, RECURRENCE_MAX_INTERVAL, RECURRENCE_MAX_COUNT, Occurrence, duration, \
+    expand, is_occurrence, series_end
+from views import project_access, conditional_fragment
+from datetime import datetime, timedelta, timezone
+import calendar as cal
+import hashlib
+import itertools
+import json
+
+bp = Blueprint('calendar', __name__)
+
+
+MONTH_NAMES = {
+    1: 'Январь', 2: 'Февраль', 3: 'Март', 4: 'Апрель',
+    5: 'Май', 6: 'Июнь', 7: 'Июль', 8: 'Август',
+    9: 'Сентябрь', 10: 'Октябрь', 11: 'Ноябрь', 12: 'Декабрь'
+}
+CALENDAR_MAX_DAYS = 92
+UPCOMING_EVENTS = 5
+
+
+# Overrides of the loaded series, {event id: {occurrence: EventOverride}} / Изменения загруженных серий
+def load_overrides(events, window_start=None, window_end=None):
+    series = [event for event in events if event.recurrence]
+    if not series:
+        return {}
+
+    query = EventOverride.query.filter(EventOverride.event_id.in_([event.id for event in series]))
+    if window_start is not None:
+        # Original or new time reaches the window / Исходное или новое время попадает в окно
+        earliest = window_start - max(duration(event) for event in series)
+        query = query.filter(db.or_(EventOverride.occurrence >= earliest, EventOverride.start_date >= earliest))
+    if window_end is not None:
+        query = query.filter(db.or_(EventOverride.occurrence < window_end, EventOverride.start_date < window_end))
+
+    overrides = {}
+    for override in query:
+        overrides.setdefault(override.event_id, {})[override.occurrence] = override
+    return overrides
+
+
+# Events and occurrences overlapping [window_start, window_end) / События и повторения, пересекающие [window_start, window_end)
+def events_in_window(project_id, window_start, window_end):
+    # Series with an occurrence moved into the window / Серии с повторением, перенесённым в окно
+    moved_in = db.select(EventOverride.event_id).where(
+        EventOverride.project_id == project_id,
+        EventOverride.start_date < window_end,
+        db.func.coalesce(EventOverride.end_date, EventOverride.start_date) >= window_start)
+
+    # Ranges on the effective end, so past events are not walked, endless series have none
+    # Диапазоны по фактическому концу, прошлые события не перебираются, у бесконечных серий его нет
+    ending_in = db.select(Event.id).where(Event.project_id == project_id, Event.series_end >= window_start,
+                                          Event.start_date < window_end)
+    endless = db.select(Event.id).where(Event.project_id == project_id, Event.series_end.is_(None),
+                                        Event.start_date < window_end)
+
+    events = Event.query.filter(Event.id.in_(db.union(ending_in, endless, moved_in))).order_by(Event.start_date).all()
+    return list(expand(events, load_overrides(events, window_start, window_end), window_start, window_end))
+
+
+# Next events and occurrences, series are walked only up to the limit
+# Ближайшие события и повторения, серии перебираются только до лимита
+def upcoming_events(project_id, now, limit=UPCOMING_EVENTS):
+    one_off = db.select(Event.id).where(Event.project_id == project_id, Event.recurrence.is_(None),
+                                        Event.start_date >= now).order_by(Event.start_date).limit(limit)
+    events = with_loaders(Event.query.filter(
+        Event.project_id == project_id,
+        db.or_(Event.id.in_(one_off),
+               db.and_(Event.recurrence.isnot(None), db.or_(Event.series_end.is_(None), Event.series_end >= now)))
+    ), 'calendar').order_by(Event.start_date).all()
+
+    occurrences = (event for event in expand(events, load_overrides(events, now), now) if event.start_date >= now)
+    return list(itertools.islice(occurrences, limit))
+
+
+# Recurrence fields of the create and update forms / Поля повторения в формах создания и изменения
+def apply_recurrence(event, form):
+    rule = form.get('recurrence') or None
+    interval, until, count = 1, None, None
+    if rule is not None:
+        if rule not in RECURRENCE_RULES:
+            raise ValueError(rule)
+        interval = int(form.get('recurrence_interval') or 1)
+        if form.get('recurrence_until'):
+            until = datetime.strptime(form['recurrence_until'], '%Y-%m-%d')
+        if form.get('recurrence_count'):
+            count = int(form['recurrence_count'])
+        if not 1 <= interval <= RECURRENCE_MAX_INTERVAL or (count is not None and not 1 <= count <= RECURRENCE_MAX_COUNT) \
+                or (until is not None and until.date() < event.start_date.date()):
+            raise ValueError(form)
+
+    event.recurrence = rule
+    event.recurrence_interval = interval
+    event.recurrence_until = until
+    event.recurrence_count = count
+    event.series_end = series_end(event)
+
+
+def parse_occurrence(value):
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        abort(400)
+
+
+# Events by day in one pass, multi-day events on every day / События по дням за один проход, многодневные на каждом дне
+def bucket_events(events, first_day, last_day):
+    buckets = {}
+    for event in events:
+        end_date = event.end_date if event.end_date and event.end_date > event.start_date else event.start_date
+        day = max(event.start_date.date(), first_day)
+        while day <= min(end_date.date(), last_day):
+            buckets.setdefault(day, []).append(event)
+            day += timedelta(days=1)
+    return buckets
+
+
+# Live update of one calendar event, chips for its start day and the rest
+# Живое обновление события, метки для дня начала и остальных дней
+def event_change(event):
+    # Series change many days, pages reload / Серия меняет много дней, страницы перезагружаются
+    if event.recurrence:
+        return {'id': event.id, 'series': True}
+    end_date = event.end_date if event.end_date and event.end_date > event.start_date else event.start_date
+    return {'id': event.id, 'start': event.start_date.isoformat(),
+            'first_day': event.start_date.date().isoformat(), 'last_day': end_date.date().isoformat(),
+            'first_html': render_template('calendar_event.html', event=event, show_time=event.start_date.time()),
+            'html': render_template('calendar_event.html', event=event, show_time=False)}
+
+
+# Project calendar / Календарь проекта
+@bp.route('/project/<int:project_id>/calendar')
+@bp.route('/project/<int:project_id>/calendar/<int:year>/<int:month>')
+@login_required
+@read_replica
+@project_access
+def project_calendar(project, project_id, year=None, month=None):
+    today = datetime.now()
+    view = request.args.get('view', 'month')
+
+    # Range of the view: month, week or custom / Диапазон: месяц, неделя или произвольный
+    try:
+        if view == 'week':
+            anchor = datetime.strptime(request.args['date'], '%Y-%m-%d') if 'date' in request.args else today
+            range_start = anchor.date() - timedelta(days=anchor.weekday())
+            range_end = range_start + timedelta(days=6)
+        elif view == 'custom':
+            range_start = datetime.strptime(request.args['start'], '%Y-%m-%d').date()
+            range_end = datetime.strptime(request.args['end'], '%Y-%m-%d').date()
+        else:
+            view = 'month'
+            if not year or not month:
+                year = today.year
+                month = today.month
+            range_start = datetime(year, month, 1).date()
+            range_end = datetime(year, month, cal.monthrange(year, month)[1]).date()
+    except (KeyError, ValueError):
+        abort(400)
+
+    if range_end < range_start or (range_end - range_start).days >= CALENDAR_MAX_DAYS:
+        abort(400)
+
+    # Whole weeks around the range / Полные недели вокруг диапазона
+    grid_start = range_start - timedelta(days=range_start.weekday())
+    grid_end = range_end + timedelta(days=6 - range_end.weekday())
+
+    def render_grid():
+        events = events_in_window(project_id, datetime.combine(grid_start, datetime.min.time()),
+                                  datetime.combine(grid_end + timedelta(days=1), datetime.min.time()))
+        buckets = bucket_events(events, grid_start, grid_end)
+
+        # Calendar structure / Структура календаря
+        calendar = []
+        day = grid_start
+        while day <= grid_end:
+            week_days = []
+            for _ in range(7):
+                week_days.append({'day': day.day, 'date': day, 'in_range': range_start <= day <= range_end,
+                                  'events': buckets.get(day, [])})
+                day += timedelta(days=1)
+            calendar.append(week_days)
+        return render_template('calendar_grid.html', calendar=calendar)
+
+    grid = fragment_cache.render('calendar_grid', project_id, project.version, render_grid,
+                                 range_start.isoformat(), range_end.isoformat())
+
+    # Future events / Предстоящие события
+    upcoming = upcoming_events(project_id, today)
+
+    # Navigation / Навигация
+    if view == 'month':
+        title = f'{MONTH_NAMES[month]} {year}'
+        prev_month = range_start - timedelta(days=1)
+        next_month = range_end + timedelta(days=1)
+        prev_url = url_for('calendar.project_calendar', project_id=project_id, year=prev_month.year, month=prev_month.month)
+        next_url = url_for('calendar.project_calendar', project_id=project_id, year=next_month.year, month=next_month.month)
+        today_url = url_for('calendar.project_calendar', project_id=project_id)
+    elif view == 'week':
+        title = f"{range_start.strftime('%d.%m.%Y')} — {range_end.strftime('%d.%m.%Y')}"
+        prev_url = url_for('calendar.project_calendar', project_id=project_id, view='week',
+                           date=(range_start - timedelta(days=7)).isoformat())
+        next_url = url_for('calendar.project_calendar', project_id=project_id, view='week',
+                           date=(range_start + timedelta(days=7)).isoformat())
+        today_url = url_for('calendar.project_calendar', project_id=project_id, view='week')
+    else:
+        title = f"{range_start.strftime('%d.%m.%Y')} — {range_end.strftime('%d.%m.%Y')}"
+        length = range_end - range_start + timedelta(days=1)
+        prev_url = url_for('calendar.project_calendar', project_id=project_id, view='custom',
+                           start=(range_start - length).isoformat(), end=(range_end - length).isoformat())
+        next_url = url_for('calendar.project_calendar', project_id=project_id, view='custom',
+                           start=(range_start + length).isoformat(), end=(range_end + length).isoformat())
+        today_url = url_for('calendar.project_calendar', project_id=project_id)
+
+    return render_template('calendar.html', project=project, grid=grid,
+                           upcoming_events=upcoming, view=view, title=title, rules=RECURRENCE_RULES,
+                           today=today.strftime('%Y-%m-%d'), prev_url=prev_url, next_url=next_url,
+                           today_url=today_url)
+
+
+# Create event / Создание события
+@bp.route('/project/<int:project_id>/events/create', methods=['POST'])
+@login_required
+@project_access
+def create_event(project, project_id):
+    title = request.form['event_title']
+    description = request.form.get('event_description', '')
+    location = request.form.get('location', '')
+
+    # Start date and time / Начальные дата и время
+    start_date_str = request.form['start_date']
+    start_time_str = request.form.get('start_time')
+
+    if start_time_str:
+        start_datetime_str = f"{start_date_str} {start_time_str}"
+        start_date = datetime.strptime(start_datetime_str, '%Y-%m-%d %H:%M')
+    else:
+        start_date = datetime.strptime(start_date_str, '%Y-%m-%d')
+
+    # End date and time / Конечные дата и время
+    end_date = None
+    end_date_str = request.form.get('end_date')
+    if end_date_str:
+        end_time_str = request.form.get('end_time')
+        if end_time_str:
+            end_datetime_str = f"{end_date_str} {end_time_str}"
+            end_date = datetime.strptime(end_datetime_str, '%Y-%m-%d %H:%M')
+        else:
+            end_date = datetime.strptime(end_date_str, '%Y-%m-%d')
+
+    event = Event(
+        project_id=project_id,
+        title=title,
+        description=description,
+        location=location,
+        start_date=start_date,
+        end_date=end_date,
+        created_by=current_user.id
+    )
+    try:
+        apply_recurrence(event, request.form)
+    except ValueError:
+        flash('Неверные параметры повторения', 'error')
+        return redirect(url_for('calendar.project_calendar', project_id=project_id))
+
+    try:
+        db.session.add(event)
+        project.touch_events()
+        db.session.flush()
+        change = event_change(event)
+        db.session.commit()
+        live_updates.publish(project_id, 'event', change)
+        flash('Событие создано', 'success')
+    except Exception as e:
+        db.session.rollback()
+        flash('Ошибка при создании события: ' + str(e), 'error')
+
+    return redirect(url_for('calendar.project_calendar', project_id=project_id))
+
+
+# Event modal / Модальное окно события
+@bp.route('/project/<int:project_id>/events/<int:event_id>/modal')
+@login_required
+@project_access
+def event_modal(project, project_id, event_id):
+    occurrence = parse_occurrence(request.args.get('occurrence'))
+
+    def render():
+        event = Event.query.filter_by(id=event_id, project_id=project_id).first_or_404()
+        item = event
+        # One occurrence of a series with its changes / Одно повторение серии с его изменениями
+        if event.recurrence and occurrence is not None:
+            if not is_occurrence(event, occurrence):
+                abort(404)
+            override = EventOverride.query.filter_by(event_id=event.id, occurrence=occurrence).first()
+            item = Occurrence(event, occurrence, override)
+        return render_template('event_modal.html', event=item, series=event, project_id=project_id,
+                               rules=RECURRENCE_RULES)
+
+    key = occurrence.isoformat() if occurrence else 'series'
+    return conditional_fragment(f'event-{event_id}-{key}-{project.events_version}', render)
+
+
+# Override row of one occurrence / Строка изменений одного повторения
+def occurrence_override(event, occurrence):
+    override = EventOverride.query.filter_by(event_id=event.id, occurrence=occurrence).first()
+    if override is None:
+        override = EventOverride(event_id=event.id, project_id=event.project_id, occurrence=occurrence)
+        db.session.add(override)
+    return override
+
+
+# Update event / Изменение события
+@bp.route('/project/<int:project_id>/events/<int:event_id>/update', methods=['POST'])
+@login_required
+@project_access
+def update_event(project, project_id, event_id):
+    event = Event.query.filter_by(id=event_id, project_id=project_id).first_or_404()
+
+    # Event creator check / Проверка на создателя события
+    if event.created_by != current_user.id:
+        flash('Вы можете изменять только свои события', 'error')
+        return redirect(url_for('calendar.project_calendar', project_id=project_id))
+
+    occurrence = parse_occurrence(request.form.get('occurrence')) if event.recurrence else None
+    if occurrence is not None and not is_occurrence(event, occurrence):
+        abort(404)
+
+    # Start date and time / Начальные дата и время
+    start_date_str = request.form['start_date']
+    start_time_str = request.form.get('start_time')
+
+    if start_time_str:
+        start_datetime_str = f"{start_date_str} {start_time_str}"
+        start_date = datetime.strptime(start_datetime_str, '%Y-%m-%d %H:%M')
+    else:
+        start_date = datetime.strptime(start_date_str, '%Y-%m-%d')
+
+    # End date and time / Конечные дата и время
+    end_date = None
+    end_date_str = request.form.get('end_date')
+    if end_date_str:
+        end_time_str = request.form.get('end_time')
+        if end_time_str:
+            end_datetime_str = f"{end_date_str} {end_time_str}"
+            end_date = datetime.strptime(end_datetime_str, '%Y-%m-%d %H:%M')
+        else:
+            end_date = datetime.strptime(end_date_str, '%Y-%m-%d')
+
+    was_series = bool(event.recurrence)
+    if occurrence is not None and request.form.get('scope') == 'occurrence':
+        # Only this occurrence, the series stays as is / Только это повторение, серия не меняется
+        override = occurrence_override(event, occurrence)
+        override.cancelled = False
+        override.title = request.form['title']
+        override.description = request.form.get('description', '')
+        override.location = request.form.get('location', '')
+        override.start_date = start_date
+        override.end_date = end_date
+    else:
+        timing = (event.start_date, duration(event), event.recurrence, event.recurrence_interval,
+                  event.recurrence_until, event.recurrence_count)
+        event.title = request.form['title']
+        event.description = request.form.get('description', '')
+        event.location = request.form.get('location', '')
+        # Edited from an occurrence, the whole series shifts by the same amount
+        # Изменение из повторения сдвигает всю серию на ту же величину
+        if occurrence is not None:
+            shift = event.start_date - occurrence
+            start_date += shift
+            end_date = end_date + shift if end_date else None
+        event.start_date = start_date
+        event.end_date = end_date
+        try:
+            apply_recurrence(event, request.form)
+        except ValueError:
+            db.session.rollback()
+            flash('Неверные параметры повторения', 'error')
+            return redirect(url_for('calendar.project_calendar', project_id=project_id))
+
+        # Changes no longer match occurrences of a retimed series / Изменения не совпадают с повторениями новой серии
+        if was_series and timing != (event.start_date, duration(event), event.recurrence, event.recurrence_interval,
+                                     event.recurrence_until, event.recurrence_count):
+            EventOverride.query.filter_by(event_id=event.id).delete()
+
+    try:
+        project.touch_events()
+        change = event_change(event) if not was_series else {'id': event.id, 'series': True}
+        db.session.commit()
+        live_updates.publish(project_id, 'event', change)
+        flash('Событие изменено', 'success')
+    except Exception as e:
+        db.session.rollback()
+        flash('Ошибка при обновлении события: ' + str(e), 'error')
+
+    return redirect(url_for('calendar.project_calendar', project_id=project_id))
+
+
+# Delete event / Удаление события
+@bp.route('/project/<int:project_id>/events/<int:event_id>/delete', methods=['POST'])
+@login_required
+@project_access
+def delete_event(project, project_id, event_id):
+    event = Event.query.filter_by(id=event_id, project_id=project_id).first_or_404()
+
+    # Event creator check / Проверка на владельца события
+    if event.created_by != current_user.id:
+        flash('Вы можете удалять только свои события', 'error')
+        return redirect(url_for('calendar.project_calendar', project_id=project_id))
+
+    occurrence = parse_occurrence(request.form.get('occurrence')) if event.recurrence else None
+    if occurrence is not None and not is_occurrence(event, occurrence):
+        abort(404)
+
+    try:
+        if occurrence is not None and request.form.get('scope') == 'occurrence':
+            # Exception of the series / Исключение из серии
+            override = occurrence_override(event, occurrence)
+            override.cancelled = True
+            change = {'id': event_id, 'series': True}
+        else:
+            EventOverride.query.filter_by(event_id=event.id).delete()
+            db.session.delete(event)
+            change = {'id': event_id, 'deleted': True}
+        project.touch_events()
+        db.session.commit()
+        live_updates.publish(project_id, 'event', change)
+        flash('Событие удалено', 'success')
+    except Exception as e:
+        db.session.rollback()
+        flash('Ошибка при удалении события: ' + str(e), 'error')
+
+    return redirect(url_for('calendar.project_calendar', project_id=project_id))
+
+
+FEED_PAST_DAYS = 30
+FEED_FUTURE_DAYS = 365
+FEED_MAX_DAYS = 400
+
+
+# Feed bodies by (feed, format, etag), per app and limited by total bytes
+# Тела подписок по (подписка, формат, etag), отдельно для приложения, с ограничением по общему размеру
+@bp.record_once
+def init_feed_cache(state):
+    state.app.config.setdefault('FEED_CACHE_MAX_SIZE', 32 * 1024 * 1024)  # bytes / байт
+    state.app.extensions['feed_cache'] = FragmentStore(state.app.config['FEED_CACHE_MAX_SIZE'], None, None)
+
+
+def ics_text(value):
+    return (value or '').replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+
+# Fold iCalendar lines to 75 octets / Перенос строк iCalendar по 75 байт
+def ics_fold(line):
+    data = line.encode('utf-8')
+    chunks = []
+    limit = 75
+    while len(data) > limit:
+        cut = limit
+        while (data[cut] & 0xC0) == 0x80:
+            cut -= 1
+        chunks.append(data[:cut])
+        data = data[cut:]
+        limit = 74
+    chunks.append(data)
+    return '\r\n '.join(chunk.decode('utf-8') for chunk in chunks)
+
+
+def ics_time(value):
+    return value.strftime('%Y%m%dT%H%M%S')
+
+
+# Series rule, calendar apps expand it themselves / Правило серии, приложения календаря разворачивают его сами
+def ics_rrule(event):
+    rule = f'RRULE:FREQ={event.recurrence.upper()};INTERVAL={event.recurrence_interval}'
+    # Late days fall on the last day of shorter months, as in recurrence.py
+    # Поздние числа переносятся на последний день коротких месяцев, как в recurrence.py
+    if event.recurrence == 'monthly' and event.start_date.day > 28:
+        days = ','.join(str(day) for day in range(28, event.start_date.day + 1))
+        rule += f';BYMONTHDAY={days};BYSETPOS=-1'
+    if event.recurrence_count is not None:
+        rule += f';COUNT={event.recurrence_count}'
+    if event.recurrence_until is not None:
+        rule += f";UNTIL={event.recurrence_until.strftime('%Y%m%d')}T235959"
+    return rule
+
+
+def ics_event(event, stamp, extra=()):
+    lines = ['BEGIN:VEVENT', f'UID:event-{event.id}@teameasy', f'DTSTAMP:{stamp}',
+             f'DTSTART:{ics_time(event.start_date)}']
+    if event.end_date:
+        lines.append(f'DTEND:{ics_time(event.end_date)}')
+    lines += extra
+    lines.append(f'SUMMARY:{ics_text(event.title)}')
+    if event.description:
+        lines.append(f'DESCRIPTION:{ics_text(event.description)}')
+    if event.location:
+        lines.append(f'LOCATION:{ics_text(event.location)}')
+    lines.append('END:VEVENT')
+    return lines
+
+
+# JSON gets expanded occurrences, iCalendar gets series with their overrides
+# JSON получает развёрнутые повторения, iCalendar - серии с их изменениями
+def serialize_feed(events, overrides, fmt, name):
+    if fmt == 'json':
+        return json.dumps([{
+            'id': event.id,
+            'project_id': event.project_id,
+            'title': event.title,
+            'description': event.description,
+            'location': event.location,
+            'start': event.start_date.isoformat(),
+            'end': event.end_date.isoformat() if event.end_date else None,
+            'occurrence': event.occurrence.isoformat() if event.occurrence else None,
+        } for event in events], ensure_ascii=False)
+
+    stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    lines = ['BEGIN:VCALENDAR', 'VERSION:2.0', 'PRODID:-//TeamEasy//Calendar//RU', f'X-WR-CALNAME:{ics_text(name)}']
+    for event in events:
+        if not event.recurrence:
+            lines += ics_event(event, stamp)
+            continue
+
+        changed = sorted(overrides.get(event.id, {}).items())
+        lines += ics_event(event, stamp, [ics_rrule(event)] + [
+            f'EXDATE:{ics_time(occurrence)}' for occurrence, override in changed if override.cancelled])
+        for occurrence, override in changed:
+            if not override.cancelled and is_occurrence(event, occurrence):
+                lines += ics_event(Occurrence(event, occurrence, override), stamp,
+                                   [f'RECURRENCE-ID:{ics_time(occurrence)}'])
+    lines.append('END:VCALENDAR')
+    return '\r\n'.join(ics_fold(line) for line in lines) + '\r\n'
+
+
+# Window of the JSON feed, ?start=&end= or around today / Окно JSON-подписки, ?start=&end= или вокруг сегодняшнего дня
+def feed_window(fmt):
+    if fmt != 'json':
+        return None
+    today = datetime.combine(datetime.now().date(), datetime.min.time())
+    try:
+        start = datetime.strptime(request.args['start'], '%Y-%m-%d') if 'start' in request.args \
+            else today - timedelta(days=FEED_PAST_DAYS)
+        end = datetime.strptime(request.args['end'], '%Y-%m-%d') + timedelta(days=1) if 'end' in request.args \
+            else today + timedelta(days=FEED_FUTURE_DAYS)
+    except ValueError:
+        abort(400)
+    if end <= start or (end - start).days > FEED_MAX_DAYS:
+        abort(400)
+    return start, end
+
+
+def feed_events(events, window):
+    overrides = load_overrides(events)
+    if window is None:
+        return events, overrides
+    return list(expand(events, overrides, *window)), {}
+
+
+# Conditional GET for feeds, events are loaded only on cache miss / Условный GET, события грузятся только при промахе
+def feed_response(feed_key, versions, fmt, name, load_events):
+    etag = hashlib.sha1(repr((feed_key, versions)).encode()).hexdigest()
+    updated = [updated_at for _, _, updated_at in versions if updated_at]
+    last_modified = max(updated).replace(tzinfo=timezone.utc, microsecond=0) if updated else None
+
+    not_modified = request.if_none_match.contains_weak(etag) if request.if_none_match else \
+        bool(last_modified and request.if_modified_since and last_modified <= request.if_modified_since)
+
+    if not_modified:
+        response = current_app.response_class(status=304)
+    else:
+        cache = current_app.extensions['feed_cache']
+        body = cache.get((feed_key, fmt, etag))
+        if body is None:
+            body = serialize_feed(*load_events(), fmt, name).encode()
+            cache.set((feed_key, fmt, etag), body)
+        mimetype = 'application/json' if fmt == 'json' else 'text/calendar'
+        response = current_app.response_class(body, mimetype=mimetype)
+
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+
+# Project calendar feed / Подписка на календарь проекта
+@bp.route('/feeds/<token>/project/<int:project_id>.<any(ics, json):fmt>')
+def project_feed(token, project_id, fmt):
+    project = Project.query.join(ProjectMember, ProjectMember.project_id == Project.id) \
+        .join(User, User.id == ProjectMember.user_id) \
+        .filter(Project.id == project_id, User.feed_token == token).first_or_404()
+
+    window = feed_window(fmt)
+    return feed_response(('project', project.id, window),
+                         [(project.id, project.events_version, project.events_updated_at)],
+                         fmt, project.name, lambda: feed_events(Event.query.filter_by(project_id=project.id)
+                                                                .order_by(Event.start_date).all(), window))
+
+
+# Calendar feed of all user's projects / Подписка на календари всех проектов пользователя
+@bp.route('/feeds/<token>/calendar.<any(ics, json):fmt>')
+def user_feed(token, fmt):
+    user = User.query.filter_by(feed_token=token).first_or_404()
+    versions = db.session.query(Project.id, Project.events_version, Project.events_updated_at) \
+        .join(ProjectMember, ProjectMember.project_id == Project.id) \
+        .filter(ProjectMember.user_id == user.id).order_by(Project.id).all()
+    versions = [tuple(row) for row in versions]
+    project_ids = [project_id for project_id, _, _ in versions]
+
+    window = feed_window(fmt)
+    return feed_response(('user', user.id, window), versions, fmt, f'TeamEasy — {user.username}',
+                         lambda: feed_events(Event.query.filter(Event.project_id.in_(project_ids))
+                                             .order_by(Event.start_date).all(), window))
@@ -0,0 +1,178 @@
+# Profiles and profile photos / Профили и фото профиля
+from flask import Blueprint, current_app, render_template, redirect, url_for, request, flash, send_from_directory, abort
+from flask_login import login_required, current_user
+from models import db, User, Project, allowed_file, MAX_FILE_SIZE
+from database import read_replica
+from fragments import fragment_cache
+from photos import save_profile_photo, remove_profile_photo, is_photo
+from jobs import job_queue
+from identity import user_cache
+from constants import CATEGORIES
+from werkzeug.security import safe_join
+import mimetypes
+import re
+import uuid
+import os
+
+bp = Blueprint('profile', __name__)
+
+
+HASHED_PHOTO_RE = re.compile(r'^[0-9a-f]{32}_[a-z]+\.jpg$')
+
+
+# Files upload folder / Папка загрузки файлов
+@bp.route('/static/uploads/profile_photos/<filename>')
+def serve_profile_photo(filename):
+    # Content-hashed thumbnails never change / Миниатюры с хэшем в имени никогда не меняются
+    immutable = HASHED_PHOTO_RE.match(filename) is not None
+
+    # Hand the file off to nginx / Передача файла в nginx
+    accel_prefix = current_app.config['PROFILE_PHOTO_ACCEL_PREFIX']
+    if accel_prefix:
+        path = safe_join(current_app.config['PROFILE_PHOTO_FOLDER'], filename)
+        if path is None or not os.path.isfile(path):
+            abort(404)
+        response = current_app.response_class(mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream')
+        response.headers['X-Accel-Redirect'] = f'{accel_prefix.rstrip("/")}/{filename}'
+    else:
+        # X-Sendfile is used when USE_X_SENDFILE is on / X-Sendfile используется при включённом USE_X_SENDFILE
+        response = send_from_directory(current_app.config['PROFILE_PHOTO_FOLDER'], filename)
+
+    if immutable:
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = 365 * 24 * 3600
+        response.cache_control.immutable = True
+    return response
+
+
+# Remove photo files unless another user has the same image / Удаление файлов фото, если их не использует другой пользователь
+def discard_profile_photo(photo):
+    if photo and photo != 'default-avatar.png':
+        job_queue.enqueue('remove_profile_photo', {'photo': photo})
+
+
+# Runs after the commit, so the photo is checked against saved profiles / Выполняется после commit, проверка по сохранённым профилям
+@job_queue.task('remove_profile_photo')
+def remove_unused_profile_photo(photo):
+    if not User.query.filter_by(profile_photo=photo).first():
+        remove_profile_photo(photo, current_app.config['PROFILE_PHOTO_FOLDER'])
+
+
+# Resize a queued upload and switch the profile to it / Уменьшение загруженного фото и замена фото профиля
+@job_queue.task('process_profile_photo')
+def process_profile_photo(user_id, upload):
+    path = os.path.join(current_app.config['PHOTO_INCOMING_FOLDER'], upload)
+    # Finished by an earlier attempt / Обработано предыдущей попыткой
+    if not os.path.exists(path):
+        return
+
+    with open(path, 'rb') as file:
+        photo_hash = save_profile_photo(file, current_app.config['PROFILE_PHOTO_FOLDER'])
+    user = db.session.get(User, user_id)
+    if photo_hash is not None and user is not None and photo_hash != user.profile_photo:
+        # Delete old profile photo if it isn't default / Удаление старого фото, если оно не дефолтное
+        discard_profile_photo(user.profile_photo)
+        user.profile_photo = photo_hash
+        user.touch()
+        db.session.commit()
+        user_cache.invalidate(user_id)
+    os.remove(path)
+
+
+# User profile / Профиль пользователя
+@bp.route('/profile/<username>')
+@read_replica
+def profile(username):
+    user = User.query.filter_by(username=username).first_or_404()
+
+    def render_projects():
+        user_projects = Project.query.filter_by(owner_id=user.id, is_public=True) \
+            .order_by(Project.created_at.desc()).all()
+        for project in user_projects:
+            project.category_name = CATEGORIES.get(project.category, "Неизвестная категория")
+        return render_template('profile_projects.html', projects=user_projects)
+
+    # Changes on any owned project, creation or deletion change the version
+    # Изменение любого проекта пользователя, создание или удаление меняют версию
+    count, versions, last_id = db.session.query(db.func.count(Project.id), db.func.sum(Project.version),
+                                                db.func.max(Project.id)).filter_by(owner_id=user.id).one()
+    project_list = fragment_cache.render('profile_projects', user.id, f'{count}-{versions}-{last_id}', render_projects)
+
+    return render_template('profile.html', user=user, project_list=project_list)
+
+
+# Edit profile / Редактирование профиля
+@bp.route('/edit_profile', methods=['GET', 'POST'])
+@login_required
+def edit_profile():
+    if request.method == 'POST':
+        current_user.email = request.form['email']
+        current_user.github = request.form.get('github', '')
+        current_user.bio = request.form.get('bio', '')
+        telegram = request.form.get('telegram', '')
+
+        if telegram and telegram.startswith('@'):
+            telegram = telegram[1:]
+        current_user.telegram = telegram
+
+        photo = None
+        if 'profile_photo' in request.files:
+            file = request.files['profile_photo']
+            if file and file.filename != '' and allowed_file(file.filename):
+                if file.content_length > MAX_FILE_SIZE:
+                    flash('Файл слишком большой. Максимальный размер - 2MB.', 'error')
+                else:
+                    # Only the header is read here, resizing goes to a job / Здесь читается только заголовок, уменьшение - в задаче
+                    photo = file.read()
+                    if not is_photo(photo):
+                        flash('Не удалось прочитать изображение', 'error')
+                        photo = None
+            elif file and file.filename != '':
+                flash('Недопустимый формат файла. Разрешены: PNG, JPG, JPEG, GIF.', 'error')
+
+        existing_user = User.query.filter(User.email == current_user.email, User.id != current_user.id).first()
+        if existing_user:
+            flash('Эта почта уже привязана к другому аккаунту', 'error')
+            return redirect(url_for('profile.edit_profile'))
+
+        upload = None
+        if photo is not None:
+            upload = f'{current_user.id}_{uuid.uuid4().hex}'
+            with open(os.path.join(current_app.config['PHOTO_INCOMING_FOLDER'], upload), 'wb') as f:
+                f.write(photo)
+            job_queue.enqueue('process_profile_photo', {'user_id': current_user.id, 'upload': upload})
+
+        current_user.touch()
+        try:
+            db.session.commit()
+            user_cache.refresh(current_user.id)
+            flash('Профиль успешно изменен', 'success')
+            if upload is not None:
+                flash('Новое фото появится через несколько секунд', 'success')
+            return redirect(url_for('profile.profile', username=current_user.username))
+        except Exception as e:
+            db.session.rollback()
+            if upload is not None:
+                os.remove(os.path.join(current_app.config['PHOTO_INCOMING_FOLDER'], upload))
+            flash('Ошибка при редактировании профиля: ' + str(e), 'error')
+
+    return render_template('edit_profile.html')
+
+
+# Delete profile photo / Удаление фото профиля
+@bp.route('/delete_profile_photo', methods=['POST'])
+@login_required
+def delete_profile_photo():
+    if current_user.profile_photo and current_user.profile_photo != 'default-avatar.png':
+        discard_profile_photo(current_user.profile_photo)
+
+        current_user.profile_photo = 'default-avatar.png'
+        current_user.touch()
+        db.session.commit()
+        user_cache.refresh(current_user.id)
+        flash('Фото профиля удалено', 'success')
+    else:
+        flash('Нет фото для удаления', 'error')
+
+    return redirect(url_for('profile.edit_profile'))
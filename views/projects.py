@@ -0,0 +1,419 @@
+# Dashboard, project pages, members and settings / Дашборд, страницы проектов, участники и настройки
+from flask import Blueprint, render_template, redirect, url_for, request, flash, abort, Response, current_app, \
+    stream_with_context
+from flask_login import login_required, current_user
+from models import db, User, Project, ProjectMember, CategoryStat, with_loaders
+from database import read_replica
+from fragments import fragment_cache
+from search import search_items, parse_search_cursor
+from deletion import project_deleter
+from live import live_updates
+from transfer import export_project, read_records, ProjectImporter, InvalidImport
+from views import project_access
+from constants import CATEGORIES
+from sqlalchemy.dialects import postgresql, sqlite
+from datetime import datetime
+import io
+import json
+import re
+
+bp = Blueprint('projects', __name__)
+
+# Inserts that skip rows hitting a unique key / Вставка, пропускающая строки с занятым уникальным ключом
+INSERT_IGNORE = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}
+INVITE_MAX_NAMES = 200
+
+
+# Home page / Домашняя страница
+@bp.route('/home')
+@login_required
+def home():
+    # Dashboard counters in one query / Счётчики дашборда одним запросом
+    owned_projects = db.session.query(db.func.count(Project.id)) \
+        .filter(Project.owner_id == current_user.id, Project.deleting == db.false()).scalar_subquery()
+    owned_members = db.session.query(db.func.coalesce(db.func.sum(Project.member_count), 0)) \
+        .filter(Project.owner_id == current_user.id, Project.deleting == db.false()).scalar_subquery()
+    memberships = db.session.query(db.func.count(ProjectMember.id)) \
+        .filter(ProjectMember.user_id == current_user.id).scalar_subquery()
+    stats = db.session.query(owned_projects.label('projects'), owned_members.label('members'),
+                             memberships.label('memberships')).one()
+
+    # Recent projects, member counts are kept by triggers / Недавние проекты, число участников ведут триггеры
+    recent_projects = Project.query.filter_by(owner_id=current_user.id, deleting=False) \
+        .order_by(Project.created_at.desc(), Project.id.desc()).limit(4).all()
+
+    return render_template('home.html', stats=stats, recent_projects=recent_projects)
+
+
+# Search / Поиск
+@bp.route('/search')
+@login_required
+@read_replica
+def search():
+    query = request.args.get('q', '').strip()
+    cursor = request.args.get('cursor')
+    results, next_cursor = search_items(current_user.id, query, parse_search_cursor(cursor) if cursor else None)
+
+    return render_template('search.html', query=query, results=results, next_cursor=next_cursor)
+
+
+EXPLORE_PAGE_SIZE = 24
+EXPLORE_SORTS = ('recent', 'members')
+
+
+# Public projects by category / Публичные проекты по категориям
+@bp.route('/explore')
+@login_required
+@read_replica
+def explore():
+    category = request.args.get('category') or None
+    sort = request.args.get('sort') if request.args.get('sort') in EXPLORE_SORTS else 'recent'
+    cursor = request.args.get('cursor')
+    if category is not None and category not in CATEGORIES:
+        abort(404)
+
+    # Facet counts from the rollup table / Счётчики фасетов из сводной таблицы
+    facets = CategoryStat.query.filter(CategoryStat.public_projects > 0).all()
+    facets = sorted(((CATEGORIES.get(stat.category, "Неизвестная категория"), stat.category, stat.public_projects)
+                     for stat in facets), key=lambda facet: -facet[2])
+
+    # Public projects with owner and caller's membership / Публичные проекты с владельцем и членством пользователя
+    query = db.session.query(Project, User.username, ProjectMember.id) \
+        .join(User, User.id == Project.owner_id) \
+        .outerjoin(ProjectMember, db.and_(ProjectMember.project_id == Project.id,
+                                          ProjectMember.user_id == current_user.id)) \
+        .filter(Project.is_public == db.true())
+    if category:
+        query = query.filter(Project.category == category)
+
+    sort_column = Project.member_count if sort == 'members' else Project.created_at
+    if cursor:
+        try:
+            value, _, project_id = cursor.rpartition('_')
+            value = int(value) if sort == 'members' else datetime.fromisoformat(value)
+            query = query.filter(db.tuple_(sort_column, Project.id) < (value, int(project_id)))
+        except ValueError:
+            abort(400)
+
+    rows = query.order_by(sort_column.desc(), Project.id.desc()).limit(EXPLORE_PAGE_SIZE + 1).all()
+    next_cursor = None
+    if len(rows) > EXPLORE_PAGE_SIZE:
+        rows = rows[:EXPLORE_PAGE_SIZE]
+        last = rows[-1][0]
+        next_cursor = f"{last.member_count if sort == 'members' else last.created_at.isoformat()}_{last.id}"
+
+    projects = []
+    for project, owner_name, membership_id in rows:
+        project.category_name = CATEGORIES.get(project.category, "Неизвестная категория")
+        project.owner_name = owner_name
+        project.is_member = membership_id is not None or project.owner_id == current_user.id
+        projects.append(project)
+
+    return render_template('explore.html', projects=projects, facets=facets, category=category, sort=sort,
+                           next_cursor=next_cursor)
+
+
+# Create project / Создание проекта
+@bp.route('/create_project', methods=['GET', 'POST'])
+def create_project():
+    if not current_user.is_authenticated:
+        return redirect(url_for('auth.login', next=request.url))
+
+    if request.method == 'POST':
+        project_name = request.form['project_name']
+        project_description = request.form['project_description']
+        github_url = request.form.get('github_url', '')
+        category = request.form['category']
+        is_public = request.form.get('is_public') == 'true'
+
+        project = Project(
+            name=project_name,
+            description=project_description,
+            github_url=github_url,
+            owner_id=current_user.id,
+            category=category,
+            is_public=is_public
+        )
+
+        try:
+            db.session.add(project)
+            db.session.flush()
+            # Setting owner / Назначение владельца
+            owner_member = ProjectMember(
+                project_id=project.id,
+                user_id=current_user.id,
+                role='Владелец'
+            )
+            db.session.add(owner_member)
+
+            db.session.commit()
+            flash('Проект успешно создан', 'success')
+            return redirect(url_for('projects.my_projects'))
+        except Exception as e:
+            db.session.rollback()
+            flash('Ошибка при создании проекта: ' + str(e), 'error')
+
+    return render_template('create_project.html')
+
+
+# My projects / Мои проекты
+@bp.route('/my_projects')
+@login_required
+def my_projects():
+    user_projects = Project.query.filter_by(owner_id=current_user.id, deleting=False) \
+        .order_by(Project.created_at.desc()).all()
+    for project in user_projects:
+        project.category_name = CATEGORIES.get(project.category, "Неизвестная категория")
+    return render_template('my_projects.html', projects=user_projects)
+
+
+# Project workspace / Рабочее пространство проекта
+@bp.route('/project/<int:project_id>/workspace')
+@login_required
+@project_access
+def project_workspace(project, project_id):
+    overview = fragment_cache.render('workspace', project_id, project.version,
+                                     lambda: render_template('workspace_overview.html', project=project))
+
+    return render_template('project_workspace.html', project=project, overview=overview)
+
+
+# Project members / Участники проекта
+@bp.route('/project/<int:project_id>/members')
+@login_required
+@project_access
+def project_members(project, project_id):
+    members = with_loaders(ProjectMember.query.filter_by(project_id=project_id), 'members').all()
+
+    return render_template('project_members.html', project=project, members=members)
+
+
+# Invite members by usernames or emails / Приглашение участников по именам или email
+@bp.route('/project/<int:project_id>/members/invite', methods=['POST'])
+@login_required
+@project_access
+def invite_members(project, project_id):
+    # Owner check / Проверка на владельца
+    if project.owner_id != current_user.id:
+        flash('Только владелец проекта может приглашать участников', 'error')
+        return redirect(url_for('projects.project_members', project_id=project_id))
+
+    names = list(dict.fromkeys(name for name in re.split(r'[\s,;]+', request.form.get('names', '')) if name))
+    role = request.form.get('role', '').strip() or 'Участник'
+    if not names:
+        flash('Укажите имена пользователей или email', 'error')
+        return redirect(url_for('projects.project_members', project_id=project_id))
+    if len(names) > INVITE_MAX_NAMES:
+        flash(f'Можно пригласить не больше {INVITE_MAX_NAMES} пользователей за раз', 'error')
+        return redirect(url_for('projects.project_members', project_id=project_id))
+    if len(role) > 100:
+        flash('Роль не может быть длиннее 100 символов', 'error')
+        return redirect(url_for('projects.project_members', project_id=project_id))
+
+    # All names in one query / Все имена одним запросом
+    users = db.session.query(User.id, User.username, User.email) \
+        .filter(db.or_(User.username.in_(names), User.email.in_(names))).all()
+    known = {name for user in users for name in (user.username, user.email)}
+    unknown = [name for name in names if name not in known]
+
+    added = []
+    if users:
+        # Existing members are skipped by uq_project_member / Существующих участников пропускает uq_project_member
+        insert = INSERT_IGNORE[db.session.get_bind().dialect.name](ProjectMember) \
+            .values([{'project_id': project_id, 'user_id': user.id, 'role': role, 'joined_at': datetime.now()}
+                     for user in users]) \
+            .on_conflict_do_nothing(index_elements=['project_id', 'user_id']) \
+            .returning(ProjectMember.user_id)
+        try:
+            added = db.session.execute(insert).scalars().all()
+            if added:
+                project.touch()
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            flash('Ошибка при приглашении участников: ' + str(e), 'error')
+            return redirect(url_for('projects.project_members', project_id=project_id))
+
+    if added:
+        flash(f'Добавлено участников: {len(added)}', 'success')
+    existing = [user.username for user in users if user.id not in added]
+    if existing:
+        flash('Уже в проекте: ' + ', '.join(existing), 'error')
+    if unknown:
+        flash('Пользователи не найдены: ' + ', '.join(unknown), 'error')
+    return redirect(url_for('projects.project_members', project_id=project_id))
+
+
+# Edit role / Изменение роли участника
+@bp.route('/project/<int:project_id>/members/<int:member_id>/edit_role', methods=['POST'])
+@login_required
+@project_access
+def edit_member_role(project, project_id, member_id):
+    # Owner check / Проверка на владельца
+    if project.owner_id != current_user.id:
+        flash('Только владелец проекта может изменять роли участников', 'error')
+        return redirect(url_for('projects.project_members', project_id=project_id))
+
+    member = ProjectMember.query.filter_by(id=member_id, project_id=project_id).first_or_404()
+    new_role = request.form.get('role', '').strip()
+
+    if new_role:
+        member.role = new_role
+        project.touch()
+        try:
+            db.session.commit()
+            flash('Роль участника успешно изменена', 'success')
+        except Exception as e:
+            db.session.rollback()
+            flash('Ошибка при изменении роли: ' + str(e), 'error')
+
+    return redirect(url_for('projects.project_members', project_id=project_id))
+
+
+# Remove member / Удаление участника
+@bp.route('/project/<int:project_id>/members/<int:member_id>/remove', methods=['POST'])
+@login_required
+@project_access
+def remove_member(project, project_id, member_id):
+    # Owner check / Проверка на владельца
+    if project.owner_id != current_user.id:
+        flash('Только владелец проекта может удалять участников', 'error')
+        return redirect(url_for('projects.project_members', project_id=project_id))
+
+    member = ProjectMember.query.filter_by(id=member_id, project_id=project_id).first_or_404()
+
+    try:
+        db.session.delete(member)
+        project.touch()
+        db.session.commit()
+        flash('Участник удален из проекта', 'success')
+    except Exception as e:
+        db.session.rollback()
+        flash('Ошибка при удалении участника: ' + str(e), 'error')
+
+    return redirect(url_for('projects.project_members', project_id=project_id))
+
+
+# Project settings / Настройки проекта
+@bp.route('/project/<int:project_id>/settings', methods=['GET', 'POST'])
+@login_required
+@project_access
+def project_settings(project, project_id):
+    # Owner check / Проверка на владельца
+    if project.owner_id != current_user.id:
+        flash('Только владелец проекта может изменять настройки', 'error')
+        return redirect(url_for('projects.project_workspace', project_id=project_id))
+
+    if request.method == 'POST':
+        project.name = request.form['project_name']
+        project.description = request.form['project_description']
+        project.github_url = request.form.get('github_url', '')
+        project.category = request.form['category']
+        project.is_public = request.form.get('is_public') == 'true'
+        project.touch()
+
+        try:
+            db.session.commit()
+            flash('Настройки проекта изменены', 'success')
+            return redirect(url_for('projects.project_settings', project_id=project_id))
+        except Exception as e:
+            db.session.rollback()
+            flash('Ошибка при обновлении настроек: ' + str(e), 'error')
+
+    return render_template('project_settings.html', project=project)
+
+
+# Delete project / Удаление проекта
+@bp.route('/project/<int:project_id>/delete', methods=['POST'])
+@login_required
+@project_access
+def delete_project(project, project_id):
+    # Owner check / Проверка на владельца
+    if project.owner_id != current_user.id:
+        flash('Только владелец проекта может удалить проект', 'error')
+        return redirect(url_for('projects.project_workspace', project_id=project_id))
+
+    try:
+        if project_deleter.delete(project):
+            flash('Проект удален, его задачи и события удаляются в фоне', 'success')
+        else:
+            db.session.commit()
+            flash('Проект удален', 'success')
+        return redirect(url_for('projects.my_projects'))
+    except Exception as e:
+        db.session.rollback()
+        flash('Ошибка при удалении проекта: ' + str(e), 'error')
+        return redirect(url_for('projects.project_settings', project_id=project_id))
+
+
+# Project export, streamed while it is read / Экспорт проекта, отдаётся по мере чтения
+@bp.route('/project/<int:project_id>/export.<any(ndjson, csv):fmt>')
+@login_required
+@project_access
+def export_project_file(project, project_id, fmt):
+    # Owner check / Проверка на владельца
+    if project.owner_id != current_user.id:
+        flash('Только владелец проекта может экспортировать проект', 'error')
+        return redirect(url_for('projects.project_workspace', project_id=project_id))
+
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    return Response(stream_with_context(export_project(project, fmt)), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename=project-{project_id}.{fmt}',
+                             'X-Accel-Buffering': 'no'})
+
+
+# Project import, progress is streamed as NDJSON lines / Импорт проекта, прогресс отдаётся строками NDJSON
+@bp.route('/projects/import', methods=['POST'])
+@login_required
+def import_project():
+    # Larger limit than other forms, set before the body is read / Лимит больше, чем у других форм, до чтения тела
+    request.max_content_length = current_app.config['IMPORT_MAX_SIZE']
+    file = request.files.get('export_file')
+    if not file or not file.filename:
+        return {'error': 'Выберите файл экспорта'}, 400
+    fmt = 'csv' if file.filename.lower().endswith('.csv') else 'ndjson'
+    # Uploads are closed when the view returns, the generator takes the stream over
+    # Загрузки закрываются после возврата из view, поток забирает генератор
+    stream, file.stream = file.stream, io.BytesIO()
+
+    def progress():
+        importer = ProjectImporter(current_user)
+        try:
+            for step in importer.run(read_records(stream, fmt)):
+                yield json.dumps(step) + '\n'
+            db.session.commit()
+        except InvalidImport as e:
+            db.session.rollback()
+            yield json.dumps({'error': str(e)}, ensure_ascii=False) + '\n'
+            return
+        except Exception as e:
+            db.session.rollback()
+            yield json.dumps({'error': 'Ошибка при импорте проекта: ' + str(e)}, ensure_ascii=False) + '\n'
+            return
+        finally:
+            stream.close()
+        yield json.dumps({'done': True, 'url': url_for('projects.project_workspace',
+                                                        project_id=importer.project.id)}) + '\n'
+
+    return Response(stream_with_context(progress()), mimetype='application/x-ndjson',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+# Live changes of tasks and events, resumed from Last-Event-ID / Живые изменения задач и событий, продолжение с Last-Event-ID
+@bp.route('/project/<int:project_id>/stream')
+@login_required
+@project_access
+def project_stream(project, project_id):
+    # Header on reconnect, query on first connect from the page / Заголовок при переподключении, параметр при первом
+    last_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_id = int(last_id) if last_id else None
+    except ValueError:
+        abort(400)
+    # Project version of the page, used when live updates fall back to polling
+    # Версия проекта на странице, нужна, когда живые обновления переходят на опрос
+    version = request.args.get('version', type=int)
+    stale = version is not None and version != project.version
+
+    return Response(live_updates.stream(project_id, last_id, stale), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
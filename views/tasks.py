@@ -0,0 +1,323 @@
+# Task board / Доска задач
+from flask import Blueprint, render_template, redirect, url_for, request, flash, abort, jsonify
+from flask_login import login_required, current_user
+from models import db, Task, ProjectMember, with_loaders
+from database import read_replica
+from fragments import fragment_cache
+from live import live_updates
+from views import project_access, conditional_fragment
+from constants import TASK_STATUSES, TASK_PRIORITIES
+from datetime import datetime
+import time
+
+bp = Blueprint('tasks', __name__)
+
+# Column page and batch limits / Лимиты страницы колонки и пакета
+TASK_PAGE_SIZE = 20
+TASK_BATCH_MAX_OPS = 200
+# Floats run out of midpoints after ~50 moves into one gap / Середины у float кончаются примерно за 50 перемещений
+SORT_ORDER_MIN_GAP = 1e-3
+SORT_ORDER_STEP = 1024.0
+
+
+# Task column page by (sort_order, id) cursor / Страница колонки задач по курсору (sort_order, id)
+def task_column_page(project_id, status, cursor=None):
+    query = with_loaders(Task.query.filter_by(project_id=project_id, status=status), 'task_board')
+    if cursor:
+        query = query.filter(db.tuple_(Task.sort_order, Task.id) < cursor)
+
+    tasks = query.order_by(Task.sort_order.desc(), Task.id.desc()).limit(TASK_PAGE_SIZE + 1).all()
+    next_cursor = None
+    if len(tasks) > TASK_PAGE_SIZE:
+        tasks = tasks[:TASK_PAGE_SIZE]
+        next_cursor = f'{tasks[-1].sort_order!r}_{tasks[-1].id}'
+    return tasks, next_cursor
+
+
+def parse_task_cursor(cursor):
+    try:
+        sort_order, _, task_id = cursor.rpartition('_')
+        return float(sort_order), int(task_id)
+    except ValueError:
+        abort(400)
+
+
+# Task manager / Таск-менеджер
+@bp.route('/project/<int:project_id>/tasks')
+@login_required
+@read_replica
+@project_access
+def project_tasks(project, project_id):
+    def render_column(status):
+        tasks, next_cursor = task_column_page(project_id, status)
+        return render_template('task_column.html', status=status, tasks=tasks, next_cursor=next_cursor)
+
+    # First page of every column, cached until the project changes / Первая страница каждой колонки, кэш до изменения проекта
+    columns = {status: fragment_cache.render('task_column', project_id, project.version,
+                                             lambda: render_column(status), status)
+               for status in TASK_STATUSES}
+
+    # Get members / Получаем участников проекта
+    members = with_loaders(ProjectMember.query.filter_by(project_id=project_id), 'members').all()
+
+    return render_template('tasks.html', project=project, columns=columns, members=members)
+
+
+# Next page of a task column / Следующая страница колонки задач
+@bp.route('/project/<int:project_id>/tasks/column/<status>')
+@login_required
+@read_replica
+@project_access
+def task_column(project, project_id, status):
+    if status not in TASK_STATUSES:
+        abort(404)
+
+    cursor = request.args.get('cursor')
+    tasks, next_cursor = task_column_page(project_id, status, parse_task_cursor(cursor) if cursor else None)
+
+    return jsonify(html=render_template('task_cards.html', tasks=tasks), next_cursor=next_cursor)
+
+
+# Create task / Создание задач
+@bp.route('/project/<int:project_id>/tasks/create', methods=['POST'])
+@login_required
+@project_access
+def create_task(project, project_id):
+    title = request.form['task_title']
+    description = request.form.get('task_description', '')
+    due_date_str = request.form.get('due_date')
+    priority = request.form.get('priority', 'medium')
+    assignee_id = request.form.get('assignee')
+
+    due_date = None
+    if due_date_str:
+        due_date = datetime.strptime(due_date_str, '%Y-%m-%d')
+
+    task = Task(
+        project_id=project_id,
+        title=title,
+        description=description,
+        due_date=due_date,
+        priority=priority,
+        status='todo',
+        created_by=current_user.id
+    )
+
+    if assignee_id:
+        task.assigned_to = assignee_id
+
+    try:
+        db.session.add(task)
+        project.touch()
+        db.session.flush()
+        change = task_change(task)
+        db.session.commit()
+        live_updates.publish(project_id, 'task', change)
+        flash('Задача создана', 'success')
+    except Exception as e:
+        db.session.rollback()
+        flash('Ошибка при создании задачи: ' + str(e), 'error')
+
+    return redirect(url_for('tasks.project_tasks', project_id=project_id))
+
+
+# Live update of one card, built before commit / Живое обновление карточки, собирается до commit
+def task_change(task):
+    return {'id': task.id, 'status': task.status, 'sort_order': task.sort_order,
+            'html': render_template('task_cards.html', tasks=[task])}
+
+
+# Order between two neighbour cards, None for none / Порядок между двумя соседними карточками, None - нет соседа
+def sort_order_between(above, below):
+    if above and below:
+        return (above.sort_order + below.sort_order) / 2
+    if above:
+        return above.sort_order - 1
+    if below:
+        return below.sort_order + 1
+    # Empty column / Пустая колонка
+    return time.time()
+
+
+# Spreads a column out again once a gap is too narrow for midpoints, in the caller's transaction
+# Заново раздвигает колонку, когда промежуток слишком узок для середин, в транзакции вызывающего
+def renumber_column(project_id, status, moving):
+    column = Task.query.filter(Task.project_id == project_id, Task.status == status, Task.id != moving.id) \
+        .order_by(Task.sort_order.desc(), Task.id.desc()).all()
+    top = column[0].sort_order if column else 0
+    for i, task in enumerate(column):
+        task.sort_order = top - i * SORT_ORDER_STEP
+
+
+# Batch task changes from the board, one transaction / Пакет изменений задач с доски, одна транзакция
+# {"ops": [{"op": "move", "id": 1, "status": "done", "after": 2, "before": 3}, {"op": "status", "id": 1, "status": "done"},
+#          {"op": "assign", "id": 1, "assignee": 5}, {"op": "priority", "id": 1, "priority": "high"},
+#          {"op": "delete", "id": 1}]}
+@bp.route('/project/<int:project_id>/tasks/batch', methods=['POST'])
+@login_required
+@project_access
+def task_batch(project, project_id):
+    def reject(message, status=400):
+        db.session.rollback()
+        return jsonify(error=message), status
+
+    data = request.get_json(silent=True) or {}
+    ops = data.get('ops') if isinstance(data, dict) else None
+    if not isinstance(ops, list) or not ops or len(ops) > TASK_BATCH_MAX_OPS:
+        return reject(f'Нужен список из 1-{TASK_BATCH_MAX_OPS} операций')
+    if not all(isinstance(op, dict) and isinstance(op.get('id'), int) and not isinstance(op.get('id'), bool)
+               for op in ops):
+        return reject('У каждой операции должен быть id задачи')
+
+    neighbour_ids = {op.get(key) for op in ops if op.get('op') == 'move' for key in ('after', 'before')} - {None}
+    if not all(isinstance(task_id, int) and not isinstance(task_id, bool) for task_id in neighbour_ids):
+        return reject('Соседние задачи задаются id')
+
+    # Every referenced task in one query / Все упомянутые задачи одним запросом
+    task_ids = {op['id'] for op in ops}
+    tasks = {task.id: task for task in with_loaders(Task.query.filter(Task.project_id == project_id,
+                                                                      Task.id.in_(task_ids | neighbour_ids)),
+                                                    'task_board')}
+    if not task_ids <= tasks.keys():
+        return reject('Задача не найдена', 404)
+    if not neighbour_ids <= tasks.keys():
+        return reject('Соседняя задача не найдена')
+
+    members = {}
+    if any(op.get('op') == 'assign' for op in ops):
+        members = {member.user_id: member.user
+                   for member in with_loaders(ProjectMember.query.filter_by(project_id=project_id), 'members')}
+
+    changed, deleted, renumbered = {}, [], set()
+    for op in ops:
+        task = tasks[op['id']]
+        kind = op.get('op')
+        if task.id in deleted:
+            return reject(f'Задача {task.id} уже удалена')
+
+        if kind == 'delete':
+            # Task creator check / Проверка на создателя задачи
+            if task.created_by != current_user.id:
+                return reject('Вы можете удалять только свои задачи', 403)
+            db.session.delete(task)
+            deleted.append(task.id)
+            changed.pop(task.id, None)
+            continue
+
+        if kind == 'status' or (kind == 'move' and 'status' in op):
+            if op.get('status') not in TASK_STATUSES:
+                return reject('Неизвестный статус')
+            task.status = op['status']
+
+        if kind == 'move':
+            above, below = tasks.get(op.get('after')), tasks.get(op.get('before'))
+            if any(neighbour is task or neighbour.status != task.status or neighbour.id in deleted
+                   for neighbour in (above, below) if neighbour is not None):
+                return reject('Соседние задачи должны быть в той же колонке')
+            if above and below and above.sort_order - below.sort_order < SORT_ORDER_MIN_GAP:
+                renumber_column(project_id, task.status, task)
+                renumbered.add(task.status)
+            task.sort_order = sort_order_between(above, below)
+        elif kind == 'priority':
+            if op.get('priority') not in TASK_PRIORITIES:
+                return reject('Неизвестный приоритет')
+            task.priority = op['priority']
+        elif kind == 'assign':
+            assignee = op.get('assignee')
+            if assignee is not None and (not isinstance(assignee, int) or assignee not in members):
+                return reject('Исполнитель должен быть участником проекта')
+            task.assignee = members.get(assignee)
+        elif kind != 'status':
+            return reject('Неизвестная операция')
+        changed[task.id] = task
+
+    # Response is built before commit expires the tasks / Ответ собирается до того, как коммит сбросит задачи
+    result = [{'id': task.id, 'status': task.status, 'priority': task.priority, 'sort_order': task.sort_order,
+               'assignee': task.assignee.username if task.assignee else None,
+               'html': render_template('task_cards.html', tasks=[task])} for task in changed.values()]
+
+    try:
+        project.touch()
+        db.session.commit()
+    except Exception as e:
+        return reject('Ошибка при изменении задач: ' + str(e), 500)
+
+    for change in result:
+        live_updates.publish(project_id, 'task', {key: change[key] for key in ('id', 'status', 'sort_order', 'html')})
+    for task_id in deleted:
+        live_updates.publish(project_id, 'task', {'id': task_id, 'deleted': True})
+    # Every card of a renumbered column has a new order, boards reload / У всей колонки новый порядок, доски перезагружаются
+    for status in renumbered:
+        live_updates.publish(project_id, 'task', {'renumbered': True, 'status': status})
+    return jsonify(tasks=result, deleted=deleted, renumbered=sorted(renumbered))
+
+
+# Task modal / Модальное окно создания задачи
+@bp.route('/project/<int:project_id>/tasks/<int:task_id>/modal')
+@login_required
+@project_access
+def task_modal(project, project_id, task_id):
+    def render():
+        task = Task.query.filter_by(id=task_id, project_id=project_id).first_or_404()
+        members = with_loaders(ProjectMember.query.filter_by(project_id=project_id), 'members').all()
+        return render_template('task_modal.html', task=task, members=members, project_id=project_id)
+
+    # Task and member changes bump the project version / Изменения задач и участников увеличивают версию проекта
+    return conditional_fragment(f'task-{task_id}-{project.version}', render)
+
+
+# Update task / Изменение задачи
+@bp.route('/project/<int:project_id>/tasks/<int:task_id>/update', methods=['POST'])
+@login_required
+@project_access
+def update_task(project, project_id, task_id):
+    task = Task.query.filter_by(id=task_id, project_id=project_id).first_or_404()
+
+    task.title = request.form['title']
+    task.description = request.form.get('description', '')
+    task.status = request.form['status']
+    task.priority = request.form['priority']
+
+    assignee_id = request.form.get('assignee')
+    task.assigned_to = assignee_id if assignee_id else None
+
+    due_date_str = request.form.get('due_date')
+    task.due_date = datetime.strptime(due_date_str, '%Y-%m-%d') if due_date_str else None
+    project.touch()
+
+    try:
+        db.session.flush()
+        change = task_change(task)
+        db.session.commit()
+        live_updates.publish(project_id, 'task', change)
+        flash('Задача обновлена', 'success')
+    except Exception as e:
+        db.session.rollback()
+        flash('Ошибка при обновлении задачи: ' + str(e), 'error')
+
+    return redirect(url_for('tasks.project_tasks', project_id=project_id))
+
+
+# Delete task / Удаление задачи
+@bp.route('/project/<int:project_id>/tasks/<int:task_id>/delete', methods=['POST'])
+@login_required
+@project_access
+def delete_task(project, project_id, task_id):
+    task = Task.query.filter_by(id=task_id, project_id=project_id).first_or_404()
+
+    # Task creator check / Проверка на создателя задачи
+    if task.created_by != current_user.id:
+        flash('Вы можете удалять только свои задачи', 'error')
+        return redirect(url_for('tasks.project_tasks', project_id=project_id))
+
+    try:
+        db.session.delete(task)
+        project.touch()
+        db.session.commit()
+        live_updates.publish(project_id, 'task', {'id': task_id, 'deleted': True})
+        flash('Задача удалена', 'success')
+    except Exception as e:
+        db.session.rollback()
+        flash('Ошибка при удалении задачи: ' + str(e), 'error')
+
+    return redirect(url_for('tasks.project_tasks', project_id=project_id))